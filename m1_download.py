@@ -1,27 +1,141 @@
 # Name:        m1_download.py
 # Purpose:     Download specific tax revenue documents
-# Invocation:  python3 m1_download.py <projName> <yyyy> <mm>
+# Invocation:  python3 m1_download.py <projName> <yyyy> <mm> [--workers <n>] [--cache <hours>]
+#              python3 m1_download.py <projName> --from <yyyy-mm> --to <yyyy-mm> [--workers <n>] [--cache <hours>]
 
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
 import os
 import re
+import requests
+import subprocess
 import sys
+import threading
+import time
 from bs4 import BeautifulSoup, SoupStrainer
-from urllib.request import Request, urlopen
+from s1_download import request_url, wait_for_host
 
 SABLE_USER_AGENT = "SABLE (U.S. Census Bureau research to find alternative data sources and reduce respondent burden) https://github.com/uscensusbureau/sable/; census-aidcrb-support-team@census.gov; For more information, go to www.census.gov/scraping/"
 
+# Web pages read by open_url are saved in this folder, which is shared by all "M" series projects (see get_page_cache_file)
+# A saved page is used for up to cacheTTL seconds (0 turns the cache off), and only in the calendar month it was read in,
+# since most state websites post new reports each month
+PAGE_CACHE_DIR = "./m_cache"
+cacheTTL = 0
+
+# Web pages read during this run, keyed by URL, so that jobs for different months that need the same index page read
+# it only once, even if they run at the same time (see open_url)
+runPages = {}
+runPagesLock = threading.Lock()
+
+# Years and months accepted on the command line
+YEARS_VALID = [str(yyyy) for yyyy in range(2000, 2051)]
+MONTHS_VALID = ["01", "02", "03", "04", "05", "06", "07", "08", "09", "10", "11", "12"]
+
+# Statuses with which some servers refuse HEAD requests, in which case probe_link asks for the first bytes with a GET
+HEAD_REFUSED_STATUSES = (403, 405, 501)
+PROBE_RANGE = "bytes=0-1023"
+
+# A PDF starts with "%PDF-" and ends with "%%EOF", which readers look for within the first and last 1024 bytes
+# (see is_pdf_complete)
+PDF_HEADER = b"%PDF-"
+PDF_TRAILER = b"%%EOF"
+PDF_MARKER_RANGE = 1024
+
+# Whole PDFs received by probe_link from servers that ignored the Range header, keyed by URL
+# download_pdf saves these instead of downloading them again
+# Each worker thread only keeps the PDFs of the state it is processing, which process_state drops when it is done
+probedBodies = threading.local()
+
+# Function that gets the target PDFs of each state, keyed by 2-letter state abbreviation (see register_targets)
+targetsRegistry = {}
+
+# Name:        StateOutput
+# Purpose:     Stand-in for sys.stdout while states are processed at the same time
+#              Text printed by a worker thread is kept in that thread's buffer, so that the output of each state can be
+#              printed in one piece and in order (see process_state_buffered)
+#              Text printed by other threads is passed on to the real standard output
+
+class StateOutput:
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            return self.stdout.write(text)
+        buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        self.stdout.flush()
+        return
+
 # Name:        valid_arguments
 # Purpose:     Check whether the command-line arguments are valid
 # Parameters:  sys.argv (globally defined list of command-line arguments)
 # Returns:     True (all arguments are valid) or False (at least one argument is invalid)
 
 def valid_arguments():
-    yearsValid = [str(yyyy) for yyyy in range(2000, 2051)]
-    monthsValid = ["01", "02", "03", "04", "05", "06", "07", "08", "09", "10", "11", "12"]
-    if len(sys.argv) == 4 and re.search(r"^[a-zA-Z][a-zA-Z_-]*$", sys.argv[1]) and sys.argv[2] in yearsValid and sys.argv[3] in monthsValid:
+    if len(sys.argv) >= 3 and re.search(r"^[a-zA-Z][a-zA-Z_-]*$", sys.argv[1]) and get_options(sys.argv[2:]) is not None:
         return True
     return False
 
+# Name:        get_options
+# Purpose:     Parse the command-line arguments that follow <projName>
+#              Either <yyyy> <mm> or the range of months --from <yyyy-mm> --to <yyyy-mm> must be given
+# Parameters:  args (list of command-line arguments)
+# Returns:     Dictionary of option values or None (at least one argument is invalid)
+
+def get_options(args):
+    options = {"months": [], "workers": 1, "cache": 0}
+    first = None
+    last = None
+    i = 0
+    if len(args) >= 2 and args[0] in YEARS_VALID and args[1] in MONTHS_VALID:
+        options["months"] = [(args[0], args[1])]
+        i = 2
+    while i < len(args):
+        if args[i] in ("--from", "--to") and i + 1 < len(args) and re.search(r"^[0-9]{4}-[0-9]{2}$", args[i + 1]) and args[i + 1][:4] in YEARS_VALID and args[i + 1][5:] in MONTHS_VALID:
+            if args[i] == "--from":
+                first = (args[i + 1][:4], args[i + 1][5:])
+            else:
+                last = (args[i + 1][:4], args[i + 1][5:])
+            i += 2
+        elif args[i] == "--workers" and i + 1 < len(args) and re.search(r"^[1-9][0-9]*$", args[i + 1]):
+            options["workers"] = int(args[i + 1])
+            i += 2
+        elif args[i] == "--cache" and i + 1 < len(args) and re.search(r"^[0-9]+$", args[i + 1]):
+            options["cache"] = int(args[i + 1])
+            i += 2
+        else:
+            return None
+    if first is not None or last is not None:
+        if len(options["months"]) > 0 or first is None or last is None or first > last:
+            return None
+        options["months"] = get_months(first, last)
+    if len(options["months"]) == 0:
+        return None
+    return options
+
+# Name:        get_months
+# Purpose:     List the months in a range
+# Parameters:  first (4-digit year and 2-digit month of first month)
+#              last (4-digit year and 2-digit month of last month)
+# Returns:     List of 4-digit years and 2-digit months
+
+def get_months(first, last):
+    months = []
+    (yyyy, mm) = (int(first[0]), int(first[1]))
+    while (str(yyyy), "{:02d}".format(mm)) <= last:
+        months.append((str(yyyy), "{:02d}".format(mm)))
+        mm += 1
+        if mm > 12:
+            yyyy += 1
+            mm = 1
+    return months
+
 # Name:        print_section_name
 # Purpose:     Print name of section
 # Parameters:  sectionName (section name)
@@ -36,6 +150,139 @@ def print_section_name(sectionName):
     print("")
     return
 
+# Name:        set_page_cache
+# Purpose:     Turn the page cache on or off
+# Parameters:  hours (number of hours a saved page is used, or 0)
+# Returns:     
+
+def set_page_cache(hours):
+    global cacheTTL
+    cacheTTL = hours * 3600
+    return
+
+# Name:        get_page_cache_file
+# Purpose:     Get the location of the saved copy of a web page, which depends on the URL and on the current month
+# Parameters:  url
+# Returns:     Location of file
+
+def get_page_cache_file(url):
+    return "{}/{}_{}.html".format(PAGE_CACHE_DIR, time.strftime("%Y%m"), hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+# Name:        evict_page_cache
+# Purpose:     Delete the pages saved in earlier months
+# Parameters:  
+# Returns:     
+
+def evict_page_cache():
+    if os.path.isdir(PAGE_CACHE_DIR):
+        thisMonth = time.strftime("%Y%m")
+        for entry in os.scandir(PAGE_CACHE_DIR):
+            if entry.name.endswith(".html") and not entry.name.startswith(thisMonth + "_"):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+    return
+
+# Name:        open_url
+# Purpose:     Read a web page once per run
+#              The first job to ask for a page reads it (see read_url), and the other jobs wait for it and get the same
+#              contents (or the same exception)
+#              A page that could not be read is forgotten, so the next job to ask for it tries again
+# Parameters:  url
+# Returns:     Contents of web page (bytes)
+
+def open_url(url):
+    with runPagesLock:
+        first = url not in runPages
+        if first:
+            runPages[url] = Future()
+        future = runPages[url]
+    if first:
+        try:
+            future.set_result(read_url(url))
+        except Exception as e:
+            with runPagesLock:
+                del runPages[url]
+            future.set_exception(e)
+    return future.result()
+
+# Name:        read_url
+# Purpose:     Read a web page, or use its saved copy if the page cache is on and the copy is recent enough
+#              Pages are read through the shared sessions and rate limits of s1_download.py, which keep connections
+#              open, accept gzip-compressed responses, and retry when a host responds with status 429 or 503
+# Parameters:  url
+# Returns:     Contents of web page (bytes)
+
+def read_url(url):
+    cacheFile = get_page_cache_file(url)
+    if cacheTTL > 0:
+        try:
+            if time.time() - os.path.getmtime(cacheFile) < cacheTTL:
+                f = open(cacheFile, "rb")
+                page = f.read()
+                f.close()
+                return page
+        except FileNotFoundError:
+            pass
+    response = request_url("GET", url)
+    response.raise_for_status()
+    page = response.content
+    if cacheTTL > 0:
+        os.makedirs(PAGE_CACHE_DIR, exist_ok=True)
+        # The page is written under a temporary name first, so other threads and processes never see a partial copy
+        tmpFile = "{}.{}.{}.tmp".format(cacheFile, os.getpid(), threading.get_ident())
+        f = open(tmpFile, "wb")
+        f.write(page)
+        f.close()
+        os.replace(tmpFile, cacheFile)
+    return page
+
+# Name:        probe_link
+# Purpose:     Check whether a link exists without downloading the whole file
+#              A HEAD request is sent, or a GET request for the first bytes if the server refuses HEAD
+#              If the server sends the whole file anyway, it is kept for download_pdf (see probedBodies)
+#              Requests go through the shared session and rate limits of s1_download.py
+# Parameters:  url
+# Returns:     True (link exists, i.e., status is not 404) or False
+
+def probe_link(url):
+    try:
+        response = request_url("HEAD", url, allow_redirects=True)
+        if response.status_code in HEAD_REFUSED_STATUSES:
+            response = request_url("GET", url, headers={"Range": PROBE_RANGE}, stream=True)
+            with response:
+                # Status 200 (instead of 206) means the Range header was ignored and the whole file is on its way
+                if response.status_code == 200:
+                    get_probed_bodies()[url] = response.content
+    except requests.RequestException:
+        return False
+    return response.status_code != 404
+
+# Name:        get_probed_bodies
+# Purpose:     Get the PDFs received by probe_link in the current worker thread
+# Parameters:  
+# Returns:     Dictionary of PDFs (bytes) keyed by URL
+
+def get_probed_bodies():
+    if not hasattr(probedBodies, "bodies"):
+        probedBodies.bodies = {}
+    return probedBodies.bodies
+
+# Name:        register_targets
+# Purpose:     Decorator that registers the get_targets_XX function of a state, so that process_state can look it up
+#              A state registered twice is an error, instead of the second function silently replacing the first
+# Parameters:  state (2-letter state abbreviation)
+# Returns:     Decorator
+
+def register_targets(state):
+    def register(get_targets):
+        if state in targetsRegistry:
+            raise ValueError("Targets of state {} are registered twice".format(state))
+        targetsRegistry[state] = get_targets
+        return get_targets
+    return register
+
 # Name:        get_targets_XX
 # Purpose:     Get PDF names and URLs for state XX
 # Parameters:  yyyy (4-digit year)
@@ -47,24 +294,28 @@ def print_section_name(sectionName):
 # Returns:     List of PDF names and list of URLs
 
 # Alabama (AL)
+@register_targets("AL")
 def get_targets_AL(yyyy, yy, mm, month, month3, month4): 
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Alaska (AK)
+@register_targets("AK")
 def get_targets_AK(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Arizona (AZ)
+@register_targets("AZ")
 def get_targets_AZ(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Arkansas (AR)
+@register_targets("AR")
 def get_targets_AR(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
@@ -72,6 +323,7 @@ def get_targets_AR(yyyy, yy, mm, month, month3, month4):
 
 # California (CA)
 # Statement of General Fund Cash Receipts and Disbursements
+@register_targets("CA")
 def get_targets_CA(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
@@ -86,8 +338,7 @@ def get_targets_CA(yyyy, yy, mm, month, month3, month4):
     print("Using default URL.")
 
     url = "https://www.sco.ca.gov/ard_state_cash.html"
-    req = Request(url, headers={"User-Agent": SABLE_USER_AGENT})
-    page = urlopen(req).read()
+    page = open_url(url)
     html = page.decode("utf-8")
     soup = BeautifulSoup(html, "html.parser")
     links = soup.find_all("a")
@@ -97,8 +348,7 @@ def get_targets_CA(yyyy, yy, mm, month, month3, month4):
             url = "https://www.sco.ca.gov{}".format(l.get("href"))
             break
 
-    req = Request(url, headers={"User-Agent": SABLE_USER_AGENT})
-    page = urlopen(req).read()
+    page = open_url(url)
     html = page.decode("utf-8")
     soup = BeautifulSoup(html, "html.parser")
     links = soup.find_all("a")
@@ -116,6 +366,7 @@ def get_targets_CA(yyyy, yy, mm, month, month3, month4):
     return targetPDFNames, targetURLs
 
 # Colorado (CO)
+@register_targets("CO")
 def get_targets_CO(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
@@ -123,13 +374,13 @@ def get_targets_CO(yyyy, yy, mm, month, month3, month4):
 
 # Connecticut (CT)
 # Monthly Comparative Statement of Tax Revenue
+@register_targets("CT")
 def get_targets_CT(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
 
     url = "http://portal.ct.gov/DRS/DRS-Reports/Comparative-Statement-Reports/{}---{}-Monthly-Comparative-Statements".format(yyyy, int(yyyy)-1) 
-    req = Request(url, headers={"User-Agent": SABLE_USER_AGENT})
-    page = urlopen(req).read()
+    page = open_url(url)
     html = page.decode("utf-8")
     soup = BeautifulSoup(html, "html.parser")
     div = soup.find("div", {"class": "content"})
@@ -152,138 +403,161 @@ def get_targets_CT(yyyy, yy, mm, month, month3, month4):
     return targetPDFNames, targetURLs
 
 # Delaware (DE)
+@register_targets("DE")
 def get_targets_DE(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # District of Columbia (DC)
-def get_targets_DE(yyyy, yy, mm, month, month3, month4):
+@register_targets("DC")
+def get_targets_DC(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Florida (FL)
+@register_targets("FL")
 def get_targets_FL(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Georgia (GA)
+@register_targets("GA")
 def get_targets_GA(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Hawaii (HI)
+@register_targets("HI")
 def get_targets_HI(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Idaho (ID)
+@register_targets("ID")
 def get_targets_ID(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Illinois (IL)
+@register_targets("IL")
 def get_targets_IL(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Indiana (IN)
+@register_targets("IN")
 def get_targets_IN(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Iowa (IA)
+@register_targets("IA")
 def get_targets_IA(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Kansas (KS)
+@register_targets("KS")
 def get_targets_KS(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Kentucky (KY)
+@register_targets("KY")
 def get_targets_KY(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Louisiana (LA)
+@register_targets("LA")
 def get_targets_LA(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Maine (ME)
+@register_targets("ME")
 def get_targets_ME(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Maryland (MD)
+@register_targets("MD")
 def get_targets_MD(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Massachusetts (MA)
+@register_targets("MA")
 def get_targets_MA(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Michigan (MI)
+@register_targets("MI")
 def get_targets_MI(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Minnesota (MN)
+@register_targets("MN")
 def get_targets_MN(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Mississippi (MS)
+@register_targets("MS")
 def get_targets_MS(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Missouri (MO)
+@register_targets("MO")
 def get_targets_MO(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Montana (MT)
+@register_targets("MT")
 def get_targets_MT(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Nebraska (NE)
+@register_targets("NE")
 def get_targets_NE(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Nevada (NV)
+@register_targets("NV")
 def get_targets_NV(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # New Hampshire (NH)
+@register_targets("NH")
 def get_targets_NH(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
@@ -291,6 +565,7 @@ def get_targets_NH(yyyy, yy, mm, month, month3, month4):
 
 # New Jersey (NJ)
 # Month and Year-to-Date Cash Collections
+@register_targets("NJ")
 def get_targets_NJ(yyyy, yy, mm, month, month3, month4):
     fyyy = yyyy
     if mm in ["07", "08", "09", "10", "11", "12"]:
@@ -306,8 +581,7 @@ def get_targets_NJ(yyyy, yy, mm, month, month3, month4):
         targetPDFNames = []
         targetURLs = []
 
-        req = Request(url, headers={"User-Agent": SABLE_USER_AGENT})
-        page = urlopen(req).read()
+        page = open_url(url)
         html = page.decode("utf-8")
         soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("td"))
         cells = soup.find_all("td")
@@ -324,8 +598,7 @@ def get_targets_NJ(yyyy, yy, mm, month, month3, month4):
             print("Press release NOT found.")
             return targetPDFNames, targetURLs
 
-        req = Request(link, headers={"User-Agent": SABLE_USER_AGENT})
-        page = urlopen(req).read()
+        page = open_url(link)
         html = page.decode("utf-8")
         soup = BeautifulSoup(html, "html.parser")
         links = soup.find_all("a")
@@ -337,13 +610,11 @@ def get_targets_NJ(yyyy, yy, mm, month, month3, month4):
                     target_name = link[link.rfind("/")+1:link.rfind(".pdf")]
                     target_link_a = "https://www.nj.gov/treasury/news/{}/{}".format(nyyy, link)
                     target_link_b = "https://www.nj.gov/treasury/{}".format(link)
-                    r = requests.get(target_link_a)
-                    if r.status_code != 404:
+                    if probe_link(target_link_a):
                         print("Link found.")
                         targetPDFNames.append(target_name)
                         targetURLs.append(target_link_a)
-                    r = requests.get(target_link_b)
-                    if r.status_code != 404:
+                    if probe_link(target_link_b):
                         print("Link found.")
                         targetPDFNames.append(target_name)
                         targetURLs.append(target_link_b)
@@ -361,13 +632,11 @@ def get_targets_NJ(yyyy, yy, mm, month, month3, month4):
                             target_name = link[link.rfind("/")+1:link.rfind(".pdf")]
                             target_link_a = "https://www.nj.gov/treasury/news/{}/{}".format(nyyy, link)
                             target_link_b = "https://www.nj.gov/treasury/{}".format(link)
-                            r = requests.get(target_link_a)
-                            if r.status_code != 404:
+                            if probe_link(target_link_a):
                                 print("Link found.")
                                 targetPDFNames.append(target_name)
                                 targetURLs.append(target_link_a)
-                            r = requests.get(target_link_b)
-                            if r.status_code != 404:
+                            if probe_link(target_link_b):
                                 print("Link found.")
                                 targetPDFNames.append(target_name)
                                 targetURLs.append(target_link_b)
@@ -395,42 +664,49 @@ def get_targets_NJ(yyyy, yy, mm, month, month3, month4):
     return targetPDFNames, targetURLs
 
 # New Mexico (NM)
+@register_targets("NM")
 def get_targets_NM(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # New York (NY)
+@register_targets("NY")
 def get_targets_NY(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # North Carolina (NC)
+@register_targets("NC")
 def get_targets_NC(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # North Dakota (ND)
+@register_targets("ND")
 def get_targets_ND(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Ohio (OH)
+@register_targets("OH")
 def get_targets_OH(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Oklahoma (OK)
+@register_targets("OK")
 def get_targets_OK(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Oregon (OR)
+@register_targets("OR")
 def get_targets_OR(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
@@ -438,6 +714,7 @@ def get_targets_OR(yyyy, yy, mm, month, month3, month4):
 
 # Pennsylvania (PA)
 # Monthly Revenue Report
+@register_targets("PA")
 def get_targets_PA(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
@@ -451,97 +728,125 @@ def get_targets_PA(yyyy, yy, mm, month, month3, month4):
     return targetPDFNames, targetURLs
 
 # Puerto Rico (PR)
-def get_targets_PA(yyyy, yy, mm, month, month3, month4):
+@register_targets("PR")
+def get_targets_PR(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Rhode Island (RI)
+@register_targets("RI")
 def get_targets_RI(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # South Carolina (SC)
+@register_targets("SC")
 def get_targets_SC(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # South Dakota (SD)
+@register_targets("SD")
 def get_targets_SD(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Tennessee (TN)
+@register_targets("TN")
 def get_targets_TN(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Texas (TX)
+@register_targets("TX")
 def get_targets_TX(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Utah (UT)
+@register_targets("UT")
 def get_targets_UT(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Vermont (VT)
+@register_targets("VT")
 def get_targets_VT(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Virginia (VA)
+@register_targets("VA")
 def get_targets_VA(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Washington (WA)
+@register_targets("WA")
 def get_targets_WA(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # West Virginia (WV)
+@register_targets("WV")
 def get_targets_WV(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Wisconsin (WI)
+@register_targets("WI")
 def get_targets_WI(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
 # Wyoming (WY)
+@register_targets("WY")
 def get_targets_WY(yyyy, yy, mm, month, month3, month4):
     targetPDFNames = []
     targetURLs = []
     return targetPDFNames, targetURLs
 
-# Name:        get_filename_unix
-# Purpose:     Account for special character codes in filename after the file is downloaded to a Linux/Unix environment
-# Parameters:  name (name of file)
-# Returns:     Name of file with special character codes replaced with special characters
+# Name:        run_command
+# Purpose:     Run a command and print its output (so that the output of wget is kept with the output of its state)
+# Parameters:  args (list of command and arguments)
+# Returns:     
+
+def run_command(args):
+    result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = result.stdout.decode("utf-8", "replace")
+    if output != "":
+        print(output, end="")
+    return
+
+# Name:        is_pdf_complete
+# Purpose:     Check that a downloaded file has the header and trailer of a PDF, which catches HTML error pages and
+#              truncated downloads without converting the file
+# Parameters:  pdfLoc (path of file)
+# Returns:     True (file looks like a complete PDF) or False
 
-def get_filename_unix(name):
-    nameUnix = re.sub(r"%20", " ", name)
-    nameUnix = re.sub(r"%28", "(", nameUnix)
-    nameUnix = re.sub(r"%29", ")", nameUnix)
-    nameUnix = re.sub(r"%2C", ",", nameUnix)
-    return nameUnix
+def is_pdf_complete(pdfLoc):
+    f = open(pdfLoc, "rb")
+    head = f.read(PDF_MARKER_RANGE)
+    f.seek(max(0, os.path.getsize(pdfLoc) - PDF_MARKER_RANGE))
+    tail = f.read()
+    f.close()
+    return PDF_HEADER in head and PDF_TRAILER in tail
 
 # Name:        download_pdf
-# Purpose:     Download the PDF
+# Purpose:     Download the PDF and convert it to the TXT file used by m2_scrape.py
+#              Each state downloads to its own temporary file, so states can be downloaded at the same time
 # Parameters:  projName (project name)
 #              state (2-letter state abbreviation)
 #              yyyy (4-digit year)
@@ -553,6 +858,9 @@ def get_filename_unix(name):
 def download_pdf(projName, state, yyyy, mm, targetPDFNames, targetURLs):
     PDFName = "{}_{}_{}".format(state, yyyy, mm)
     pdfLoc = "./{}/pdf/{}.pdf".format(projName, PDFName)
+    partLoc = "./{}/pdf/{}.pdf.part".format(projName, PDFName)
+    txtLoc = "./{}/txt/{}.txt".format(projName, PDFName)
+    txtPartLoc = "./{}/txt/{}.txt.part".format(projName, PDFName)
     pdfDownloaded = False
 
     # If the PDF already exists
@@ -561,28 +869,38 @@ def download_pdf(projName, state, yyyy, mm, targetPDFNames, targetURLs):
     else:
         # Iterate through the target URLs
         for i in range(len(targetURLs)):
-            targetPDFName = targetPDFNames[i]
-            targetPDFNameUnix = get_filename_unix(targetPDFName)
             targetURL = targetURLs[i]
             # If the PDF is not downloaded
             if not pdfDownloaded:
-                # Try using wget to download PDF
-                os.system("wget --no-check-certificate -nv --user-agent=\"{}\" -P ./{}/pdf \"{}\"".format(SABLE_USER_AGENT, projName, targetURL))
+                body = get_probed_bodies().pop(targetURL, None)
+                if body is not None:
+                    # Use the PDF already received by probe_link
+                    f = open(partLoc, "wb")
+                    f.write(body)
+                    f.close()
+                else:
+                    # Try using wget to download PDF
+                    wait_for_host(targetURL)
+                    run_command(["wget", "--no-check-certificate", "-nv", "--user-agent={}".format(SABLE_USER_AGENT), "-O", partLoc, targetURL])
+                # If the file exists but is not a complete PDF
+                if os.path.isfile(partLoc) and not is_pdf_complete(partLoc):
+                    os.remove(partLoc)
                 # If the PDF exists
-                if os.path.isfile("./{}/pdf/{}.pdf".format(projName, targetPDFNameUnix)):
-                    # Try converting the PDF to TXT format
-                    os.system("pdftotext -q -layout \"./{}/pdf/{}.pdf\" ./{}/pdf/test.txt".format(projName, targetPDFNameUnix, projName))
-                    # If the converted TXT file does not exist
-                    if not os.path.isfile("./{}/pdf/test.txt".format(projName)):
-                        os.system("rm \"./{}/pdf/{}.pdf\"".format(projName, targetPDFNameUnix))
-                    # If the converted TXT file has size 0
-                    elif os.stat("./{}/pdf/test.txt".format(projName)).st_size == 0:
-                        os.system("rm \"./{}/pdf/{}.pdf\"".format(projName, targetPDFNameUnix))
-                        os.system("rm ./{}/pdf/test.txt".format(projName))
+                elif os.path.isfile(partLoc):
+                    # Try converting the PDF to TXT format, keeping the TXT file for m2_scrape.py
+                    # The TXT file is written under a temporary name, so a TXT file left by an earlier run is never
+                    # taken for the text of this PDF
+                    run_command(["pdftotext", "-q", "-layout", partLoc, txtPartLoc])
+                    # If the converted TXT file does not exist or has size 0
+                    if not os.path.isfile(txtPartLoc) or os.stat(txtPartLoc).st_size == 0:
+                        os.remove(partLoc)
+                        for loc in [txtPartLoc, txtLoc]:
+                            if os.path.isfile(loc):
+                                os.remove(loc)
                     # PDF is downloaded and can be converted to TXT format
                     else:
-                        os.system("rm ./{}/pdf/test.txt".format(projName))
-                        os.system("mv \"./{}/pdf/{}.pdf\" {}".format(projName, targetPDFNameUnix, pdfLoc))
+                        os.replace(txtPartLoc, txtLoc)
+                        os.replace(partLoc, pdfLoc)
                         # Set pdfDownloaded to True
                         pdfDownloaded = True
                         print("PDF downloaded.")
@@ -592,16 +910,52 @@ def download_pdf(projName, state, yyyy, mm, targetPDFNames, targetURLs):
             return "dlno"
     return "exist"
 
-# Name:        download_pdfs
-# Purpose:     Download PDFs
+# Name:        process_state
+# Purpose:     Get the target PDFs of a state for a month and download one of them
 # Parameters:  projName (project name)
+#              state (2-letter state abbreviation)
+#              sectionName (name of state, followed by the month in range mode)
 #              yyyy (4-digit year)
 #              mm (2-digit month)
-# Returns:     
+# Returns:     status (string indicating PDF download status)
 
-def download_pdfs(projName, yyyy, mm):
-    # Create year and month values
+def process_state(projName, state, sectionName, yyyy, mm):
+    print_section_name(sectionName)
     yy = yyyy[2:]
+    (month, month3, month4) = get_month_names(mm)
+    targetPDFNames = []
+    targetURLs = []
+    try:
+        if state in targetsRegistry:
+            targetPDFNames, targetURLs = targetsRegistry[state](yyyy, yy, mm, month, month3, month4)
+        return download_pdf(projName, state, yyyy, mm, targetPDFNames, targetURLs)
+    finally:
+        # PDFs received by probe_link that were not used (the first target URL was downloaded, for example) are dropped
+        get_probed_bodies().clear()
+
+# Name:        process_state_buffered
+# Purpose:     Run process_state in a worker thread and collect what it prints (see StateOutput)
+# Parameters:  Same as process_state
+# Returns:     Printed text, status (or None), and exception raised by process_state (or None)
+
+def process_state_buffered(projName, state, sectionName, yyyy, mm):
+    sys.stdout.local.buffer = []
+    try:
+        status = process_state(projName, state, sectionName, yyyy, mm)
+        error = None
+    except Exception as e:
+        status = None
+        error = e
+    output = "".join(sys.stdout.local.buffer)
+    sys.stdout.local.buffer = None
+    return (output, status, error)
+
+# Name:        get_month_names
+# Purpose:     Get the names of a month as they appear on state websites
+# Parameters:  mm (2-digit month)
+# Returns:     month, month3 (3-letter month), and month4 (4-letter month)
+
+def get_month_names(mm):
     month = ""
     month3 = ""
     month4 = ""
@@ -653,7 +1007,17 @@ def download_pdfs(projName, yyyy, mm):
         month = "December"
         month3 = "Dec"
         month4 = "Dec"
+    return (month, month3, month4)
 
+# Name:        download_pdfs
+# Purpose:     Download PDFs
+# Parameters:  projName (project name)
+#              months (list of 4-digit years and 2-digit months)
+#              workers (number of states and months processed at the same time)
+#              cache (number of hours a saved web page is used, or 0)
+# Returns:     
+
+def download_pdfs(projName, months, workers=1, cache=0):
     # Dictionary of state abbreviations (includes District of Columbia and Puerto Rico)
     statesDict = {"AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California",
         "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware", "DC": "District of Columbia", "FL": "Florida",
@@ -669,118 +1033,44 @@ def download_pdfs(projName, yyyy, mm):
     # List of states to loop through
     states = ["CA", "CT", "NJ", "PA"]
 
+    set_page_cache(cache)
+    if cache > 0:
+        evict_page_cache()
+
+    # Plan a job for each state and month
+    # With more than one month (range mode), the month is added to the name of each section
+    jobs = []
+    for (yyyy, mm) in months:
+        for state in states:
+            if len(months) == 1:
+                sectionName = statesDict[state]
+            else:
+                sectionName = "{} ({}-{})".format(statesDict[state], yyyy, mm)
+            jobs.append((projName, state, sectionName, yyyy, mm))
+
     # Empty list of statuses
     statuses = []
-    
-    for state in states:
-        print_section_name(statesDict[state])
-        targetPDFNames = []
-        targetURLs = []
-        if state == "AL":
-            targetPDFNames, targetURLs = get_targets_AL(yyyy, yy, mm, month, month3, month4)
-        elif state == "AK":
-            targetPDFNames, targetURLs = get_targets_AK(yyyy, yy, mm, month, month3, month4)
-        elif state == "AZ":
-            targetPDFNames, targetURLs = get_targets_AZ(yyyy, yy, mm, month, month3, month4)
-        elif state == "AR":
-            targetPDFNames, targetURLs = get_targets_AR(yyyy, yy, mm, month, month3, month4)
-        elif state == "CA":
-            targetPDFNames, targetURLs = get_targets_CA(yyyy, yy, mm, month, month3, month4)
-        elif state == "CO":
-            targetPDFNames, targetURLs = get_targets_CO(yyyy, yy, mm, month, month3, month4)
-        elif state == "CT":
-            targetPDFNames, targetURLs = get_targets_CT(yyyy, yy, mm, month, month3, month4)
-        elif state == "DE":
-            targetPDFNames, targetURLs = get_targets_DE(yyyy, yy, mm, month, month3, month4)
-        elif state == "DC":
-            targetPDFNames, targetURLs = get_targets_DC(yyyy, yy, mm, month, month3, month4)
-        elif state == "FL":
-            targetPDFNames, targetURLs = get_targets_FL(yyyy, yy, mm, month, month3, month4)
-        elif state == "GA":
-            targetPDFNames, targetURLs = get_targets_GA(yyyy, yy, mm, month, month3, month4)
-        elif state == "HI":
-            targetPDFNames, targetURLs = get_targets_HI(yyyy, yy, mm, month, month3, month4)
-        elif state == "ID":
-            targetPDFNames, targetURLs = get_targets_ID(yyyy, yy, mm, month, month3, month4)
-        elif state == "IL":
-            targetPDFNames, targetURLs = get_targets_IL(yyyy, yy, mm, month, month3, month4)
-        elif state == "IN":
-            targetPDFNames, targetURLs = get_targets_IN(yyyy, yy, mm, month, month3, month4)
-        elif state == "IA":
-            targetPDFNames, targetURLs = get_targets_IA(yyyy, yy, mm, month, month3, month4)
-        elif state == "KS":
-            targetPDFNames, targetURLs = get_targets_KS(yyyy, yy, mm, month, month3, month4)
-        elif state == "KY":
-            targetPDFNames, targetURLs = get_targets_KY(yyyy, yy, mm, month, month3, month4)
-        elif state == "LA":
-            targetPDFNames, targetURLs = get_targets_LA(yyyy, yy, mm, month, month3, month4)
-        elif state == "ME":
-            targetPDFNames, targetURLs = get_targets_ME(yyyy, yy, mm, month, month3, month4)
-        elif state == "MD":
-            targetPDFNames, targetURLs = get_targets_MD(yyyy, yy, mm, month, month3, month4)
-        elif state == "MA":
-            targetPDFNames, targetURLs = get_targets_MA(yyyy, yy, mm, month, month3, month4)
-        elif state == "MI":
-            targetPDFNames, targetURLs = get_targets_MI(yyyy, yy, mm, month, month3, month4)
-        elif state == "MN":
-            targetPDFNames, targetURLs = get_targets_MN(yyyy, yy, mm, month, month3, month4)
-        elif state == "MS":
-            targetPDFNames, targetURLs = get_targets_MS(yyyy, yy, mm, month, month3, month4)
-        elif state == "MO":
-            targetPDFNames, targetURLs = get_targets_MO(yyyy, yy, mm, month, month3, month4)
-        elif state == "MT":
-            targetPDFNames, targetURLs = get_targets_MT(yyyy, yy, mm, month, month3, month4)
-        elif state == "NE":
-            targetPDFNames, targetURLs = get_targets_NE(yyyy, yy, mm, month, month3, month4)
-        elif state == "NV":
-            targetPDFNames, targetURLs = get_targets_NV(yyyy, yy, mm, month, month3, month4)
-        elif state == "NH":
-            targetPDFNames, targetURLs = get_targets_NH(yyyy, yy, mm, month, month3, month4)
-        elif state == "NJ":
-            targetPDFNames, targetURLs = get_targets_NJ(yyyy, yy, mm, month, month3, month4)
-        elif state == "NM":
-            targetPDFNames, targetURLs = get_targets_NM(yyyy, yy, mm, month, month3, month4)
-        elif state == "NY":
-            targetPDFNames, targetURLs = get_targets_NY(yyyy, yy, mm, month, month3, month4)
-        elif state == "NC":
-            targetPDFNames, targetURLs = get_targets_NC(yyyy, yy, mm, month, month3, month4)
-        elif state == "ND":
-            targetPDFNames, targetURLs = get_targets_ND(yyyy, yy, mm, month, month3, month4)
-        elif state == "OH":
-            targetPDFNames, targetURLs = get_targets_OH(yyyy, yy, mm, month, month3, month4)
-        elif state == "OK":
-            targetPDFNames, targetURLs = get_targets_OK(yyyy, yy, mm, month, month3, month4)
-        elif state == "OR":
-            targetPDFNames, targetURLs = get_targets_OR(yyyy, yy, mm, month, month3, month4)
-        elif state == "PA":
-            targetPDFNames, targetURLs = get_targets_PA(yyyy, yy, mm, month, month3, month4)
-        elif state == "PR":
-            targetPDFNames, targetURLs = get_targets_PR(yyyy, yy, mm, month, month3, month4)
-        elif state == "RI":
-            targetPDFNames, targetURLs = get_targets_RI(yyyy, yy, mm, month, month3, month4)
-        elif state == "SC":
-            targetPDFNames, targetURLs = get_targets_SC(yyyy, yy, mm, month, month3, month4)
-        elif state == "SD":
-            targetPDFNames, targetURLs = get_targets_SD(yyyy, yy, mm, month, month3, month4)
-        elif state == "TN":
-            targetPDFNames, targetURLs = get_targets_TN(yyyy, yy, mm, month, month3, month4)
-        elif state == "TX":
-            targetPDFNames, targetURLs = get_targets_TX(yyyy, yy, mm, month, month3, month4)
-        elif state == "UT":
-            targetPDFNames, targetURLs = get_targets_UT(yyyy, yy, mm, month, month3, month4)
-        elif state == "VT":
-            targetPDFNames, targetURLs = get_targets_VT(yyyy, yy, mm, month, month3, month4)
-        elif state == "VA":
-            targetPDFNames, targetURLs = get_targets_VA(yyyy, yy, mm, month, month3, month4)
-        elif state == "WA":
-            targetPDFNames, targetURLs = get_targets_WA(yyyy, yy, mm, month, month3, month4)
-        elif state == "WV":
-            targetPDFNames, targetURLs = get_targets_WV(yyyy, yy, mm, month, month3, month4)
-        elif state == "WI":
-            targetPDFNames, targetURLs = get_targets_WI(yyyy, yy, mm, month, month3, month4)
-        elif state == "WY":
-            targetPDFNames, targetURLs = get_targets_WY(yyyy, yy, mm, month, month3, month4)
-        statuses.append(download_pdf(projName, state, yyyy, mm, targetPDFNames, targetURLs))
+
+    if workers == 1:
+        for job in jobs:
+            statuses.append(process_state(*job))
+    else:
+        # Resolve targets and download PDFs for several jobs at the same time
+        # The output of each job is printed as a whole, in the order of the list of jobs
+        stdout = sys.stdout
+        sys.stdout = StateOutput(stdout)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(process_state_buffered, *job) for job in jobs]
+                for future in futures:
+                    (output, status, error) = future.result()
+                    stdout.write(output)
+                    stdout.flush()
+                    if error is not None:
+                        raise error
+                    statuses.append(status)
+        finally:
+            sys.stdout = stdout
 
     print_section_name("Summary")
     print("Number of PDFs that already exist:     {}".format(len([status for status in statuses if status == "exist"])))
@@ -792,10 +1082,12 @@ def download_pdfs(projName, yyyy, mm):
 def main():
     # Check valid arguments
     if valid_arguments():
-        download_pdfs(sys.argv[1], sys.argv[2], sys.argv[3])
+        options = get_options(sys.argv[2:])
+        download_pdfs(sys.argv[1], options["months"], options["workers"], options["cache"])
     else:
         print("\nInvalid arguments")
-        print("Invocation:  python3 m1_download.py <projName> <yyyy> <mm>\n")
+        print("Invocation:  python3 m1_download.py <projName> <yyyy> <mm> [--workers <n>] [--cache <hours>]")
+        print("             python3 m1_download.py <projName> --from <yyyy-mm> --to <yyyy-mm> [--workers <n>] [--cache <hours>]\n")
     return
 
 if __name__ == "__main__":
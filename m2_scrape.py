@@ -1,11 +1,46 @@
 # Name:        m2_scrape.py
 # Purpose:     Scrape specific tax revenue values from downloaded PDFs
-# Invocation:  python3 m2_scrape.py <projName> <yyyy> <mm>
+# Invocation:  python3 m2_scrape.py <projName> <yyyy> <mm> [--workers <n>] [--db | --incremental]
+#              python3 m2_scrape.py <projName> --from <yyyy-mm> --to <yyyy-mm> [--workers <n>] [--db | --incremental]
+#              python3 m2_scrape.py <projName> --benchmark
 
 import codecs
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+import glob
+import hashlib
+import inspect
+import io
 import os
 import re
+import sqlite3
 import sys
+import threading
+from time import perf_counter
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# Years and months accepted on the command line
+YEARS_VALID = [str(yyyy) for yyyy in range(2000, 2051)]
+MONTHS_VALID = ["01", "02", "03", "04", "05", "06", "07", "08", "09", "10", "11", "12"]
+
+# Minimum number of seconds for which the template of each state is run by benchmark_templates
+BENCHMARK_SECONDS = 2
+
+# Number of dollars in each unit of tax values, used to store tax values in dollars in the product database
+# (see create_output_db)
+TAX_UNIT_DOLLARS = {"dollars": 1, "thousands": 1000, "millions": 1000000, "billions": 1000000000}
+
+# Number of seconds a process waits for another process to finish writing to the product database
+PRODUCT_DB_TIMEOUT = 60
+
+# Template of each state, keyed by 2-letter state abbreviation (see register_template)
+# The patterns of a template are compiled when it is first used, so only the states being scraped are compiled
+templatesRegistry = {}
+templatesLock = threading.Lock()
 
 # Name:        valid_arguments
 # Purpose:     Check whether the command-line arguments are valid
@@ -13,12 +48,76 @@ import sys
 # Returns:     True (all arguments are valid) or False (at least one argument is invalid)
 
 def valid_arguments():
-    yearsValid = [str(yyyy) for yyyy in range(2000, 2051)]
-    monthsValid = ["01", "02", "03", "04", "05", "06", "07", "08", "09", "10", "11", "12"]
-    if len(sys.argv) == 4 and re.search(r"^[a-zA-Z][a-zA-Z_-]*$", sys.argv[1]) and sys.argv[2] in yearsValid and sys.argv[3] in monthsValid:
+    if len(sys.argv) >= 3 and re.search(r"^[a-zA-Z][a-zA-Z_-]*$", sys.argv[1]) and get_options(sys.argv[2:]) is not None:
         return True
     return False
 
+# Name:        get_options
+# Purpose:     Parse the command-line arguments that follow <projName>
+#              Either <yyyy> <mm>, the range of months --from <yyyy-mm> --to <yyyy-mm>, or --benchmark must be given
+# Parameters:  args (list of command-line arguments)
+# Returns:     Dictionary of option values or None (at least one argument is invalid)
+
+def get_options(args):
+    options = {"months": [], "range": False, "workers": 1, "benchmark": False, "db": False, "incremental": False}
+    first = None
+    last = None
+    i = 0
+    if len(args) >= 2 and args[0] in YEARS_VALID and args[1] in MONTHS_VALID:
+        options["months"] = [(args[0], args[1])]
+        i = 2
+    while i < len(args):
+        if args[i] in ("--from", "--to") and i + 1 < len(args) and re.search(r"^[0-9]{4}-[0-9]{2}$", args[i + 1]) and args[i + 1][:4] in YEARS_VALID and args[i + 1][5:] in MONTHS_VALID:
+            if args[i] == "--from":
+                first = (args[i + 1][:4], args[i + 1][5:])
+            else:
+                last = (args[i + 1][:4], args[i + 1][5:])
+            i += 2
+        elif args[i] == "--workers" and i + 1 < len(args) and re.search(r"^[1-9][0-9]*$", args[i + 1]):
+            options["workers"] = int(args[i + 1])
+            i += 2
+        elif args[i] == "--benchmark":
+            options["benchmark"] = True
+            i += 1
+        elif args[i] == "--db":
+            options["db"] = True
+            i += 1
+        elif args[i] == "--incremental":
+            options["incremental"] = True
+            i += 1
+        else:
+            return None
+    if first is not None or last is not None:
+        if len(options["months"]) > 0 or first is None or last is None or first > last:
+            return None
+        options["months"] = get_months(first, last)
+        options["range"] = True
+    if options["benchmark"]:
+        if len(options["months"]) > 0 or options["db"] or options["incremental"]:
+            return None
+    elif options["db"] and options["incremental"]:
+        return None
+    elif len(options["months"]) == 0:
+        return None
+    return options
+
+# Name:        get_months
+# Purpose:     List the months in a range
+# Parameters:  first (4-digit year and 2-digit month of first month)
+#              last (4-digit year and 2-digit month of last month)
+# Returns:     List of 4-digit years and 2-digit months
+
+def get_months(first, last):
+    months = []
+    (yyyy, mm) = (int(first[0]), int(first[1]))
+    while (str(yyyy), "{:02d}".format(mm)) <= last:
+        months.append((str(yyyy), "{:02d}".format(mm)))
+        mm += 1
+        if mm > 12:
+            yyyy += 1
+            mm = 1
+    return months
+
 # Name:        print_section_name
 # Purpose:     Print name of section
 # Parameters:  sectionName (section name)
@@ -86,6 +185,117 @@ def clean_value(value):
         value_new = value_temp
     return value_new
 
+# Name:        get_tax_keyword
+# Purpose:     Find the longest run of literal characters that every match of a tax regex contains
+#              Lines of text are lowercase (see clean_text), so the keyword is lowercase if the regex ignores case
+# Parameters:  tax_regex (regular expression of tax type)
+#              flags (flags of regular expression)
+# Returns:     Keyword of tax type ("" if the regex has no required literal characters)
+
+def get_tax_keyword(tax_regex, flags=0):
+    keyword = ""
+    run = ""
+    for (op, av) in list(sre_parse.parse(tax_regex, flags)) + [(None, None)]:
+        if op == sre_parse.LITERAL:
+            run += chr(av)
+        else:
+            if len(run) > len(keyword):
+                keyword = run
+            run = ""
+    if flags & re.I:
+        keyword = keyword.lower()
+    return keyword
+
+# Name:        compile_tax_types
+# Purpose:     Compile the pattern of each tax type of a template and index the tax types by keyword
+#              The patterns are compiled once, when the template is first used, instead of being built from strings and
+#              looked up in the cache of the re module for every tax type on every line
+# Parameters:  tax_types_list (list of tax types and regular expressions)
+#              before (regular expression before the tax type)
+#              after (regular expression after the tax type, usually the values)
+#              flags (flags of regular expression)
+# Returns:     Index of tax types (see get_tax_type_candidates)
+
+def compile_tax_types(tax_types_list, before, after, flags=0):
+    keywords = {}
+    for l in range(len(tax_types_list)):
+        tax_type_entry = tax_types_list[l]
+        tax_type_entry["pattern"] = re.compile(before + tax_type_entry["tax_regex"] + after, flags)
+        keyword = get_tax_keyword(tax_type_entry["tax_regex"], flags)
+        if keyword not in keywords:
+            keywords[keyword] = []
+        keywords[keyword].append(l)
+
+    tax_types_index = {"tax_types": tax_types_list, "keywords": list(keywords.items()), "any_keyword": None}
+    if "" not in keywords:
+        tax_types_index["any_keyword"] = re.compile("|".join(re.escape(keyword) for keyword in keywords))
+    return tax_types_index
+
+# Name:        get_tax_type_candidates
+# Purpose:     Find the tax types whose pattern can match a line, so that only their patterns are searched
+#              A line without any keyword is rejected with a single search; otherwise the tax types whose keyword is in
+#              the line are returned in the order of the list of tax types
+# Parameters:  tax_types_index (index of tax types returned by compile_tax_types)
+#              line (line of text)
+# Returns:     List of indices of tax types
+
+def get_tax_type_candidates(tax_types_index, line):
+    candidates = []
+    if tax_types_index["any_keyword"] is not None and not tax_types_index["any_keyword"].search(line):
+        return candidates
+    for (keyword, indices) in tax_types_index["keywords"]:
+        if keyword in line:
+            candidates.extend(indices)
+    candidates.sort()
+    return candidates
+
+# Name:        register_template
+# Purpose:     Decorator that registers the scrape_data_XX function of a state, so that scrape_data can look it up
+#              A state registered twice is an error, instead of the second function silently replacing the first
+# Parameters:  state (2-letter state abbreviation)
+#              compile_patterns (function that compiles the patterns of the template and returns them in a dictionary,
+#              or None if the template has no patterns)
+# Returns:     Decorator
+
+def register_template(state, compile_patterns=None):
+    def register(scrape_data_state):
+        if state in templatesRegistry:
+            raise ValueError("Template of state {} is registered twice".format(state))
+        templatesRegistry[state] = {"scrape": scrape_data_state, "compile": compile_patterns, "patterns": None}
+        return scrape_data_state
+    return register
+
+# Name:        get_template_patterns
+# Purpose:     Get the patterns of the template of a state, compiling them the first time they are needed
+# Parameters:  state (2-letter state abbreviation)
+# Returns:     Dictionary of patterns
+
+def get_template_patterns(state):
+    template = templatesRegistry[state]
+    with templatesLock:
+        if template["patterns"] is None:
+            template["patterns"] = template["compile"]()
+    return template["patterns"]
+
+# Name:        get_template_version
+# Purpose:     Get the version of the template of a state, which changes whenever its code or patterns change
+#              Changes to the functions shared by the templates (such as clean_value) are not detected
+# Parameters:  state (2-letter state abbreviation)
+# Returns:     SHA-256 digest of the source code and patterns of the template
+
+def get_template_version(state):
+    template = templatesRegistry[state]
+    parts = [inspect.getsource(template["scrape"])]
+    if template["compile"] is not None:
+        patterns = get_template_patterns(state)
+        for name in sorted(patterns):
+            if isinstance(patterns[name], dict):
+                for tax_type_entry in patterns[name]["tax_types"]:
+                    parts.append("{}|{}|{}|{}".format(name, tax_type_entry["tax_type"], tax_type_entry["pattern"].pattern, tax_type_entry["pattern"].flags))
+            else:
+                parts.append("{}|{}|{}".format(name, patterns[name].pattern, patterns[name].flags))
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
 # Name:        scrape_data_XX
 # Purpose:     Apply a template and scrape data from the PDF for state XX
 # Parameters:  lines_clean (clean lines of text)
@@ -95,6 +305,7 @@ def clean_value(value):
 # Returns:     List of lists (one for each line item) containing scraped data
 
 # Alabama (AL)
+@register_template("AL")
 def scrape_data_AL(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -113,6 +324,7 @@ def scrape_data_AL(lines_clean, state, yyyy, mm):
     return data
 
 # Alaska (AK)
+@register_template("AK")
 def scrape_data_AK(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -131,6 +343,7 @@ def scrape_data_AK(lines_clean, state, yyyy, mm):
     return data
 
 # Arizona (AZ)
+@register_template("AZ")
 def scrape_data_AZ(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -149,6 +362,7 @@ def scrape_data_AZ(lines_clean, state, yyyy, mm):
     return data
 
 # Arkansas (AR)
+@register_template("AR")
 def scrape_data_AR(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -167,6 +381,80 @@ def scrape_data_AR(lines_clean, state, yyyy, mm):
     return data
 
 # California (CA)
+# Tax types of the template, whose patterns are compiled when the template is first used (see get_template_patterns)
+CA_VALUES = "\s+\$?\s*([\d,.()-]+)" * 4
+
+CA_TAX_TYPES = []
+CA_TAX_TYPES.append({"tax_type": "alcoholic beverage excise taxes general fund",   "tax_regex": "alcoholic\s*beverage\s*excise\s*taxes"})
+CA_TAX_TYPES.append({"tax_type": "alcoholic beverage excise taxes special funds",  "tax_regex": "alcoholic\s*beverage\s*excise\s*taxes"})
+CA_TAX_TYPES.append({"tax_type": "corporation tax general fund",                   "tax_regex": "corporation\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "corporation tax special funds",                  "tax_regex": "corporation\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "cigarette tax general fund",                     "tax_regex": "cigarette\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "cigarette tax special funds",                    "tax_regex": "cigarette\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "cannabis excise taxes general fund",             "tax_regex": "cannabis\s*excise\s*taxes"})
+CA_TAX_TYPES.append({"tax_type": "cannabis excise taxes special funds",            "tax_regex": "cannabis\s*excise\s*taxes"})
+CA_TAX_TYPES.append({"tax_type": "estate inheritance and gift tax general fund",   "tax_regex": "estate,?\s*inheritance,?\s*.{0,3}\s*gift\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "estate inheritance and gift tax special funds",  "tax_regex": "estate,?\s*inheritance,?\s*.{0,3}\s*gift\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "insurance companies tax general fund",           "tax_regex": "insurance\s*companies\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "insurance companies tax special funds",          "tax_regex": "insurance\s*companies\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "gasoline tax general fund",                      "tax_regex": "gasoline\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "gasoline tax special funds",                     "tax_regex": "gasoline\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "diesel and liquid petroleum gas general fund",   "tax_regex": "diesel\s*.{0,3}\s*liquid\s*petroleum\s*gas"})
+CA_TAX_TYPES.append({"tax_type": "diesel and liquid petroleum gas special funds",  "tax_regex": "diesel\s*.{0,3}\s*liquid\s*petroleum\s*gas"})
+CA_TAX_TYPES.append({"tax_type": "jet fuel tax general fund",                      "tax_regex": "jet\s*fuel\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "jet fuel tax special funds",                     "tax_regex": "jet\s*fuel\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "vehicle license fees general fund",              "tax_regex": "vehicle\s*license\s*fees"})
+CA_TAX_TYPES.append({"tax_type": "vehicle license fees special funds",             "tax_regex": "vehicle\s*license\s*fees"})
+CA_TAX_TYPES.append({"tax_type": "personal income tax general fund",               "tax_regex": "personal\s*income\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "personal income tax special funds",              "tax_regex": "personal\s*income\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "retail sales and use taxes general fund",        "tax_regex": "retail\s*sales\s*.{0,3}\s*use\s*taxes"})
+CA_TAX_TYPES.append({"tax_type": "retail sales and use taxes special funds",       "tax_regex": "retail\s*sales\s*.{0,3}\s*use\s*taxes"})
+CA_TAX_TYPES.append({"tax_type": "pooled money investment interest general fund",  "tax_regex": "pooled\s*money\s*investment\s*interest"})
+CA_TAX_TYPES.append({"tax_type": "pooled money investment interest special funds", "tax_regex": "pooled\s*money\s*investment\s*interest"})
+CA_TAX_TYPES.append({"tax_type": "investment income general fund",                 "tax_regex": "investment\s*income"})
+CA_TAX_TYPES.append({"tax_type": "investment income special funds",                "tax_regex": "investment\s*income"})
+CA_TAX_TYPES.append({"tax_type": "alcoholic beverage license fees general fund",   "tax_regex": "alcoholic\s*beverage\s*license\s*fees"})
+CA_TAX_TYPES.append({"tax_type": "alcoholic beverage license fees special funds",  "tax_regex": "alcoholic\s*beverage\s*license\s*fees"})
+CA_TAX_TYPES.append({"tax_type": "other fees general fund",                        "tax_regex": "other\s*fees"})
+CA_TAX_TYPES.append({"tax_type": "other fees special funds",                       "tax_regex": "other\s*fees"})
+CA_TAX_TYPES.append({"tax_type": "cannabis licensing fees general fund",           "tax_regex": "cannabis\s*licensing\s*fees"})
+CA_TAX_TYPES.append({"tax_type": "cannabis licensing fees special funds",          "tax_regex": "cannabis\s*licensing\s*fees"})
+CA_TAX_TYPES.append({"tax_type": "electrical energy tax general fund",             "tax_regex": "electrical\s*energy\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "electrical energy tax special funds",            "tax_regex": "electrical\s*energy\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "private rail car tax general fund",              "tax_regex": "private\s*rail\s*car\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "private rail car tax special funds",             "tax_regex": "private\s*rail\s*car\s*tax"})
+CA_TAX_TYPES.append({"tax_type": "penalties on traffic violations general fund",   "tax_regex": "penalties\s*on\s*traffic\s*violations"})
+CA_TAX_TYPES.append({"tax_type": "penalties on traffic violations special funds",  "tax_regex": "penalties\s*on\s*traffic\s*violations"})
+CA_TAX_TYPES.append({"tax_type": "health care receipts general fund",              "tax_regex": "health\s*care\s*receipts"})
+CA_TAX_TYPES.append({"tax_type": "health care receipts special funds",             "tax_regex": "health\s*care\s*receipts"})
+CA_TAX_TYPES.append({"tax_type": "revenues from state lands general fund",         "tax_regex": "revenues\s*from\s*state\s*lands"})
+CA_TAX_TYPES.append({"tax_type": "revenues from state lands special funds",        "tax_regex": "revenues\s*from\s*state\s*lands"})
+CA_TAX_TYPES.append({"tax_type": "abandoned property general fund",                "tax_regex": "abandoned\s*property"})
+CA_TAX_TYPES.append({"tax_type": "abandoned property special funds",               "tax_regex": "abandoned\s*property"})
+CA_TAX_TYPES.append({"tax_type": "trial court revenues general fund",              "tax_regex": "trial\s*court\s*revenues"})
+CA_TAX_TYPES.append({"tax_type": "trial court revenues special funds",             "tax_regex": "trial\s*court\s*revenues"})
+CA_TAX_TYPES.append({"tax_type": "horse racing fees general fund",                 "tax_regex": "horse\s*racing\s*fees"})
+CA_TAX_TYPES.append({"tax_type": "horse racing fees special funds",                "tax_regex": "horse\s*racing\s*fees"})
+CA_TAX_TYPES.append({"tax_type": "cap and trade general fund",                     "tax_regex": "cap\s*.{0,3}\s*trade"})
+CA_TAX_TYPES.append({"tax_type": "cap and trade special funds",                    "tax_regex": "cap\s*.{0,3}\s*trade"})
+CA_TAX_TYPES.append({"tax_type": "penalty assessments general fund",               "tax_regex": "penalty\s*assessments"})
+CA_TAX_TYPES.append({"tax_type": "penalty assessments special funds",              "tax_regex": "penalty\s*assessments"})
+CA_TAX_TYPES.append({"tax_type": "miscellaneous tax revenue general fund",         "tax_regex": "miscellaneous\s*tax\s*revenue"})
+CA_TAX_TYPES.append({"tax_type": "miscellaneous tax revenue special funds",        "tax_regex": "miscellaneous\s*tax\s*revenue"})
+CA_TAX_TYPES.append({"tax_type": "miscellaneous general fund",                     "tax_regex": "miscellaneous"})
+CA_TAX_TYPES.append({"tax_type": "miscellaneous special funds",                    "tax_regex": "miscellaneous"})
+CA_TAX_TYPES.append({"tax_type": "not otherwise classified general fund",          "tax_regex": "not\s*otherwise\s*classified"})
+CA_TAX_TYPES.append({"tax_type": "not otherwise classified special funds",         "tax_regex": "not\s*otherwise\s*classified"})
+
+# Patterns of the template, compiled by get_template_patterns when the template is first used
+def compile_patterns_CA():
+    patterns = {}
+    patterns["tax_types_index"] = compile_tax_types(CA_TAX_TYPES, "(", ")" + CA_VALUES)
+    # Line items that are not in the list of tax types
+    patterns["other_tax"] = re.compile("^\s*([a-z]+[\D]*?)" + CA_VALUES)
+    return patterns
+
+@register_template("CA", compile_patterns_CA)
 def scrape_data_CA(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -181,70 +469,9 @@ def scrape_data_CA(lines_clean, state, yyyy, mm):
     unit = "thousands"
     time = "ytd thru month"
 
-    stringpart = "\s+\$?\s*([\d,.()-]+)"
-    string = stringpart*4
-
-    tax_types_list = []
-    tax_types_list.append({"tax_type": "alcoholic beverage excise taxes general fund",   "tax_regex": "alcoholic\s*beverage\s*excise\s*taxes"})
-    tax_types_list.append({"tax_type": "alcoholic beverage excise taxes special funds",  "tax_regex": "alcoholic\s*beverage\s*excise\s*taxes"})
-    tax_types_list.append({"tax_type": "corporation tax general fund",                   "tax_regex": "corporation\s*tax"})
-    tax_types_list.append({"tax_type": "corporation tax special funds",                  "tax_regex": "corporation\s*tax"})
-    tax_types_list.append({"tax_type": "cigarette tax general fund",                     "tax_regex": "cigarette\s*tax"})
-    tax_types_list.append({"tax_type": "cigarette tax special funds",                    "tax_regex": "cigarette\s*tax"})
-    tax_types_list.append({"tax_type": "cannabis excise taxes general fund",             "tax_regex": "cannabis\s*excise\s*taxes"})
-    tax_types_list.append({"tax_type": "cannabis excise taxes special funds",            "tax_regex": "cannabis\s*excise\s*taxes"})
-    tax_types_list.append({"tax_type": "estate inheritance and gift tax general fund",   "tax_regex": "estate,?\s*inheritance,?\s*.{0,3}\s*gift\s*tax"})
-    tax_types_list.append({"tax_type": "estate inheritance and gift tax special funds",  "tax_regex": "estate,?\s*inheritance,?\s*.{0,3}\s*gift\s*tax"})
-    tax_types_list.append({"tax_type": "insurance companies tax general fund",           "tax_regex": "insurance\s*companies\s*tax"})
-    tax_types_list.append({"tax_type": "insurance companies tax special funds",          "tax_regex": "insurance\s*companies\s*tax"})
-    tax_types_list.append({"tax_type": "gasoline tax general fund",                      "tax_regex": "gasoline\s*tax"})
-    tax_types_list.append({"tax_type": "gasoline tax special funds",                     "tax_regex": "gasoline\s*tax"})
-    tax_types_list.append({"tax_type": "diesel and liquid petroleum gas general fund",   "tax_regex": "diesel\s*.{0,3}\s*liquid\s*petroleum\s*gas"})
-    tax_types_list.append({"tax_type": "diesel and liquid petroleum gas special funds",  "tax_regex": "diesel\s*.{0,3}\s*liquid\s*petroleum\s*gas"})
-    tax_types_list.append({"tax_type": "jet fuel tax general fund",                      "tax_regex": "jet\s*fuel\s*tax"})
-    tax_types_list.append({"tax_type": "jet fuel tax special funds",                     "tax_regex": "jet\s*fuel\s*tax"})
-    tax_types_list.append({"tax_type": "vehicle license fees general fund",              "tax_regex": "vehicle\s*license\s*fees"})
-    tax_types_list.append({"tax_type": "vehicle license fees special funds",             "tax_regex": "vehicle\s*license\s*fees"})
-    tax_types_list.append({"tax_type": "personal income tax general fund",               "tax_regex": "personal\s*income\s*tax"})
-    tax_types_list.append({"tax_type": "personal income tax special funds",              "tax_regex": "personal\s*income\s*tax"})
-    tax_types_list.append({"tax_type": "retail sales and use taxes general fund",        "tax_regex": "retail\s*sales\s*.{0,3}\s*use\s*taxes"})
-    tax_types_list.append({"tax_type": "retail sales and use taxes special funds",       "tax_regex": "retail\s*sales\s*.{0,3}\s*use\s*taxes"})
-    tax_types_list.append({"tax_type": "pooled money investment interest general fund",  "tax_regex": "pooled\s*money\s*investment\s*interest"})
-    tax_types_list.append({"tax_type": "pooled money investment interest special funds", "tax_regex": "pooled\s*money\s*investment\s*interest"})
-    tax_types_list.append({"tax_type": "investment income general fund",                 "tax_regex": "investment\s*income"})
-    tax_types_list.append({"tax_type": "investment income special funds",                "tax_regex": "investment\s*income"})
-    tax_types_list.append({"tax_type": "alcoholic beverage license fees general fund",   "tax_regex": "alcoholic\s*beverage\s*license\s*fees"})
-    tax_types_list.append({"tax_type": "alcoholic beverage license fees special funds",  "tax_regex": "alcoholic\s*beverage\s*license\s*fees"})
-    tax_types_list.append({"tax_type": "other fees general fund",                        "tax_regex": "other\s*fees"})
-    tax_types_list.append({"tax_type": "other fees special funds",                       "tax_regex": "other\s*fees"})
-    tax_types_list.append({"tax_type": "cannabis licensing fees general fund",           "tax_regex": "cannabis\s*licensing\s*fees"})
-    tax_types_list.append({"tax_type": "cannabis licensing fees special funds",          "tax_regex": "cannabis\s*licensing\s*fees"})
-    tax_types_list.append({"tax_type": "electrical energy tax general fund",             "tax_regex": "electrical\s*energy\s*tax"})
-    tax_types_list.append({"tax_type": "electrical energy tax special funds",            "tax_regex": "electrical\s*energy\s*tax"})
-    tax_types_list.append({"tax_type": "private rail car tax general fund",              "tax_regex": "private\s*rail\s*car\s*tax"})
-    tax_types_list.append({"tax_type": "private rail car tax special funds",             "tax_regex": "private\s*rail\s*car\s*tax"})
-    tax_types_list.append({"tax_type": "penalties on traffic violations general fund",   "tax_regex": "penalties\s*on\s*traffic\s*violations"})
-    tax_types_list.append({"tax_type": "penalties on traffic violations special funds",  "tax_regex": "penalties\s*on\s*traffic\s*violations"})
-    tax_types_list.append({"tax_type": "health care receipts general fund",              "tax_regex": "health\s*care\s*receipts"})
-    tax_types_list.append({"tax_type": "health care receipts special funds",             "tax_regex": "health\s*care\s*receipts"})
-    tax_types_list.append({"tax_type": "revenues from state lands general fund",         "tax_regex": "revenues\s*from\s*state\s*lands"})
-    tax_types_list.append({"tax_type": "revenues from state lands special funds",        "tax_regex": "revenues\s*from\s*state\s*lands"})
-    tax_types_list.append({"tax_type": "abandoned property general fund",                "tax_regex": "abandoned\s*property"})
-    tax_types_list.append({"tax_type": "abandoned property special funds",               "tax_regex": "abandoned\s*property"})
-    tax_types_list.append({"tax_type": "trial court revenues general fund",              "tax_regex": "trial\s*court\s*revenues"})
-    tax_types_list.append({"tax_type": "trial court revenues special funds",             "tax_regex": "trial\s*court\s*revenues"})
-    tax_types_list.append({"tax_type": "horse racing fees general fund",                 "tax_regex": "horse\s*racing\s*fees"})
-    tax_types_list.append({"tax_type": "horse racing fees special funds",                "tax_regex": "horse\s*racing\s*fees"})
-    tax_types_list.append({"tax_type": "cap and trade general fund",                     "tax_regex": "cap\s*.{0,3}\s*trade"})
-    tax_types_list.append({"tax_type": "cap and trade special funds",                    "tax_regex": "cap\s*.{0,3}\s*trade"})
-    tax_types_list.append({"tax_type": "penalty assessments general fund",               "tax_regex": "penalty\s*assessments"})
-    tax_types_list.append({"tax_type": "penalty assessments special funds",              "tax_regex": "penalty\s*assessments"})
-    tax_types_list.append({"tax_type": "miscellaneous tax revenue general fund",         "tax_regex": "miscellaneous\s*tax\s*revenue"})
-    tax_types_list.append({"tax_type": "miscellaneous tax revenue special funds",        "tax_regex": "miscellaneous\s*tax\s*revenue"})
-    tax_types_list.append({"tax_type": "miscellaneous general fund",                     "tax_regex": "miscellaneous"})
-    tax_types_list.append({"tax_type": "miscellaneous special funds",                    "tax_regex": "miscellaneous"})
-    tax_types_list.append({"tax_type": "not otherwise classified general fund",          "tax_regex": "not\s*otherwise\s*classified"})
-    tax_types_list.append({"tax_type": "not otherwise classified special funds",         "tax_regex": "not\s*otherwise\s*classified"})
+    tax_types_list = CA_TAX_TYPES
+    patterns = get_template_patterns(state)
+    tax_types_index = patterns["tax_types_index"]
 
     for line in lines_clean:
         line_found = False
@@ -298,13 +525,10 @@ def scrape_data_CA(lines_clean, state, yyyy, mm):
                 table_zone = False
 
             if table_zone:
-                for l in range(len(tax_types_list)):
+                for l in get_tax_type_candidates(tax_types_index, line):
                     tax_type = tax_types_list[l]["tax_type"]
-                    tax_regex = tax_types_list[l]["tax_regex"]
-
-                    tax = "(" + tax_regex + ")" + string
 
-                    m = re.search(tax, line)
+                    m = tax_types_list[l]["pattern"].search(line)
                     if m:
                         tax_types.append(tax_type)
                         if re.search(r"general\s*fund", tax_type):
@@ -316,8 +540,7 @@ def scrape_data_CA(lines_clean, state, yyyy, mm):
                         line_found = True
                     
                 if not line_found:
-                    tax = "^\s*([a-z]+[\D]*?)" + string
-                    m = re.search(tax, line)
+                    m = patterns["other_tax"].search(line)
                     if m:
                         tax_name = clean_value(m.group(1)).strip()
                         tax_types.append(tax_name + " general fund")
@@ -340,6 +563,7 @@ def scrape_data_CA(lines_clean, state, yyyy, mm):
     return data
 
 # Colorado (CO)
+@register_template("CO")
 def scrape_data_CO(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -358,6 +582,120 @@ def scrape_data_CO(lines_clean, state, yyyy, mm):
     return data
 
 # Connecticut (CT)
+# Tax types of the template, whose patterns are compiled when the template is first used (see get_template_patterns)
+CT_VALUES = "\s+([\d,.()$-]+)" * 2
+
+CT_TAX_TYPES = []
+CT_TAX_TYPES.append({"tax_type": "withholding",                               "tax_regex": "withholding"})
+CT_TAX_TYPES.append({"tax_type": "estimates and finals",                      "tax_regex": "estimates\s*.{0,3}\s*finals"})
+CT_TAX_TYPES.append({"tax_type": "sales and use",                             "tax_regex": "sales\s*.{0,3}\s*use"})
+CT_TAX_TYPES.append({"tax_type": "room occupancy",                            "tax_regex": "room\s*occupancy"})
+CT_TAX_TYPES.append({"tax_type": "corporation business",                      "tax_regex": "corporation\s*business"})
+CT_TAX_TYPES.append({"tax_type": "pass-through entity",                       "tax_regex": "pass\s*-?\s*through\s*entity"})
+CT_TAX_TYPES.append({"tax_type": "unrelated business income",                 "tax_regex": "unrelated\s*business\s*income"})
+CT_TAX_TYPES.append({"tax_type": "cable, satellite and video",                "tax_regex": "cable,?\s*satellite\s*.{0,3}\s*video"})
+CT_TAX_TYPES.append({"tax_type": "peg account",                               "tax_regex": "peg\s*account"})
+CT_TAX_TYPES.append({"tax_type": "electric and power",                        "tax_regex": "electric\s*.{0,3}\s*power"})
+CT_TAX_TYPES.append({"tax_type": "gas companies",                             "tax_regex": "gas\s*companies"})
+CT_TAX_TYPES.append({"tax_type": "railroads",                                 "tax_regex": "railroads"})
+CT_TAX_TYPES.append({"tax_type": "estate and gift",                           "tax_regex": "estate\s*.{0,3}\s*gift"})
+CT_TAX_TYPES.append({"tax_type": "domestic",                                  "tax_regex": "domestic"})
+CT_TAX_TYPES.append({"tax_type": "foreign",                                   "tax_regex": "foreign"})
+CT_TAX_TYPES.append({"tax_type": "health care centers",                       "tax_regex": "health\s*care\s*centers"})
+CT_TAX_TYPES.append({"tax_type": "nonadmitted unauthorized captive insurers", "tax_regex": "nonadmitted\s*/\s*unauthorized\s*/\s*"})
+CT_TAX_TYPES.append({"tax_type": "alcoholic beverages",                       "tax_regex": "alcoholi?c?\s*beverages"})
+CT_TAX_TYPES.append({"tax_type": "cigarette",                                 "tax_regex": "cigarette"})
+CT_TAX_TYPES.append({"tax_type": "electronic cigarette products",             "tax_regex": "electronic\s*cigarette\s*products"})
+CT_TAX_TYPES.append({"tax_type": "tobacco products",                          "tax_regex": "tobacco\s*products"})
+CT_TAX_TYPES.append({"tax_type": "controlling interest transfer",             "tax_regex": "controlling\s*interest\s*transfer"})
+CT_TAX_TYPES.append({"tax_type": "real estate conveyance",                    "tax_regex": "real\s*estate\s*conveyance"})
+CT_TAX_TYPES.append({"tax_type": "petroleum gross earnings",                  "tax_regex": "petroleum\s*gross\s*earnings"})
+CT_TAX_TYPES.append({"tax_type": "admission and dues and tnc fee",            "tax_regex": "admission\s*.{0,3}\s*dues\s*.{0,3}\s*tnc\s*fee"})
+CT_TAX_TYPES.append({"tax_type": "dry cleaners",                              "tax_regex": "dry\s*cleaners"})
+CT_TAX_TYPES.append({"tax_type": "occupational",                              "tax_regex": "occupational"})
+CT_TAX_TYPES.append({"tax_type": "rental surcharge",                          "tax_regex": "rental\s*surcharge"})
+CT_TAX_TYPES.append({"tax_type": "solid waste",                               "tax_regex": "solid\s*waste"})
+CT_TAX_TYPES.append({"tax_type": "tourism tax",                               "tax_regex": "tourism\s*tax"})
+CT_TAX_TYPES.append({"tax_type": "controlled substances",                     "tax_regex": "controlled\s*substances"})
+CT_TAX_TYPES.append({"tax_type": "prepaid wireless e911 fee",                 "tax_regex": "prepaid\s*wireless\s*e-?9-?1-?1\s*fee"})
+CT_TAX_TYPES.append({"tax_type": "cannabis tax",                              "tax_regex": "cannabis\s*tax"})
+CT_TAX_TYPES.append({"tax_type": "paid preparer fee",                         "tax_regex": "paid\s*preparer\s*fee"})
+CT_TAX_TYPES.append({"tax_type": "repealed taxes",                            "tax_regex": "repealed\s*taxes"})
+CT_TAX_TYPES.append({"tax_type": "nursing home user fee",                     "tax_regex": "nursing\s*home\s*user\s*fee"})
+CT_TAX_TYPES.append({"tax_type": "hospitals",                                 "tax_regex": "hospitals"})
+CT_TAX_TYPES.append({"tax_type": "intermediate care facility",                "tax_regex": "intermediate\s*care\s*facility"})
+CT_TAX_TYPES.append({"tax_type": "ambulatory surgical center",                "tax_regex": "ambulatory\s*surgical\s*center"})
+CT_TAX_TYPES.append({"tax_type": "gasoline",                                  "tax_regex": "gasoline"})
+CT_TAX_TYPES.append({"tax_type": "special fuel",                              "tax_regex": "special\s*fuel"})
+CT_TAX_TYPES.append({"tax_type": "motor carrier",                             "tax_regex": "motor\s*carrier"})
+CT_TAX_TYPES.append({"tax_type": "highway use fee",                           "tax_regex": "highway\s*use\s*fee"})
+CT_TAX_TYPES.append({"tax_type": "total motor fuel taxes",                    "tax_regex": "total\s*motor\s*fuel\s*taxes"})
+CT_TAX_TYPES.append({"tax_type": "total healthcare taxes",                    "tax_regex": "total\s*healthcare\s*taxes"})
+CT_TAX_TYPES.append({"tax_type": "total miscellaneous taxes",                 "tax_regex": "total\s*miscellaneous\s*taxes"})
+CT_TAX_TYPES.append({"tax_type": "total cigarette taxes",                     "tax_regex": "total\s*cigarette\s*taxes"})
+CT_TAX_TYPES.append({"tax_type": "total income taxes",                        "tax_regex": "total\s*income\s*taxes"})
+CT_TAX_TYPES.append({"tax_type": "total sales & use tax",                     "tax_regex": "total\s*sales\s*.{0,3}?\s*use\s*tax"})
+CT_TAX_TYPES.append({"tax_type": "total corporation taxes",                   "tax_regex": "total\s*corporation\s*taxes"})
+CT_TAX_TYPES.append({"tax_type": "total public service corps.",               "tax_regex": "total\s*public\s*service\s*corps."})
+CT_TAX_TYPES.append({"tax_type": "total insurance taxes",                     "tax_regex": "total\s*insurance\s*taxes"})
+CT_TAX_TYPES.append({"tax_type": "licenses",                                  "tax_regex": "licenses"})
+CT_TAX_TYPES.append({"tax_type": "beverage container deposit",                "tax_regex": "beverage\s*container\s*deposit"})
+CT_TAX_TYPES.append({"tax_type": "total healthcare fees",                     "tax_regex": "total\s*healthcare\s*fees"})
+
+CT_TAX_TYPES_REF = []
+CT_TAX_TYPES_REF.append({"tax_type": "withholding refund",                   "tax_regex": "withholding"})
+CT_TAX_TYPES_REF.append({"tax_type": "income tax refund",                    "tax_regex": "income\s*tax"})
+CT_TAX_TYPES_REF.append({"tax_type": "sales and use refund",                 "tax_regex": "sales\s*.{0,3}?\s*use"})
+CT_TAX_TYPES_REF.append({"tax_type": "room occupancy refund",                "tax_regex": "room\s*occupancy"})
+CT_TAX_TYPES_REF.append({"tax_type": "business entity refund",               "tax_regex": "business\s*entity"})
+CT_TAX_TYPES_REF.append({"tax_type": "corporation business refund",          "tax_regex": "corporation\s*business"})
+CT_TAX_TYPES_REF.append({"tax_type": "r & d credit buybacks refund",         "tax_regex": "r\s*.{0,3}?\s*d\s*credit\s*buybacks"})
+CT_TAX_TYPES_REF.append({"tax_type": "pass-through entity refund",           "tax_regex": "pass\s*-?\s*through\s*entity"})
+CT_TAX_TYPES_REF.append({"tax_type": "unrelated business refund",            "tax_regex": "unrelated\s*business"})
+CT_TAX_TYPES_REF.append({"tax_type": "cable, satellite and video refund",    "tax_regex": "cable,\s*satellite\s*.{0,3}?\s*video"})
+CT_TAX_TYPES_REF.append({"tax_type": "peg account refund",                   "tax_regex": "peg\s*account"})
+CT_TAX_TYPES_REF.append({"tax_type": "electric and power refund",            "tax_regex": "electric\s*.{0,3}?\s*power"})
+CT_TAX_TYPES_REF.append({"tax_type": "gas companies refund",                 "tax_regex": "gas\s*companies"})
+CT_TAX_TYPES_REF.append({"tax_type": "estate and gift refund",               "tax_regex": "estate\s*.{0,3}?\s*gift"})
+CT_TAX_TYPES_REF.append({"tax_type": "domestic insurance refund",            "tax_regex": "domestic\s*insurance"})
+CT_TAX_TYPES_REF.append({"tax_type": "foreign insurance refund",             "tax_regex": "foreign\s*insurance"})
+CT_TAX_TYPES_REF.append({"tax_type": "health care centers refund",           "tax_regex": "health\s*care\s*centers"})
+CT_TAX_TYPES_REF.append({"tax_type": "nonadmitted insurance refund",         "tax_regex": "nonadmitted\s*insurance"})
+CT_TAX_TYPES_REF.append({"tax_type": "alcoholic beverages refund",           "tax_regex": "alcoholic\s*beverages"})
+CT_TAX_TYPES_REF.append({"tax_type": "cigarette refund",                     "tax_regex": "cigarette"})
+CT_TAX_TYPES_REF.append({"tax_type": "electronic cigarette products refund", "tax_regex": "electronic\s*cigarette\s*products"})
+CT_TAX_TYPES_REF.append({"tax_type": "tobacco products refund",              "tax_regex": "tobacco\s*products"})
+CT_TAX_TYPES_REF.append({"tax_type": "controlling interest refund",          "tax_regex": "controlling\s*interest"})
+CT_TAX_TYPES_REF.append({"tax_type": "real estate conveyance refund",        "tax_regex": "real\s*estate\s*conveyance"})
+CT_TAX_TYPES_REF.append({"tax_type": "petroleum gross earnings refund",      "tax_regex": "petroleum\s*gross\s*earnings"})
+CT_TAX_TYPES_REF.append({"tax_type": "admissions and dues refund",           "tax_regex": "admissions\s*.{0,3}?\s*dues"})
+CT_TAX_TYPES_REF.append({"tax_type": "dry cleaners refund",                  "tax_regex": "dry\s*cleaners"})
+CT_TAX_TYPES_REF.append({"tax_type": "occupational refund",                  "tax_regex": "occupational"})
+CT_TAX_TYPES_REF.append({"tax_type": "pre-paid wireless refund",             "tax_regex": "pre\s*-?\s*paid\s*wireless"})
+CT_TAX_TYPES_REF.append({"tax_type": "nursing home user fee refund",         "tax_regex": "nursing\s*home\s*user\s*fee"})
+CT_TAX_TYPES_REF.append({"tax_type": "hospitals refund",                     "tax_regex": "hospitals"})
+CT_TAX_TYPES_REF.append({"tax_type": "intermediate care facility refund",    "tax_regex": "intermediate\s*care\s*facility"})
+CT_TAX_TYPES_REF.append({"tax_type": "ambulatory surgical center refund",    "tax_regex": "ambulatory\s*surgical\s*center"})
+CT_TAX_TYPES_REF.append({"tax_type": "gasoline refund",                      "tax_regex": "gasoline"})
+CT_TAX_TYPES_REF.append({"tax_type": "special fuel refund",                  "tax_regex": "special\s*fuel"})
+CT_TAX_TYPES_REF.append({"tax_type": "motor carrier refund",                 "tax_regex": "motor\s*carrier"})
+CT_TAX_TYPES_REF.append({"tax_type": "highway use fee refund",               "tax_regex": "highway\s*use\s*fee"})
+CT_TAX_TYPES_REF.append({"tax_type": "beverage containers refund",           "tax_regex": "beverage\s*containers"})
+CT_TAX_TYPES_REF.append({"tax_type": "miscellaneous refund",                 "tax_regex": "miscellaneous"})
+CT_TAX_TYPES_REF.append({"tax_type": "second hospital user fee refund",      "tax_regex": "second\s*hospital\s*user\s*fee"})
+
+# Patterns of the template, compiled by get_template_patterns when the template is first used
+def compile_patterns_CT():
+    patterns = {}
+    patterns["values_only"] = re.compile(CT_VALUES)
+    patterns["tax_types_index"] = compile_tax_types(CT_TAX_TYPES, "(", ")" + CT_VALUES)
+    patterns["tax_types_index_ref"] = compile_tax_types(CT_TAX_TYPES_REF, "(", ")" + CT_VALUES)
+    # Line items that are not in the lists of tax types
+    patterns["other_tax"] = re.compile("^\s*(\(.*\))?\s*([a-z]+[\D]*?)" + CT_VALUES)
+    patterns["other_tax_ref"] = re.compile("^\s*([a-z]+[\D]*?)" + CT_VALUES)
+    return patterns
+
+@register_template("CT", compile_patterns_CT)
 def scrape_data_CT(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -376,107 +714,12 @@ def scrape_data_CT(lines_clean, state, yyyy, mm):
     unit = "dollars"
     time = "month"
 
-    stringpart = "\s+([\d,.()$-]+)"
-    string = stringpart*2
-
-    tax_types_list = []
-    tax_types_list.append({"tax_type": "withholding",                               "tax_regex": "withholding"})
-    tax_types_list.append({"tax_type": "estimates and finals",                      "tax_regex": "estimates\s*.{0,3}\s*finals"})
-    tax_types_list.append({"tax_type": "sales and use",                             "tax_regex": "sales\s*.{0,3}\s*use"})
-    tax_types_list.append({"tax_type": "room occupancy",                            "tax_regex": "room\s*occupancy"})
-    tax_types_list.append({"tax_type": "corporation business",                      "tax_regex": "corporation\s*business"})
-    tax_types_list.append({"tax_type": "pass-through entity",                       "tax_regex": "pass\s*-?\s*through\s*entity"})
-    tax_types_list.append({"tax_type": "unrelated business income",                 "tax_regex": "unrelated\s*business\s*income"})
-    tax_types_list.append({"tax_type": "cable, satellite and video",                "tax_regex": "cable,?\s*satellite\s*.{0,3}\s*video"})
-    tax_types_list.append({"tax_type": "peg account",                               "tax_regex": "peg\s*account"})
-    tax_types_list.append({"tax_type": "electric and power",                        "tax_regex": "electric\s*.{0,3}\s*power"})
-    tax_types_list.append({"tax_type": "gas companies",                             "tax_regex": "gas\s*companies"})
-    tax_types_list.append({"tax_type": "railroads",                                 "tax_regex": "railroads"})
-    tax_types_list.append({"tax_type": "estate and gift",                           "tax_regex": "estate\s*.{0,3}\s*gift"})
-    tax_types_list.append({"tax_type": "domestic",                                  "tax_regex": "domestic"})
-    tax_types_list.append({"tax_type": "foreign",                                   "tax_regex": "foreign"})
-    tax_types_list.append({"tax_type": "health care centers",                       "tax_regex": "health\s*care\s*centers"})
-    tax_types_list.append({"tax_type": "nonadmitted unauthorized captive insurers", "tax_regex": "nonadmitted\s*/\s*unauthorized\s*/\s*"})
-    tax_types_list.append({"tax_type": "alcoholic beverages",                       "tax_regex": "alcoholi?c?\s*beverages"})
-    tax_types_list.append({"tax_type": "cigarette",                                 "tax_regex": "cigarette"})
-    tax_types_list.append({"tax_type": "electronic cigarette products",             "tax_regex": "electronic\s*cigarette\s*products"})
-    tax_types_list.append({"tax_type": "tobacco products",                          "tax_regex": "tobacco\s*products"})
-    tax_types_list.append({"tax_type": "controlling interest transfer",             "tax_regex": "controlling\s*interest\s*transfer"})
-    tax_types_list.append({"tax_type": "real estate conveyance",                    "tax_regex": "real\s*estate\s*conveyance"})
-    tax_types_list.append({"tax_type": "petroleum gross earnings",                  "tax_regex": "petroleum\s*gross\s*earnings"})
-    tax_types_list.append({"tax_type": "admission and dues and tnc fee",            "tax_regex": "admission\s*.{0,3}\s*dues\s*.{0,3}\s*tnc\s*fee"})
-    tax_types_list.append({"tax_type": "dry cleaners",                              "tax_regex": "dry\s*cleaners"})
-    tax_types_list.append({"tax_type": "occupational",                              "tax_regex": "occupational"})
-    tax_types_list.append({"tax_type": "rental surcharge",                          "tax_regex": "rental\s*surcharge"})
-    tax_types_list.append({"tax_type": "solid waste",                               "tax_regex": "solid\s*waste"})
-    tax_types_list.append({"tax_type": "tourism tax",                               "tax_regex": "tourism\s*tax"})
-    tax_types_list.append({"tax_type": "controlled substances",                     "tax_regex": "controlled\s*substances"})
-    tax_types_list.append({"tax_type": "prepaid wireless e911 fee",                 "tax_regex": "prepaid\s*wireless\s*e-?9-?1-?1\s*fee"})
-    tax_types_list.append({"tax_type": "cannabis tax",                              "tax_regex": "cannabis\s*tax"})
-    tax_types_list.append({"tax_type": "paid preparer fee",                         "tax_regex": "paid\s*preparer\s*fee"})
-    tax_types_list.append({"tax_type": "repealed taxes",                            "tax_regex": "repealed\s*taxes"})
-    tax_types_list.append({"tax_type": "nursing home user fee",                     "tax_regex": "nursing\s*home\s*user\s*fee"})
-    tax_types_list.append({"tax_type": "hospitals",                                 "tax_regex": "hospitals"})
-    tax_types_list.append({"tax_type": "intermediate care facility",                "tax_regex": "intermediate\s*care\s*facility"})
-    tax_types_list.append({"tax_type": "ambulatory surgical center",                "tax_regex": "ambulatory\s*surgical\s*center"})
-    tax_types_list.append({"tax_type": "gasoline",                                  "tax_regex": "gasoline"})
-    tax_types_list.append({"tax_type": "special fuel",                              "tax_regex": "special\s*fuel"})
-    tax_types_list.append({"tax_type": "motor carrier",                             "tax_regex": "motor\s*carrier"})
-    tax_types_list.append({"tax_type": "highway use fee",                           "tax_regex": "highway\s*use\s*fee"})
-    tax_types_list.append({"tax_type": "total motor fuel taxes",                    "tax_regex": "total\s*motor\s*fuel\s*taxes"})
-    tax_types_list.append({"tax_type": "total healthcare taxes",                    "tax_regex": "total\s*healthcare\s*taxes"})
-    tax_types_list.append({"tax_type": "total miscellaneous taxes",                 "tax_regex": "total\s*miscellaneous\s*taxes"})
-    tax_types_list.append({"tax_type": "total cigarette taxes",                     "tax_regex": "total\s*cigarette\s*taxes"})
-    tax_types_list.append({"tax_type": "total income taxes",                        "tax_regex": "total\s*income\s*taxes"})
-    tax_types_list.append({"tax_type": "total sales & use tax",                     "tax_regex": "total\s*sales\s*.{0,3}?\s*use\s*tax"})
-    tax_types_list.append({"tax_type": "total corporation taxes",                   "tax_regex": "total\s*corporation\s*taxes"})
-    tax_types_list.append({"tax_type": "total public service corps.",               "tax_regex": "total\s*public\s*service\s*corps."})
-    tax_types_list.append({"tax_type": "total insurance taxes",                     "tax_regex": "total\s*insurance\s*taxes"})
-    tax_types_list.append({"tax_type": "licenses",                                  "tax_regex": "licenses"})
-    tax_types_list.append({"tax_type": "beverage container deposit",                "tax_regex": "beverage\s*container\s*deposit"})
-    tax_types_list.append({"tax_type": "total healthcare fees",                     "tax_regex": "total\s*healthcare\s*fees"})
+    tax_types_list = CT_TAX_TYPES
+    patterns = get_template_patterns(state)
+    tax_types_index = patterns["tax_types_index"]
     
-    tax_types_list_ref = []
-    tax_types_list_ref.append({"tax_type": "withholding refund",                   "tax_regex": "withholding"})
-    tax_types_list_ref.append({"tax_type": "income tax refund",                    "tax_regex": "income\s*tax"})
-    tax_types_list_ref.append({"tax_type": "sales and use refund",                 "tax_regex": "sales\s*.{0,3}?\s*use"})
-    tax_types_list_ref.append({"tax_type": "room occupancy refund",                "tax_regex": "room\s*occupancy"})
-    tax_types_list_ref.append({"tax_type": "business entity refund",               "tax_regex": "business\s*entity"})
-    tax_types_list_ref.append({"tax_type": "corporation business refund",          "tax_regex": "corporation\s*business"})
-    tax_types_list_ref.append({"tax_type": "r & d credit buybacks refund",         "tax_regex": "r\s*.{0,3}?\s*d\s*credit\s*buybacks"})
-    tax_types_list_ref.append({"tax_type": "pass-through entity refund",           "tax_regex": "pass\s*-?\s*through\s*entity"})
-    tax_types_list_ref.append({"tax_type": "unrelated business refund",            "tax_regex": "unrelated\s*business"})
-    tax_types_list_ref.append({"tax_type": "cable, satellite and video refund",    "tax_regex": "cable,\s*satellite\s*.{0,3}?\s*video"})
-    tax_types_list_ref.append({"tax_type": "peg account refund",                   "tax_regex": "peg\s*account"})
-    tax_types_list_ref.append({"tax_type": "electric and power refund",            "tax_regex": "electric\s*.{0,3}?\s*power"})
-    tax_types_list_ref.append({"tax_type": "gas companies refund",                 "tax_regex": "gas\s*companies"})
-    tax_types_list_ref.append({"tax_type": "estate and gift refund",               "tax_regex": "estate\s*.{0,3}?\s*gift"})
-    tax_types_list_ref.append({"tax_type": "domestic insurance refund",            "tax_regex": "domestic\s*insurance"})
-    tax_types_list_ref.append({"tax_type": "foreign insurance refund",             "tax_regex": "foreign\s*insurance"})
-    tax_types_list_ref.append({"tax_type": "health care centers refund",           "tax_regex": "health\s*care\s*centers"})
-    tax_types_list_ref.append({"tax_type": "nonadmitted insurance refund",         "tax_regex": "nonadmitted\s*insurance"})
-    tax_types_list_ref.append({"tax_type": "alcoholic beverages refund",           "tax_regex": "alcoholic\s*beverages"})
-    tax_types_list_ref.append({"tax_type": "cigarette refund",                     "tax_regex": "cigarette"})
-    tax_types_list_ref.append({"tax_type": "electronic cigarette products refund", "tax_regex": "electronic\s*cigarette\s*products"})
-    tax_types_list_ref.append({"tax_type": "tobacco products refund",              "tax_regex": "tobacco\s*products"})
-    tax_types_list_ref.append({"tax_type": "controlling interest refund",          "tax_regex": "controlling\s*interest"})
-    tax_types_list_ref.append({"tax_type": "real estate conveyance refund",        "tax_regex": "real\s*estate\s*conveyance"})
-    tax_types_list_ref.append({"tax_type": "petroleum gross earnings refund",      "tax_regex": "petroleum\s*gross\s*earnings"})
-    tax_types_list_ref.append({"tax_type": "admissions and dues refund",           "tax_regex": "admissions\s*.{0,3}?\s*dues"})
-    tax_types_list_ref.append({"tax_type": "dry cleaners refund",                  "tax_regex": "dry\s*cleaners"})
-    tax_types_list_ref.append({"tax_type": "occupational refund",                  "tax_regex": "occupational"})
-    tax_types_list_ref.append({"tax_type": "pre-paid wireless refund",             "tax_regex": "pre\s*-?\s*paid\s*wireless"})
-    tax_types_list_ref.append({"tax_type": "nursing home user fee refund",         "tax_regex": "nursing\s*home\s*user\s*fee"})
-    tax_types_list_ref.append({"tax_type": "hospitals refund",                     "tax_regex": "hospitals"})
-    tax_types_list_ref.append({"tax_type": "intermediate care facility refund",    "tax_regex": "intermediate\s*care\s*facility"})
-    tax_types_list_ref.append({"tax_type": "ambulatory surgical center refund",    "tax_regex": "ambulatory\s*surgical\s*center"})
-    tax_types_list_ref.append({"tax_type": "gasoline refund",                      "tax_regex": "gasoline"})
-    tax_types_list_ref.append({"tax_type": "special fuel refund",                  "tax_regex": "special\s*fuel"})
-    tax_types_list_ref.append({"tax_type": "motor carrier refund",                 "tax_regex": "motor\s*carrier"})
-    tax_types_list_ref.append({"tax_type": "highway use fee refund",               "tax_regex": "highway\s*use\s*fee"})
-    tax_types_list_ref.append({"tax_type": "beverage containers refund",           "tax_regex": "beverage\s*containers"})
-    tax_types_list_ref.append({"tax_type": "miscellaneous refund",                 "tax_regex": "miscellaneous"})
-    tax_types_list_ref.append({"tax_type": "second hospital user fee refund",      "tax_regex": "second\s*hospital\s*user\s*fee"})
+    tax_types_list_ref = CT_TAX_TYPES_REF
+    tax_types_index_ref = patterns["tax_types_index_ref"]
     
     m_nn = False
 
@@ -513,18 +756,22 @@ def scrape_data_CT(lines_clean, state, yyyy, mm):
                     col = 2
 
             if rev_zone:
-                for l in range(len(tax_types_list)):
+                # The values of the nonadmitted insurers are searched for in the first pass of the loop
+                if m_nn:
+                    candidates = range(len(tax_types_list))
+                else:
+                    candidates = get_tax_type_candidates(tax_types_index, line)
+                for l in candidates:
                     tax_type = tax_types_list[l]["tax_type"]
                     tax_regex = tax_types_list[l]["tax_regex"]
 
-                    tax = "(" + tax_regex + ")" + string
                     if tax_type == "nonadmitted unauthorized captive insurers":
                         m_nonadm = re.search(tax_regex, line)
                         if m_nonadm:
                             m_nn = True
 
                     else:
-                        m = re.search(tax, line)
+                        m = tax_types_list[l]["pattern"].search(line)
                         if m:
                             line_found = True
                             if tax_type in ["estate and gift", "real estate conveyance"]:
@@ -535,7 +782,7 @@ def scrape_data_CT(lines_clean, state, yyyy, mm):
                             tax_units.append(unit)
                             tax_times.append(time)
                     if m_nn:
-                        m = re.search(string, line)
+                        m = patterns["values_only"].search(line)
                         if m:
                             line_found = True
                             m_nn = False
@@ -545,9 +792,7 @@ def scrape_data_CT(lines_clean, state, yyyy, mm):
                             tax_times.append(time)
                             
                 if not line_found:
-                    #tax = "^\s*([a-z]+[\D]*?)" + string
-                    tax = "^\s*(\(.*\))?\s*([a-z]+[\D]*?)" + string
-                    m = re.search(tax, line)
+                    m = patterns["other_tax"].search(line)
                     if m:
                         if clean_value(m.group(2).strip()) == "type of revenue":
                             continue
@@ -557,12 +802,10 @@ def scrape_data_CT(lines_clean, state, yyyy, mm):
                         tax_times.append(time)
 
             if ref_zone:
-                for l in range(len(tax_types_list_ref)):
+                for l in get_tax_type_candidates(tax_types_index_ref, line):
                     tax_type = tax_types_list_ref[l]["tax_type"]
-                    tax_regex = tax_types_list_ref[l]["tax_regex"]
 
-                    tax = "(" + tax_regex + ")" + string
-                    m = re.search(tax, line)
+                    m = tax_types_list_ref[l]["pattern"].search(line)
                     if m:
                         line_found = True
                         if tax_type in ["estate and gift", "real estate conveyance"]:
@@ -581,8 +824,7 @@ def scrape_data_CT(lines_clean, state, yyyy, mm):
                         tax_times.append(time)
                         
                 if not line_found:
-                    tax = "^\s*([a-z]+[\D]*?)" + string
-                    m = re.search(tax, line)
+                    m = patterns["other_tax_ref"].search(line)
                     if m:
                         if clean_value(m.group(1).strip()) == "type of refund":
                             continue
@@ -604,6 +846,7 @@ def scrape_data_CT(lines_clean, state, yyyy, mm):
     return data
 
 # Delaware (DE)
+@register_template("DE")
 def scrape_data_DE(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -622,7 +865,8 @@ def scrape_data_DE(lines_clean, state, yyyy, mm):
     return data
 
 # District of Columbia (DC)
-def scrape_data_DE(lines_clean, state, yyyy, mm):
+@register_template("DC")
+def scrape_data_DC(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
     tax_values = []
@@ -640,6 +884,7 @@ def scrape_data_DE(lines_clean, state, yyyy, mm):
     return data
 
 # Florida (FL)
+@register_template("FL")
 def scrape_data_FL(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -658,6 +903,7 @@ def scrape_data_FL(lines_clean, state, yyyy, mm):
     return data
 
 # Georgia (GA)
+@register_template("GA")
 def scrape_data_GA(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -676,6 +922,7 @@ def scrape_data_GA(lines_clean, state, yyyy, mm):
     return data
 
 # Hawaii (HI)
+@register_template("HI")
 def scrape_data_HI(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -694,6 +941,7 @@ def scrape_data_HI(lines_clean, state, yyyy, mm):
     return data
 
 # Idaho (ID)
+@register_template("ID")
 def scrape_data_ID(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -712,6 +960,7 @@ def scrape_data_ID(lines_clean, state, yyyy, mm):
     return data
 
 # Illinois (IL)
+@register_template("IL")
 def scrape_data_IL(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -730,6 +979,7 @@ def scrape_data_IL(lines_clean, state, yyyy, mm):
     return data
 
 # Indiana (IN)
+@register_template("IN")
 def scrape_data_IN(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -748,6 +998,7 @@ def scrape_data_IN(lines_clean, state, yyyy, mm):
     return data
 
 # Iowa (IA)
+@register_template("IA")
 def scrape_data_IA(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -766,6 +1017,7 @@ def scrape_data_IA(lines_clean, state, yyyy, mm):
     return data
 
 # Kansas (KS)
+@register_template("KS")
 def scrape_data_KS(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -784,6 +1036,7 @@ def scrape_data_KS(lines_clean, state, yyyy, mm):
     return data
 
 # Kentucky (KY)
+@register_template("KY")
 def scrape_data_KY(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -802,6 +1055,7 @@ def scrape_data_KY(lines_clean, state, yyyy, mm):
     return data
 
 # Louisiana (LA)
+@register_template("LA")
 def scrape_data_LA(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -820,6 +1074,7 @@ def scrape_data_LA(lines_clean, state, yyyy, mm):
     return data
 
 # Maine (ME)
+@register_template("ME")
 def scrape_data_ME(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -838,6 +1093,7 @@ def scrape_data_ME(lines_clean, state, yyyy, mm):
     return data
 
 # Maryland (MD)
+@register_template("MD")
 def scrape_data_MD(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -856,6 +1112,7 @@ def scrape_data_MD(lines_clean, state, yyyy, mm):
     return data
 
 # Massachusetts (MA)
+@register_template("MA")
 def scrape_data_MA(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -874,6 +1131,7 @@ def scrape_data_MA(lines_clean, state, yyyy, mm):
     return data
 
 # Michigan (MI)
+@register_template("MI")
 def scrape_data_MI(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -892,6 +1150,7 @@ def scrape_data_MI(lines_clean, state, yyyy, mm):
     return data
 
 # Minnesota (MN)
+@register_template("MN")
 def scrape_data_MN(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -910,6 +1169,7 @@ def scrape_data_MN(lines_clean, state, yyyy, mm):
     return data
 
 # Mississippi (MS)
+@register_template("MS")
 def scrape_data_MS(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -928,6 +1188,7 @@ def scrape_data_MS(lines_clean, state, yyyy, mm):
     return data
 
 # Missouri (MO)
+@register_template("MO")
 def scrape_data_MO(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -946,6 +1207,7 @@ def scrape_data_MO(lines_clean, state, yyyy, mm):
     return data
 
 # Montana (MT)
+@register_template("MT")
 def scrape_data_MT(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -964,6 +1226,7 @@ def scrape_data_MT(lines_clean, state, yyyy, mm):
     return data
 
 # Nebraska (NE)
+@register_template("NE")
 def scrape_data_NE(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -982,6 +1245,7 @@ def scrape_data_NE(lines_clean, state, yyyy, mm):
     return data
 
 # Nevada (NV)
+@register_template("NV")
 def scrape_data_NV(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1000,6 +1264,7 @@ def scrape_data_NV(lines_clean, state, yyyy, mm):
     return data
 
 # New Hampshire (NH)
+@register_template("NH")
 def scrape_data_NH(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1018,6 +1283,48 @@ def scrape_data_NH(lines_clean, state, yyyy, mm):
     return data
 
 # New Jersey (NJ)
+# Tax types of the template, whose patterns are compiled when the template is first used (see get_template_patterns)
+NJ_VALUES_BEFORE = "\s*\$?\s*([\d,.()$%-]+)" * 3
+NJ_VALUES_AFTER = "\s+\$?\s*([\d,.()$%-]+)" * 3
+
+NJ_TAX_TYPES = []
+NJ_TAX_TYPES.append({"tax_type": "sales",                             "tax_regex": "sales"})
+NJ_TAX_TYPES.append({"tax_type": "sales tax - energy tax receipts",   "tax_regex": "sales\s*tax\s*-?\s*energy\s*tax\s*receipts"})
+NJ_TAX_TYPES.append({"tax_type": "sales tax dedication",              "tax_regex": "sales\s*tax\s*dedication"})
+NJ_TAX_TYPES.append({"tax_type": "net sales tax",                     "tax_regex": "net\s*sales\s*tax"})
+NJ_TAX_TYPES.append({"tax_type": "corporation business",              "tax_regex": "corporation\s*business"})
+NJ_TAX_TYPES.append({"tax_type": "cbt - energy tax receipts",         "tax_regex": "cbt\s*-?\s*energy\s*tax\s*receipts"})
+NJ_TAX_TYPES.append({"tax_type": "net corporation business tax",      "tax_regex": "net\s*corporation\s*business\s*tax"})
+NJ_TAX_TYPES.append({"tax_type": "business alternative income tax",   "tax_regex": "business\s*alternative\s*income\s*tax"})
+NJ_TAX_TYPES.append({"tax_type": "motor fuels",                       "tax_regex": "motor\s*fuels"})
+NJ_TAX_TYPES.append({"tax_type": "motor vehicle fees",                "tax_regex": "motor\s*vehicle\s*fees"})
+NJ_TAX_TYPES.append({"tax_type": "transfer inheritance tax",          "tax_regex": "transfer\s*inheritance\s*tax"})
+NJ_TAX_TYPES.append({"tax_type": "estate tax",                        "tax_regex": "estate\s*tax"})
+NJ_TAX_TYPES.append({"tax_type": "insurance premium",                 "tax_regex": "insurance\s*premium"})
+NJ_TAX_TYPES.append({"tax_type": "cigarette",                         "tax_regex": "cigarette"})
+NJ_TAX_TYPES.append({"tax_type": "petroleum products gross receipts", "tax_regex": "petroleum\s*products\s*gross\s*receipts"})
+NJ_TAX_TYPES.append({"tax_type": "capital reserve",                   "tax_regex": "capital\s*reserve"})
+NJ_TAX_TYPES.append({"tax_type": "alcoholic beverage excise",         "tax_regex": "alcoholic\s*beverage\s*excise"})
+NJ_TAX_TYPES.append({"tax_type": "realty transfer",                   "tax_regex": "realty\s*transfer"})
+NJ_TAX_TYPES.append({"tax_type": "tobacco products wholesale sales",  "tax_regex": "tobacco\s*products\s*wholesale\s*sales"})
+NJ_TAX_TYPES.append({"tax_type": "public utility",                    "tax_regex": "public\s*utility"})
+NJ_TAX_TYPES.append({"tax_type": "total general fund revenues",       "tax_regex": "total\s*general\s*fund\s*revenues"})
+NJ_TAX_TYPES.append({"tax_type": "gross income tax (ptrf)",           "tax_regex": "gross\s*income\s*tax\s*\(*ptrf\)*"})
+NJ_TAX_TYPES.append({"tax_type": "sales tax dedication",              "tax_regex": "sales\s*tax\s*dedication"})
+NJ_TAX_TYPES.append({"tax_type": "net gross income tax (ptrf)",       "tax_regex": "net\s*gross\s*income\s*tax\s*\(*ptrf\)*"})
+NJ_TAX_TYPES.append({"tax_type": "casino revenue",                    "tax_regex": "casino\s*revenue"})
+NJ_TAX_TYPES.append({"tax_type": "total major revenues",              "tax_regex": "total\s*major\s*revenues"})
+NJ_TAX_TYPES.append({"tax_type": "lottery",                           "tax_regex": "lottery"})
+
+# Patterns of the template, compiled by get_template_patterns when the template is first used
+def compile_patterns_NJ():
+    patterns = {}
+    patterns["tax_types_index"] = compile_tax_types(NJ_TAX_TYPES, "^" + NJ_VALUES_BEFORE + "\s*(", ")\s*(\(*.??\)*)?" + NJ_VALUES_AFTER, re.I)
+    # Line items that are not in the list of tax types
+    patterns["other_tax"] = re.compile("^" + NJ_VALUES_BEFORE + "\s*([a-z]+[\D]*?)\s*(\(*.??\)*)?" + NJ_VALUES_AFTER)
+    return patterns
+
+@register_template("NJ", compile_patterns_NJ)
 def scrape_data_NJ(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1029,39 +1336,9 @@ def scrape_data_NJ(lines_clean, state, yyyy, mm):
     unit = "thousands"
     time = "month"
 
-    stringpart = "\s*\$?\s*([\d,.()$%-]+)"
-    string1 = stringpart*3
-    stringpart = "\s+\$?\s*([\d,.()$%-]+)"
-    string2 = stringpart*3
-
-    tax_types_list = []
-    tax_types_list.append({"tax_type": "sales",                             "tax_regex": "sales"})
-    tax_types_list.append({"tax_type": "sales tax - energy tax receipts",   "tax_regex": "sales\s*tax\s*-?\s*energy\s*tax\s*receipts"})
-    tax_types_list.append({"tax_type": "sales tax dedication",              "tax_regex": "sales\s*tax\s*dedication"})
-    tax_types_list.append({"tax_type": "net sales tax",                     "tax_regex": "net\s*sales\s*tax"})
-    tax_types_list.append({"tax_type": "corporation business",              "tax_regex": "corporation\s*business"})
-    tax_types_list.append({"tax_type": "cbt - energy tax receipts",         "tax_regex": "cbt\s*-?\s*energy\s*tax\s*receipts"})
-    tax_types_list.append({"tax_type": "net corporation business tax",      "tax_regex": "net\s*corporation\s*business\s*tax"})
-    tax_types_list.append({"tax_type": "business alternative income tax",   "tax_regex": "business\s*alternative\s*income\s*tax"})
-    tax_types_list.append({"tax_type": "motor fuels",                       "tax_regex": "motor\s*fuels"})
-    tax_types_list.append({"tax_type": "motor vehicle fees",                "tax_regex": "motor\s*vehicle\s*fees"})
-    tax_types_list.append({"tax_type": "transfer inheritance tax",          "tax_regex": "transfer\s*inheritance\s*tax"})
-    tax_types_list.append({"tax_type": "estate tax",                        "tax_regex": "estate\s*tax"})
-    tax_types_list.append({"tax_type": "insurance premium",                 "tax_regex": "insurance\s*premium"})
-    tax_types_list.append({"tax_type": "cigarette",                         "tax_regex": "cigarette"})
-    tax_types_list.append({"tax_type": "petroleum products gross receipts", "tax_regex": "petroleum\s*products\s*gross\s*receipts"})
-    tax_types_list.append({"tax_type": "capital reserve",                   "tax_regex": "capital\s*reserve"})
-    tax_types_list.append({"tax_type": "alcoholic beverage excise",         "tax_regex": "alcoholic\s*beverage\s*excise"})
-    tax_types_list.append({"tax_type": "realty transfer",                   "tax_regex": "realty\s*transfer"})
-    tax_types_list.append({"tax_type": "tobacco products wholesale sales",  "tax_regex": "tobacco\s*products\s*wholesale\s*sales"})
-    tax_types_list.append({"tax_type": "public utility",                    "tax_regex": "public\s*utility"})
-    tax_types_list.append({"tax_type": "total general fund revenues",       "tax_regex": "total\s*general\s*fund\s*revenues"})
-    tax_types_list.append({"tax_type": "gross income tax (ptrf)",           "tax_regex": "gross\s*income\s*tax\s*\(*ptrf\)*"})
-    tax_types_list.append({"tax_type": "sales tax dedication",              "tax_regex": "sales\s*tax\s*dedication"})
-    tax_types_list.append({"tax_type": "net gross income tax (ptrf)",       "tax_regex": "net\s*gross\s*income\s*tax\s*\(*ptrf\)*"})
-    tax_types_list.append({"tax_type": "casino revenue",                    "tax_regex": "casino\s*revenue"})
-    tax_types_list.append({"tax_type": "total major revenues",              "tax_regex": "total\s*major\s*revenues"})
-    tax_types_list.append({"tax_type": "lottery",                           "tax_regex": "lottery"})
+    tax_types_list = NJ_TAX_TYPES
+    patterns = get_template_patterns(state)
+    tax_types_index = patterns["tax_types_index"]
 
     rev_zone = False
     started = False
@@ -1086,13 +1363,10 @@ def scrape_data_NJ(lines_clean, state, yyyy, mm):
                     rev_zone = False
 
             if rev_zone and not started:
-                for l in range(len(tax_types_list)):
+                for l in get_tax_type_candidates(tax_types_index, line):
                     tax_type = tax_types_list[l]["tax_type"]
-                    tax_regex = tax_types_list[l]["tax_regex"]
-
-                    tax = "^" + string1 + "\s*(" + tax_regex + ")\s*(\(*.??\)*)?" + string2
 
-                    m = re.search(tax, line, re.I)
+                    m = tax_types_list[l]["pattern"].search(line)
                     if m:
                         tax_types.append(tax_type)
                         tax_values.append(clean_value(m.group(col)))
@@ -1102,8 +1376,7 @@ def scrape_data_NJ(lines_clean, state, yyyy, mm):
                         break
                     
                 if not line_found and not started:
-                    tax = "^" + string1 + "\s*([a-z]+[\D]*?)\s*(\(*.??\)*)?" + string2
-                    m = re.search(tax, line)
+                    m = patterns["other_tax"].search(line)
                     if m:
                         tax_types.append(clean_value(m.group(4)).strip())
                         tax_values.append(clean_value(m.group(col)))
@@ -1121,6 +1394,7 @@ def scrape_data_NJ(lines_clean, state, yyyy, mm):
     return data
 
 # New Mexico (NM)
+@register_template("NM")
 def scrape_data_NM(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1139,6 +1413,7 @@ def scrape_data_NM(lines_clean, state, yyyy, mm):
     return data
 
 # New York (NY)
+@register_template("NY")
 def scrape_data_NY(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1157,6 +1432,7 @@ def scrape_data_NY(lines_clean, state, yyyy, mm):
     return data
 
 # North Carolina (NC)
+@register_template("NC")
 def scrape_data_NC(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1175,6 +1451,7 @@ def scrape_data_NC(lines_clean, state, yyyy, mm):
     return data
 
 # North Dakota (ND)
+@register_template("ND")
 def scrape_data_ND(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1193,6 +1470,7 @@ def scrape_data_ND(lines_clean, state, yyyy, mm):
     return data
 
 # Ohio (OH)
+@register_template("OH")
 def scrape_data_OH(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1211,6 +1489,7 @@ def scrape_data_OH(lines_clean, state, yyyy, mm):
     return data
 
 # Oklahoma (OK)
+@register_template("OK")
 def scrape_data_OK(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1229,6 +1508,7 @@ def scrape_data_OK(lines_clean, state, yyyy, mm):
     return data
 
 # Oregon (OR)
+@register_template("OR")
 def scrape_data_OR(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1247,6 +1527,69 @@ def scrape_data_OR(lines_clean, state, yyyy, mm):
     return data
 
 # Pennsylvania (PA)
+# Tax types of the template, whose patterns are compiled when the template is first used (see get_template_patterns)
+PA_VALUES = "\s+([\d,.()$-]+)" * 2
+
+PA_TAX_TYPES = []
+PA_TAX_TYPES.append({"tax_type": "total - general fund",                  "tax_regex": "total\s*-?\s*general\s*fund"})
+PA_TAX_TYPES.append({"tax_type": "total - tax revenue",                   "tax_regex": "total\s*-?\s*tax\s*revenue"})
+PA_TAX_TYPES.append({"tax_type": "total - corporation taxes",             "tax_regex": "total\s*-?\s*corporation\s*taxes"})
+PA_TAX_TYPES.append({"tax_type": "accelerated deposits",                  "tax_regex": "accelerated\s*deposits"})
+PA_TAX_TYPES.append({"tax_type": "corporate net income",                  "tax_regex": "corporate\s*net\s*income"})
+PA_TAX_TYPES.append({"tax_type": "gross receipts",                        "tax_regex": "gross\s*receipts"})
+PA_TAX_TYPES.append({"tax_type": "utility property",                      "tax_regex": "utility\s*property"})
+PA_TAX_TYPES.append({"tax_type": "insurance premiums",                    "tax_regex": "insurance\s*premiums"})
+PA_TAX_TYPES.append({"tax_type": "bank shares",                           "tax_regex": "bank\s*shares"})
+PA_TAX_TYPES.append({"tax_type": "mutual thrift",                         "tax_regex": "mutual\s*thrift"})
+PA_TAX_TYPES.append({"tax_type": "total - consumption taxes",             "tax_regex": "total\s*-?\s*consumption\s*taxes"})
+PA_TAX_TYPES.append({"tax_type": "sales and use",                         "tax_regex": "sales\s*.{0,3}?\s*use"})
+PA_TAX_TYPES.append({"tax_type": "non-motor vehicle",                     "tax_regex": "non\s*-?\s*motor\s*vehicle"})
+PA_TAX_TYPES.append({"tax_type": "motor vehicle",                         "tax_regex": "motor\s*vehicle"})
+PA_TAX_TYPES.append({"tax_type": "cigarette",                             "tax_regex": "cigarette"})
+PA_TAX_TYPES.append({"tax_type": "other tobacco products",                "tax_regex": "other\s*tobacco\s*products"})
+PA_TAX_TYPES.append({"tax_type": "malt beverage",                         "tax_regex": "malt\s*beverage"})
+PA_TAX_TYPES.append({"tax_type": "liquor",                                "tax_regex": "liquor"})
+PA_TAX_TYPES.append({"tax_type": "total - other taxes",                   "tax_regex": "total\s*-?\s*other\s*taxes"})
+PA_TAX_TYPES.append({"tax_type": "total - personal income & other taxes", "tax_regex": "total\s*-?\s*personal\s*income\s*.{0,3}?\s*other\s*taxes"})
+PA_TAX_TYPES.append({"tax_type": "personal income",                       "tax_regex": "personal\s*income"})
+PA_TAX_TYPES.append({"tax_type": "withholding",                           "tax_regex": "withholding"})
+PA_TAX_TYPES.append({"tax_type": "quarterly",                             "tax_regex": "quarterly"})
+PA_TAX_TYPES.append({"tax_type": "annual",                                "tax_regex": "annual"})
+PA_TAX_TYPES.append({"tax_type": "realty transfer",                       "tax_regex": "realty\s*transfer"})
+PA_TAX_TYPES.append({"tax_type": "inheritance",                           "tax_regex": "inheritance"})
+PA_TAX_TYPES.append({"tax_type": "gaming",                                "tax_regex": "gaming"})
+PA_TAX_TYPES.append({"tax_type": "minor and repealed",                    "tax_regex": "minor\s*.{0,3}?\s*repealed"})
+PA_TAX_TYPES.append({"tax_type": "total - non-tax revenue",               "tax_regex": "total\s*-?\s*non\s*-?\s*tax\s*revenue"})
+PA_TAX_TYPES.append({"tax_type": "liquor store profits",                  "tax_regex": "liquor\s*store\s*profits"})
+PA_TAX_TYPES.append({"tax_type": "licenses & fees",                       "tax_regex": "licenses\s*.{0,3}?\s*fees"})
+PA_TAX_TYPES.append({"tax_type": "miscellaneous",                         "tax_regex": "miscellaneous"})
+PA_TAX_TYPES.append({"tax_type": "fines, penalties, & interest",          "tax_regex": "fines.??\s*penalties.??\s*.{0,3}?\s*interest"})
+PA_TAX_TYPES.append({"tax_type": "revenue sources",                       "tax_regex": "revenue\s*sources"})
+PA_TAX_TYPES.append({"tax_type": "total - motor license fund",            "tax_regex": "total\s*-?\s*motor\s*license\s*fund"})
+PA_TAX_TYPES.append({"tax_type": "total liquid fuels taxes",              "tax_regex": "total\s*-?\s*liquid\s*fuels\s*taxes"})
+PA_TAX_TYPES.append({"tax_type": "motor carriers/ifta",                   "tax_regex": "motor\s*carriers\s*\/?\s*ifta"})
+PA_TAX_TYPES.append({"tax_type": "alternative fuels",                     "tax_regex": "alternative\s*fuels"})
+PA_TAX_TYPES.append({"tax_type": "oil company franchise",                 "tax_regex": "oil\s*company\s*franchise"})
+PA_TAX_TYPES.append({"tax_type": "total - licenses and fees",             "tax_regex": "total\s*-?\s*licenses\s*.{0,3}?\s*fees"})
+PA_TAX_TYPES.append({"tax_type": "special hauling permits",               "tax_regex": "special\s*hauling\s*permits"})
+PA_TAX_TYPES.append({"tax_type": "registrations other states-irp",        "tax_regex": "registrations\s*other\s*states\s*-?\s*irp"})
+PA_TAX_TYPES.append({"tax_type": "operators licenses",                    "tax_regex": "operators\s*licenses"})
+PA_TAX_TYPES.append({"tax_type": "real id",                               "tax_regex": "real\s*id"})
+PA_TAX_TYPES.append({"tax_type": "vehicle registrations and titling",     "tax_regex": "vehicle\s*registrations\s*.{0,3}?\s*titling"})
+PA_TAX_TYPES.append({"tax_type": "miscellaneous collections",             "tax_regex": "miscellaneous\s*collections"})
+PA_TAX_TYPES.append({"tax_type": "treasury",                              "tax_regex": "treasury"})
+PA_TAX_TYPES.append({"tax_type": "escheats",                              "tax_regex": "escheats"})
+PA_TAX_TYPES.append({"tax_type": "electric vehicle",                      "tax_regex": "electric\s*vehicles?"})
+
+# Patterns of the template, compiled by get_template_patterns when the template is first used
+def compile_patterns_PA():
+    patterns = {}
+    patterns["tax_types_index"] = compile_tax_types(PA_TAX_TYPES, "(", ")" + PA_VALUES)
+    # Line items that are not in the list of tax types
+    patterns["other_tax"] = re.compile("^\s*([a-z]+[^\d]*?)" + PA_VALUES)
+    return patterns
+
+@register_template("PA", compile_patterns_PA)
 def scrape_data_PA(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1260,59 +1603,9 @@ def scrape_data_PA(lines_clean, state, yyyy, mm):
     unit = "thousands"
     time = "month"
 
-    stringpart = "\s+([\d,.()$-]+)"
-    string = stringpart*2
-
-    tax_types_list = []
-    tax_types_list.append({"tax_type": "total - general fund",                  "tax_regex": "total\s*-?\s*general\s*fund"})
-    tax_types_list.append({"tax_type": "total - tax revenue",                   "tax_regex": "total\s*-?\s*tax\s*revenue"})
-    tax_types_list.append({"tax_type": "total - corporation taxes",             "tax_regex": "total\s*-?\s*corporation\s*taxes"})
-    tax_types_list.append({"tax_type": "accelerated deposits",                  "tax_regex": "accelerated\s*deposits"})
-    tax_types_list.append({"tax_type": "corporate net income",                  "tax_regex": "corporate\s*net\s*income"})
-    tax_types_list.append({"tax_type": "gross receipts",                        "tax_regex": "gross\s*receipts"})
-    tax_types_list.append({"tax_type": "utility property",                      "tax_regex": "utility\s*property"})
-    tax_types_list.append({"tax_type": "insurance premiums",                    "tax_regex": "insurance\s*premiums"})
-    tax_types_list.append({"tax_type": "bank shares",                           "tax_regex": "bank\s*shares"})
-    tax_types_list.append({"tax_type": "mutual thrift",                         "tax_regex": "mutual\s*thrift"})
-    tax_types_list.append({"tax_type": "total - consumption taxes",             "tax_regex": "total\s*-?\s*consumption\s*taxes"})
-    tax_types_list.append({"tax_type": "sales and use",                         "tax_regex": "sales\s*.{0,3}?\s*use"})
-    tax_types_list.append({"tax_type": "non-motor vehicle",                     "tax_regex": "non\s*-?\s*motor\s*vehicle"})
-    tax_types_list.append({"tax_type": "motor vehicle",                         "tax_regex": "motor\s*vehicle"})
-    tax_types_list.append({"tax_type": "cigarette",                             "tax_regex": "cigarette"})
-    tax_types_list.append({"tax_type": "other tobacco products",                "tax_regex": "other\s*tobacco\s*products"})
-    tax_types_list.append({"tax_type": "malt beverage",                         "tax_regex": "malt\s*beverage"})
-    tax_types_list.append({"tax_type": "liquor",                                "tax_regex": "liquor"})
-    tax_types_list.append({"tax_type": "total - other taxes",                   "tax_regex": "total\s*-?\s*other\s*taxes"})
-    tax_types_list.append({"tax_type": "total - personal income & other taxes", "tax_regex": "total\s*-?\s*personal\s*income\s*.{0,3}?\s*other\s*taxes"})
-    tax_types_list.append({"tax_type": "personal income",                       "tax_regex": "personal\s*income"})
-    tax_types_list.append({"tax_type": "withholding",                           "tax_regex": "withholding"})
-    tax_types_list.append({"tax_type": "quarterly",                             "tax_regex": "quarterly"})
-    tax_types_list.append({"tax_type": "annual",                                "tax_regex": "annual"})
-    tax_types_list.append({"tax_type": "realty transfer",                       "tax_regex": "realty\s*transfer"})
-    tax_types_list.append({"tax_type": "inheritance",                           "tax_regex": "inheritance"})
-    tax_types_list.append({"tax_type": "gaming",                                "tax_regex": "gaming"})
-    tax_types_list.append({"tax_type": "minor and repealed",                    "tax_regex": "minor\s*.{0,3}?\s*repealed"})
-    tax_types_list.append({"tax_type": "total - non-tax revenue",               "tax_regex": "total\s*-?\s*non\s*-?\s*tax\s*revenue"})
-    tax_types_list.append({"tax_type": "liquor store profits",                  "tax_regex": "liquor\s*store\s*profits"})
-    tax_types_list.append({"tax_type": "licenses & fees",                       "tax_regex": "licenses\s*.{0,3}?\s*fees"})
-    tax_types_list.append({"tax_type": "miscellaneous",                         "tax_regex": "miscellaneous"})
-    tax_types_list.append({"tax_type": "fines, penalties, & interest",          "tax_regex": "fines.??\s*penalties.??\s*.{0,3}?\s*interest"})
-    tax_types_list.append({"tax_type": "revenue sources",                       "tax_regex": "revenue\s*sources"})
-    tax_types_list.append({"tax_type": "total - motor license fund",            "tax_regex": "total\s*-?\s*motor\s*license\s*fund"})
-    tax_types_list.append({"tax_type": "total liquid fuels taxes",              "tax_regex": "total\s*-?\s*liquid\s*fuels\s*taxes"})
-    tax_types_list.append({"tax_type": "motor carriers/ifta",                   "tax_regex": "motor\s*carriers\s*\/?\s*ifta"})
-    tax_types_list.append({"tax_type": "alternative fuels",                     "tax_regex": "alternative\s*fuels"})
-    tax_types_list.append({"tax_type": "oil company franchise",                 "tax_regex": "oil\s*company\s*franchise"})
-    tax_types_list.append({"tax_type": "total - licenses and fees",             "tax_regex": "total\s*-?\s*licenses\s*.{0,3}?\s*fees"})
-    tax_types_list.append({"tax_type": "special hauling permits",               "tax_regex": "special\s*hauling\s*permits"})
-    tax_types_list.append({"tax_type": "registrations other states-irp",        "tax_regex": "registrations\s*other\s*states\s*-?\s*irp"})
-    tax_types_list.append({"tax_type": "operators licenses",                    "tax_regex": "operators\s*licenses"})
-    tax_types_list.append({"tax_type": "real id",                               "tax_regex": "real\s*id"})
-    tax_types_list.append({"tax_type": "vehicle registrations and titling",     "tax_regex": "vehicle\s*registrations\s*.{0,3}?\s*titling"})
-    tax_types_list.append({"tax_type": "miscellaneous collections",             "tax_regex": "miscellaneous\s*collections"})
-    tax_types_list.append({"tax_type": "treasury",                              "tax_regex": "treasury"})
-    tax_types_list.append({"tax_type": "escheats",                              "tax_regex": "escheats"})
-    tax_types_list.append({"tax_type": "electric vehicle",                      "tax_regex": "electric\s*vehicles?"})
+    tax_types_list = PA_TAX_TYPES
+    patterns = get_template_patterns(state)
+    tax_types_index = patterns["tax_types_index"]
 
     for line in lines_clean:
         line_found = False
@@ -1333,13 +1626,10 @@ def scrape_data_PA(lines_clean, state, yyyy, mm):
                     col = 2
 
             if fund_zone:
-                for l in tax_types_list.index:
+                for l in get_tax_type_candidates(tax_types_index, line):
                     tax_type = tax_types_list[l]["tax_type"]
-                    tax_regex = tax_types_list[l]["tax_regex"]
-
-                    tax = "(" + tax_regex + ")" + string
 
-                    m = re.search(tax, line)
+                    m = tax_types_list[l]["pattern"].search(line)
                     if m:
                         tax_types.append(tax_type)
                         tax_values.append(clean_value(m.group(col)))
@@ -1348,8 +1638,7 @@ def scrape_data_PA(lines_clean, state, yyyy, mm):
                         line_found = True
 
                 if not line_found:
-                     tax = "^\s*([a-z]+[^\d]*?)" + string
-                     m = re.search(tax, line)
+                     m = patterns["other_tax"].search(line)
                      if m:
                         tax_types.append(clean_value(m.group(1)).strip())
                         tax_values.append(clean_value(m.group(col)))
@@ -1382,7 +1671,8 @@ def scrape_data_PA(lines_clean, state, yyyy, mm):
     return data
 
 # Puerto Rico (PR)
-def scrape_data_PA(lines_clean, state, yyyy, mm):
+@register_template("PR")
+def scrape_data_PR(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
     tax_values = []
@@ -1400,6 +1690,7 @@ def scrape_data_PA(lines_clean, state, yyyy, mm):
     return data
 
 # Rhode Island (RI)
+@register_template("RI")
 def scrape_data_RI(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1418,6 +1709,7 @@ def scrape_data_RI(lines_clean, state, yyyy, mm):
     return data
 
 # South Carolina (SC)
+@register_template("SC")
 def scrape_data_SC(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1436,6 +1728,7 @@ def scrape_data_SC(lines_clean, state, yyyy, mm):
     return data
 
 # South Dakota (SD)
+@register_template("SD")
 def scrape_data_SD(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1454,6 +1747,7 @@ def scrape_data_SD(lines_clean, state, yyyy, mm):
     return data
 
 # Tennessee (TN)
+@register_template("TN")
 def scrape_data_TN(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1472,6 +1766,7 @@ def scrape_data_TN(lines_clean, state, yyyy, mm):
     return data
 
 # Texas (TX)
+@register_template("TX")
 def scrape_data_TX(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1490,6 +1785,7 @@ def scrape_data_TX(lines_clean, state, yyyy, mm):
     return data
 
 # Utah (UT)
+@register_template("UT")
 def scrape_data_UT(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1508,6 +1804,7 @@ def scrape_data_UT(lines_clean, state, yyyy, mm):
     return data
 
 # Vermont (VT)
+@register_template("VT")
 def scrape_data_VT(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1526,6 +1823,7 @@ def scrape_data_VT(lines_clean, state, yyyy, mm):
     return data
 
 # Virginia (VA)
+@register_template("VA")
 def scrape_data_VA(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1544,6 +1842,7 @@ def scrape_data_VA(lines_clean, state, yyyy, mm):
     return data
 
 # Washington (WA)
+@register_template("WA")
 def scrape_data_WA(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1562,6 +1861,7 @@ def scrape_data_WA(lines_clean, state, yyyy, mm):
     return data
 
 # West Virginia (WV)
+@register_template("WV")
 def scrape_data_WV(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1580,6 +1880,7 @@ def scrape_data_WV(lines_clean, state, yyyy, mm):
     return data
 
 # Wisconsin (WI)
+@register_template("WI")
 def scrape_data_WI(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1598,6 +1899,7 @@ def scrape_data_WI(lines_clean, state, yyyy, mm):
     return data
 
 # Wyoming (WY)
+@register_template("WY")
 def scrape_data_WY(lines_clean, state, yyyy, mm):
     data = []
     tax_types  = []
@@ -1631,14 +1933,243 @@ def create_output(data, loc):
         f.close()
     return
 
+# Name:        get_dollars
+# Purpose:     Convert a scraped tax value to dollars
+# Parameters:  value (scraped tax value, such as "1,492,761" or "-1234.0")
+#              unit (unit of tax value, such as "thousands")
+# Returns:     Number of dollars or None (value is not a number or unit is unknown)
+
+def get_dollars(value, unit):
+    if unit not in TAX_UNIT_DOLLARS:
+        return None
+    try:
+        number = float(value.replace(",", ""))
+    except ValueError:
+        return None
+    return round(number * TAX_UNIT_DOLLARS[unit], 2)
+
+# Name:        create_output_db
+# Purpose:     Write scraped data to the product database, an SQLite database with one row for each line item
+#              Tax values are stored in dollars, along with the scraped text and unit, and the rows of the months that
+#              were scraped replace the rows those months had before, so months can be added one run at a time
+# Parameters:  data (scraped data)
+#              months (list of 4-digit years and 2-digit months that were scraped)
+#              loc (path of database)
+# Returns:     Number of line items written
+
+def create_output_db(data, months, loc):
+    db = open_product_db(loc)
+    rows = get_product_rows(data)
+    with db:
+        for (yyyy, mm) in months:
+            db.execute("DELETE FROM products WHERE year = ? AND month = ?", (int(yyyy), int(mm)))
+            # The months are no longer known to be up to date for --incremental
+            db.execute("DELETE FROM scrapes WHERE year = ? AND month = ?", (int(yyyy), int(mm)))
+        db.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    db.close()
+    return len(rows)
+
+# Name:        open_product_db
+# Purpose:     Open the product database of a project, creating its tables if necessary
+#              The products table has one row for each line item, and the scrapes table records, for each state and
+#              month, the input file and template version that its line items were scraped with (see scrape_data)
+# Parameters:  loc (path of database)
+# Returns:     sqlite3.Connection object
+
+def open_product_db(loc):
+    db = sqlite3.connect(loc, timeout=PRODUCT_DB_TIMEOUT)
+    db.execute("CREATE TABLE IF NOT EXISTS products (state TEXT NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL, item INTEGER NOT NULL, tax_type TEXT NOT NULL, tax_value REAL, tax_value_text TEXT, tax_unit TEXT, tax_time TEXT, PRIMARY KEY (state, year, month, item))")
+    db.execute("CREATE INDEX IF NOT EXISTS products_year_month ON products (year, month)")
+    db.execute("CREATE INDEX IF NOT EXISTS products_tax_type ON products (tax_type)")
+    db.execute("CREATE TABLE IF NOT EXISTS scrapes (state TEXT NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL, input_sha256 TEXT, template_version TEXT, PRIMARY KEY (state, year, month))")
+    db.commit()
+    return db
+
+# Name:        get_product_rows
+# Purpose:     Convert scraped data to rows of the products table
+#              Line items are numbered within each state and month, in the order they were scraped
+# Parameters:  data (scraped data)
+# Returns:     List of tuples (one for each line item)
+
+def get_product_rows(data):
+    rows = []
+    items = {}
+    for (state, yyyy, mm, tax_type, tax_value, tax_unit, tax_time) in data:
+        item = items.get((state, yyyy, mm), 0)
+        items[(state, yyyy, mm)] = item + 1
+        rows.append((state, int(yyyy), int(mm), item, tax_type, get_dollars(tax_value, tax_unit), tax_value, tax_unit, tax_time))
+    return rows
+
+# Name:        get_input_sha256
+# Purpose:     Get the SHA-256 digest of the file a state is scraped from for a month (the PDF, or the converted TXT file
+#              if there is no PDF)
+# Parameters:  projName (project name)
+#              state (2-letter state abbreviation)
+#              yyyy (4-digit year)
+#              mm (2-digit month)
+# Returns:     SHA-256 digest or None (no input file)
+
+def get_input_sha256(projName, state, yyyy, mm):
+    docName = "{}_{}_{}".format(state, yyyy, mm)
+    for loc in ["./{}/pdf/{}.pdf".format(projName, docName), "./{}/txt/{}.txt".format(projName, docName)]:
+        if os.path.isfile(loc):
+            sha256 = hashlib.sha256()
+            f = open(loc, "rb")
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+            f.close()
+            return sha256.hexdigest()
+    return None
+
+# Name:        is_scrape_current
+# Purpose:     Check whether the line items of a state for a month in the product database were scraped from the same
+#              input file with the same template version
+# Parameters:  db (product database)
+#              state (2-letter state abbreviation)
+#              yyyy (4-digit year)
+#              mm (2-digit month)
+#              inputSHA256 (SHA-256 digest of input file, or None)
+#              templateVersion (version of template)
+# Returns:     True (line items are up to date) or False (state must be scraped again)
+
+def is_scrape_current(db, state, yyyy, mm, inputSHA256, templateVersion):
+    row = db.execute("SELECT input_sha256, template_version FROM scrapes WHERE state = ? AND year = ? AND month = ?", (state, int(yyyy), int(mm))).fetchone()
+    return row is not None and row[0] == inputSHA256 and row[1] == templateVersion
+
+# Name:        is_input_changed
+# Purpose:     Check whether the PDF of a state for a month has changed since the state was last scraped, in which case
+#              its converted TXT file is the text of the old PDF
+# Parameters:  db (product database)
+#              state (2-letter state abbreviation)
+#              yyyy (4-digit year)
+#              mm (2-digit month)
+#              inputSHA256 (SHA-256 digest of input file, or None)
+# Returns:     True (input file has changed) or False (input file is the same, or the state has not been scraped yet)
+
+def is_input_changed(db, state, yyyy, mm, inputSHA256):
+    row = db.execute("SELECT input_sha256 FROM scrapes WHERE state = ? AND year = ? AND month = ?", (state, int(yyyy), int(mm))).fetchone()
+    return row is not None and row[0] is not None and row[0] != inputSHA256
+
+# Name:        set_scrape_db
+# Purpose:     Replace the line items of a state for a month in the product database and record how they were scraped
+# Parameters:  db (product database)
+#              state (2-letter state abbreviation)
+#              yyyy (4-digit year)
+#              mm (2-digit month)
+#              data (scraped data of state)
+#              inputSHA256 (SHA-256 digest of input file, or None)
+#              templateVersion (version of template)
+# Returns:     
+
+def set_scrape_db(db, state, yyyy, mm, data, inputSHA256, templateVersion):
+    with db:
+        db.execute("DELETE FROM products WHERE state = ? AND year = ? AND month = ?", (state, int(yyyy), int(mm)))
+        db.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", get_product_rows(data))
+        db.execute("INSERT OR REPLACE INTO scrapes VALUES (?, ?, ?, ?, ?)", (state, int(yyyy), int(mm), inputSHA256, templateVersion))
+    return
+
+# Name:        get_scrape_db
+# Purpose:     Read the line items of a state for a month from the product database
+# Parameters:  db (product database)
+#              state (2-letter state abbreviation)
+#              yyyy (4-digit year)
+#              mm (2-digit month)
+# Returns:     List of lists (one for each line item) containing scraped data, as returned by the template
+
+def get_scrape_db(db, state, yyyy, mm):
+    rows = db.execute("SELECT tax_type, tax_value_text, tax_unit, tax_time FROM products WHERE state = ? AND year = ? AND month = ? ORDER BY item", (state, int(yyyy), int(mm))).fetchall()
+    return [[state, yyyy, mm, tax_type, tax_value, tax_unit, tax_time] for (tax_type, tax_value, tax_unit, tax_time) in rows]
+
+# Name:        scrape_state
+# Purpose:     Convert the PDF of a state for a month to TXT format if needed and scrape data from it
+# Parameters:  projName (project name)
+#              state (2-letter state abbreviation)
+#              stateName (name of state)
+#              yyyy (4-digit year)
+#              mm (2-digit month)
+#              reconvert (True (the PDF has changed, so an existing converted TXT file is replaced) or False)
+# Returns:     List of lists (one for each line item) containing scraped data of the state
+
+def scrape_state(projName, state, stateName, yyyy, mm, reconvert=False):
+    print_section_name(stateName)
+    docName = "{}_{}_{}".format(state, yyyy, mm)
+    pdfLoc = "./{}/pdf/{}.pdf".format(projName, docName)
+    txtLoc = "./{}/txt/{}.txt".format(projName, docName)
+    datLoc = "./{}/dat/{}.txt".format(projName, docName)
+
+    if os.path.isfile(pdfLoc):
+        print("PDF exists.")
+    else:
+        print("No PDF exists.")
+        print("No converted TXT file created.")
+        print("No output TXT file created.")
+
+    if reconvert and os.path.isfile(pdfLoc) and os.path.isfile(txtLoc):
+        print("PDF has changed.  Removing converted TXT file ...")
+        os.remove(txtLoc)
+    if os.path.isfile(txtLoc):
+        print("Converted TXT file already exists.")
+    elif os.path.isfile(pdfLoc):
+        convert_pdf_to_txt(pdfLoc, txtLoc)
+        if os.path.isfile(txtLoc):
+            print("Converted TXT file created.")
+        else:
+            print("No converted TXT file created.")
+    
+    if os.path.isfile(datLoc):
+        print("Output TXT file already exists.  Removing ...")
+        os.system("rm {}".format(datLoc))
+    data = []
+    if os.path.isfile(txtLoc):
+        lines_clean = get_text(txtLoc)
+        if state in templatesRegistry:
+            data = templatesRegistry[state]["scrape"](lines_clean, state, yyyy, mm)
+        create_output(data, datLoc)
+        if os.path.isfile(datLoc):
+            print("Output TXT file created.")
+            print("Number of line items scraped: {}".format(len(data)))
+        else:
+            print("No output TXT file created.")
+    return data
+
+# Name:        scrape_state_buffered
+# Purpose:     Run scrape_state in a worker process and collect what it prints
+# Parameters:  Same as scrape_state
+# Returns:     Printed text and scraped data
+
+def scrape_state_buffered(projName, state, stateName, yyyy, mm, reconvert=False):
+    output = io.StringIO()
+    with redirect_stdout(output):
+        data = scrape_state(projName, state, stateName, yyyy, mm, reconvert)
+    return (output.getvalue(), data)
+
+# Name:        print_scrape_current
+# Purpose:     Print the section of a state whose line items in the product database are up to date, instead of scraping it
+# Parameters:  db (product database)
+#              state (2-letter state abbreviation)
+#              stateName (name of state)
+#              yyyy (4-digit year)
+#              mm (2-digit month)
+# Returns:     List of lists (one for each line item) containing scraped data of the state, read from the database
+
+def print_scrape_current(db, state, stateName, yyyy, mm):
+    print_section_name(stateName)
+    data = get_scrape_db(db, state, yyyy, mm)
+    print("Line items in the database are up to date.")
+    print("Number of line items in the database: {}".format(len(data)))
+    return data
+
 # Name:        scrape_data
 # Purpose:     Iterate through states and scrape data from previously downloaded PDFs
 # Parameters:  projName (project name)
 #              yyyy (4-digit year)
 #              mm (2-digit month)
-# Returns:     
+#              workers (number of states converted and scraped at the same time)
+#              incremental (True: only scrape the states whose input file or template changed since they were last
+#              scraped, and keep the line items of all states in the product database)
+# Returns:     List of lists (one for each line item) containing scraped data of all states
 
-def scrape_data(projName, yyyy, mm):
+def scrape_data(projName, yyyy, mm, workers=1, incremental=False):
     # Create year and month values
     yy = yyyy[2:]
     month = ""
@@ -1712,146 +2243,51 @@ def scrape_data(projName, yyyy, mm):
     # List of states to loop through
     states = ["CA", "CT", "NJ", "PA"]
 
-    for state in states:
-        print_section_name(statesDict[state])
-        docName = "{}_{}_{}".format(state, yyyy, mm)
-        pdfLoc = "./{}/pdf/{}.pdf".format(projName, docName)
-        txtLoc = "./{}/txt/{}.txt".format(projName, docName)
-        datLoc = "./{}/dat/{}.txt".format(projName, docName)
-
-        if os.path.isfile(pdfLoc):
-            print("PDF exists.")
-        else:
-            print("No PDF exists.")
-            print("No converted TXT file created.")
-            print("No output TXT file created.")
-
-        if os.path.isfile(txtLoc):
-            print("Converted TXT file already exists.")
-        elif os.path.isfile(pdfLoc):
-            convert_pdf_to_txt(pdfLoc, txtLoc)
-            if os.path.isfile(txtLoc):
-                print("Converted TXT file created.")
-            else:
-                print("No converted TXT file created.")
-        
-        if os.path.isfile(datLoc):
-            print("Output TXT file already exists.  Removing ...")
-            os.system("rm {}".format(datLoc))
-        if os.path.isfile(txtLoc):
-            data = []
-            lines_clean = get_text(txtLoc)
-            if state == "AL":
-                data = scrape_data_AL(lines_clean, state, yyyy, mm)
-            elif state == "AK":
-                data = scrape_data_AK(lines_clean, state, yyyy, mm)
-            elif state == "AZ":
-                data = scrape_data_AZ(lines_clean, state, yyyy, mm)
-            elif state == "AR":
-                data = scrape_data_AR(lines_clean, state, yyyy, mm)
-            elif state == "CA":
-                data = scrape_data_CA(lines_clean, state, yyyy, mm)
-            elif state == "CO":
-                data = scrape_data_CO(lines_clean, state, yyyy, mm)
-            elif state == "CT":
-                data = scrape_data_CT(lines_clean, state, yyyy, mm)
-            elif state == "DE":
-                data = scrape_data_DE(lines_clean, state, yyyy, mm)
-            elif state == "DC":
-                data = scrape_data_DC(lines_clean, state, yyyy, mm)
-            elif state == "FL":
-                data = scrape_data_FL(lines_clean, state, yyyy, mm)
-            elif state == "GA":
-                data = scrape_data_GA(lines_clean, state, yyyy, mm)
-            elif state == "HI":
-                data = scrape_data_HI(lines_clean, state, yyyy, mm)
-            elif state == "ID":
-                data = scrape_data_ID(lines_clean, state, yyyy, mm)
-            elif state == "IL":
-                data = scrape_data_IL(lines_clean, state, yyyy, mm)
-            elif state == "IN":
-                data = scrape_data_IN(lines_clean, state, yyyy, mm)
-            elif state == "IA":
-                data = scrape_data_IA(lines_clean, state, yyyy, mm)
-            elif state == "KS":
-                data = scrape_data_KS(lines_clean, state, yyyy, mm)
-            elif state == "KY":
-                data = scrape_data_KY(lines_clean, state, yyyy, mm)
-            elif state == "LA":
-                data = scrape_data_LA(lines_clean, state, yyyy, mm)
-            elif state == "ME":
-                data = scrape_data_ME(lines_clean, state, yyyy, mm)
-            elif state == "MD":
-                data = scrape_data_MD(lines_clean, state, yyyy, mm)
-            elif state == "MA":
-                data = scrape_data_MA(lines_clean, state, yyyy, mm)
-            elif state == "MI":
-                data = scrape_data_MI(lines_clean, state, yyyy, mm)
-            elif state == "MN":
-                data = scrape_data_MN(lines_clean, state, yyyy, mm)
-            elif state == "MS":
-                data = scrape_data_MS(lines_clean, state, yyyy, mm)
-            elif state == "MO":
-                data = scrape_data_MO(lines_clean, state, yyyy, mm)
-            elif state == "MT":
-                data = scrape_data_MT(lines_clean, state, yyyy, mm)
-            elif state == "NE":
-                data = scrape_data_NE(lines_clean, state, yyyy, mm)
-            elif state == "NV":
-                data = scrape_data_NV(lines_clean, state, yyyy, mm)
-            elif state == "NH":
-                data = scrape_data_NH(lines_clean, state, yyyy, mm)
-            elif state == "NJ":
-                data = scrape_data_NJ(lines_clean, state, yyyy, mm)
-            elif state == "NM":
-                data = scrape_data_NM(lines_clean, state, yyyy, mm)
-            elif state == "NY":
-                data = scrape_data_NY(lines_clean, state, yyyy, mm)
-            elif state == "NC":
-                data = scrape_data_NC(lines_clean, state, yyyy, mm)
-            elif state == "ND":
-                data = scrape_data_ND(lines_clean, state, yyyy, mm)
-            elif state == "OH":
-                data = scrape_data_OH(lines_clean, state, yyyy, mm)
-            elif state == "OK":
-                data = scrape_data_OK(lines_clean, state, yyyy, mm)
-            elif state == "OR":
-                data = scrape_data_OR(lines_clean, state, yyyy, mm)
-            elif state == "PA":
-                data = scrape_data_PA(lines_clean, state, yyyy, mm)
-            elif state == "PR":
-                data = scrape_data_PR(lines_clean, state, yyyy, mm)
-            elif state == "RI":
-                data = scrape_data_RI(lines_clean, state, yyyy, mm)
-            elif state == "SC":
-                data = scrape_data_SC(lines_clean, state, yyyy, mm)
-            elif state == "SD":
-                data = scrape_data_SD(lines_clean, state, yyyy, mm)
-            elif state == "TN":
-                data = scrape_data_TN(lines_clean, state, yyyy, mm)
-            elif state == "TX":
-                data = scrape_data_TX(lines_clean, state, yyyy, mm)
-            elif state == "UT":
-                data = scrape_data_UT(lines_clean, state, yyyy, mm)
-            elif state == "VT":
-                data = scrape_data_VT(lines_clean, state, yyyy, mm)
-            elif state == "VA":
-                data = scrape_data_VA(lines_clean, state, yyyy, mm)
-            elif state == "WA":
-                data = scrape_data_WA(lines_clean, state, yyyy, mm)
-            elif state == "WV":
-                data = scrape_data_WV(lines_clean, state, yyyy, mm)
-            elif state == "WI":
-                data = scrape_data_WI(lines_clean, state, yyyy, mm)
-            elif state == "WY":
-                data = scrape_data_WY(lines_clean, state, yyyy, mm)
-            prod.extend(data)
-            create_output(data, datLoc)
-            if os.path.isfile(datLoc):
-                print("Output TXT file created.")
-                print("Number of line items scraped: {}".format(len(data)))
+    # In incremental mode, the states whose line items in the product database are up to date are not scraped again
+    # The PDF of a state that has changed since it was last scraped is converted again, even if a TXT file exists
+    stale = states
+    reconvert = []
+    if incremental:
+        db = open_product_db("./{}/prod/prod.db".format(projName))
+        inputs = {}
+        versions = {}
+        for state in states:
+            inputs[state] = get_input_sha256(projName, state, yyyy, mm)
+            versions[state] = get_template_version(state)
+        stale = [state for state in states if not is_scrape_current(db, state, yyyy, mm, inputs[state], versions[state])]
+        reconvert = [state for state in stale if is_input_changed(db, state, yyyy, mm, inputs[state])]
+
+    results = {}
+    if workers == 1:
+        for state in states:
+            if state in stale:
+                results[state] = scrape_state(projName, state, statesDict[state], yyyy, mm, state in reconvert)
             else:
-                print("No output TXT file created.")
+                results[state] = print_scrape_current(db, state, statesDict[state], yyyy, mm)
+            prod.extend(results[state])
+    else:
+        # The states are converted and scraped in a pool of worker processes, and the output of each state is printed
+        # as a whole, in order, so the product is the same as in a serial run
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for state in stale:
+                futures[state] = executor.submit(scrape_state_buffered, projName, state, statesDict[state], yyyy, mm, state in reconvert)
+            for state in states:
+                if state in stale:
+                    (output, results[state]) = futures[state].result()
+                    sys.stdout.write(output)
+                    sys.stdout.flush()
+                else:
+                    results[state] = print_scrape_current(db, state, statesDict[state], yyyy, mm)
+                prod.extend(results[state])
+
+    if incremental:
+        for state in stale:
+            # A state without a converted TXT file (the conversion failed, for example) is scraped again in the next run
+            if not os.path.isfile("./{}/txt/{}_{}_{}.txt".format(projName, state, yyyy, mm)):
+                inputs[state] = None
+            set_scrape_db(db, state, yyyy, mm, results[state], inputs[state], versions[state])
+        db.close()
     
     print_section_name("Product")
     if os.path.isfile(prodLoc):
@@ -1864,15 +2300,120 @@ def scrape_data(projName, yyyy, mm):
         print("No product created.")
     
     print("")
+    return prod
+
+# Name:        scrape_data_buffered
+# Purpose:     Run scrape_data for one month in a worker process and collect what it prints
+# Parameters:  projName (project name)
+#              yyyy (4-digit year)
+#              mm (2-digit month)
+#              incremental (see scrape_data)
+# Returns:     Printed text and scraped data
+
+def scrape_data_buffered(projName, yyyy, mm, incremental=False):
+    output = io.StringIO()
+    with redirect_stdout(output):
+        print_section_name("{}-{}".format(yyyy, mm))
+        prod = scrape_data(projName, yyyy, mm, incremental=incremental)
+    return (output.getvalue(), prod)
+
+# Name:        scrape_months
+# Purpose:     Scrape data for a range of months, writing the product of each month and a combined product
+# Parameters:  projName (project name)
+#              months (list of 4-digit years and 2-digit months)
+#              workers (number of months scraped at the same time)
+#              incremental (see scrape_data)
+# Returns:     List of lists (one for each line item) containing scraped data of all months
+
+def scrape_months(projName, months, workers=1, incremental=False):
+    prod = []
+    (firstYear, firstMonth) = months[0]
+    (lastYear, lastMonth) = months[-1]
+    prodLoc = "./{}/prod/{}_{}_to_{}_{}.txt".format(projName, firstYear, firstMonth, lastYear, lastMonth)
+
+    if workers == 1:
+        for (yyyy, mm) in months:
+            print_section_name("{}-{}".format(yyyy, mm))
+            prod.extend(scrape_data(projName, yyyy, mm, incremental=incremental))
+    else:
+        # The months are scraped in a pool of worker processes, and the output of each month is printed as a whole,
+        # in order, so the combined product is the same as in a serial run
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(scrape_data_buffered, projName, yyyy, mm, incremental) for (yyyy, mm) in months]
+            for future in futures:
+                (output, data) = future.result()
+                sys.stdout.write(output)
+                sys.stdout.flush()
+                prod.extend(data)
+
+    print_section_name("Combined Product")
+    if os.path.isfile(prodLoc):
+        print("Combined product already exists.  Removing ...")
+        os.remove(prodLoc)
+    create_output(prod, prodLoc)
+    if os.path.isfile(prodLoc):
+        print("Combined product created.")
+    else:
+        print("No combined product created.")
+
+    print("")
+    return prod
+
+# Name:        benchmark_templates
+# Purpose:     Measure how many lines per second the template of each state scrapes, using the TXT files of a project
+#              Each state's TXT files are read once and then scraped repeatedly for at least BENCHMARK_SECONDS seconds
+# Parameters:  projName (project name)
+# Returns:     
+
+def benchmark_templates(projName):
+    states = ["CA", "CT", "NJ", "PA"]
+
+    print_section_name("Benchmark")
+    for state in states:
+        txtLocs = sorted(glob.glob("./{}/txt/{}_[0-9][0-9][0-9][0-9]_[0-9][0-9].txt".format(projName, state)))
+        if len(txtLocs) == 0:
+            print("{}: no TXT files".format(state))
+            continue
+        texts = []
+        for txtLoc in txtLocs:
+            (yyyy, mm) = os.path.basename(txtLoc)[3:-4].split("_")
+            texts.append((get_text(txtLoc), yyyy, mm))
+        scrape_data_state = templatesRegistry[state]["scrape"]
+        n_lines = 0
+        n_items = 0
+        start = perf_counter()
+        while perf_counter() - start < BENCHMARK_SECONDS:
+            for (lines_clean, yyyy, mm) in texts:
+                n_items += len(scrape_data_state(lines_clean, state, yyyy, mm))
+                n_lines += len(lines_clean)
+        seconds = perf_counter() - start
+        print("{}: {} TXT files, {} lines, {} line items in {:.2f} seconds ({:,.0f} lines per second)".format(state, len(texts), n_lines, n_items, seconds, n_lines / seconds))
+    print("")
     return
 
 def main():
     # Check valid arguments
     if valid_arguments():
-        scrape_data(sys.argv[1], sys.argv[2], sys.argv[3])
+        options = get_options(sys.argv[2:])
+        if options["benchmark"]:
+            benchmark_templates(sys.argv[1])
+        else:
+            if options["range"]:
+                prod = scrape_months(sys.argv[1], options["months"], options["workers"], options["incremental"])
+            else:
+                (yyyy, mm) = options["months"][0]
+                prod = scrape_data(sys.argv[1], yyyy, mm, options["workers"], options["incremental"])
+            if options["db"]:
+                print_section_name("Database")
+                dbLoc = "./{}/prod/prod.db".format(sys.argv[1])
+                n = create_output_db(prod, options["months"], dbLoc)
+                print("Number of line items written to {}: {}".format(dbLoc, n))
+                print("")
     else:
         print("\nInvalid arguments")
-        print("Invocation:  python3 m2_scrape.py <projName> <yyyy> <mm>\n")
+        print("Invocation:  python3 m2_scrape.py <projName> <yyyy> <mm> [--workers <n>] [--db | --incremental]")
+        print("             python3 m2_scrape.py <projName> --from <yyyy-mm> --to <yyyy-mm> [--workers <n>] [--db | --incremental]")
+        print("             python3 m2_scrape.py <projName> --benchmark\n")
     return   
 
 if __name__ == "__main__":
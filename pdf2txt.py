@@ -2,7 +2,7 @@
 
 #Name:        pdf2txt.py
 #Purpose:     Extract text from PDFs
-#Invocation:  Invoked by s2_convert.py
+#Invocation:  Imported by s2_convert.py, which calls process_pdf and process_pages in-process
 #             pdf2txt.py -o <xmlFile> -t xml <pdfFile>
 #Notes:       This program comes with the PDFMiner module
 #             It is included in the SABLE repository for completeness
@@ -21,6 +21,32 @@ from pdfminer.cmapdb import CMapDB
 from pdfminer.layout import LAParams
 from pdfminer.image import ImageWriter
 
+# process_pages
+# Feed each page of a PDF to the device and yield the page once the device
+# has received it; raises PDFTextExtractionNotAllowed (and the usual
+# PDFMiner exceptions) instead of exiting the process
+def process_pages(rsrcmgr, device, fname, pagenos=set(), maxpages=0,
+                  password=b'', caching=True, rotation=0):
+    with open(fname, 'rb') as fp:
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for page in PDFPage.get_pages(fp, pagenos,
+                                      maxpages=maxpages, password=password,
+                                      caching=caching, check_extractable=True):
+            page.rotate = (page.rotate+rotation) % 360
+            interpreter.process_page(page)
+            yield page
+    return
+
+# process_pdf
+# Feed every page of a PDF to the device
+def process_pdf(rsrcmgr, device, fname, pagenos=set(), maxpages=0,
+                password=b'', caching=True, rotation=0):
+    for page in process_pages(rsrcmgr, device, fname, pagenos,
+                              maxpages=maxpages, password=password,
+                              caching=caching, rotation=rotation):
+        pass
+    return
+
 # main
 def main(argv):
     import getopt
@@ -112,13 +138,9 @@ def main(argv):
     else:
         return usage()
     for fname in args:
-        with open(fname, 'rb') as fp:
-            interpreter = PDFPageInterpreter(rsrcmgr, device)
-            for page in PDFPage.get_pages(fp, pagenos,
-                                          maxpages=maxpages, password=password,
-                                          caching=caching, check_extractable=True):
-                page.rotate = (page.rotate+rotation) % 360
-                interpreter.process_page(page)
+        process_pdf(rsrcmgr, device, fname, pagenos,
+                    maxpages=maxpages, password=password,
+                    caching=caching, rotation=rotation)
     device.close()
     outfp.close()
     return
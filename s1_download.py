@@ -1,12 +1,81 @@
 # Name:        s1_download.py
 # Purpose:     Download PDFs discovered during web crawling
-# Invocation:  python3 s1_download.py <projName>
+# Invocation:  python3 s1_download.py <projName> [--workers <n>] [--per-host <n>] [--rate <r>] [--probe] [--refresh]
 
 import codecs
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import csv
+from email.utils import parsedate_to_datetime
+import hashlib
 import os
 import re
+import requests
+from requests.adapters import HTTPAdapter
+from s1_status import PDF_URL, write_download_statuses
+import sqlite3
 import sys
+import threading
+import time
+from urllib.parse import quote, unquote, urlsplit
+from urllib.robotparser import RobotFileParser
+import urllib3
+from urllib3.util.retry import Retry
+
+SABLE_USER_AGENT = "SABLE (U.S. Census Bureau research to find alternative data sources and reduce respondent burden) https://github.com/uscensusbureau/sable/; census-aidcrb-support-team@census.gov; For more information, go to www.census.gov/scraping/"
+
+# Seconds to wait for a server to connect or send data before a download is abandoned
+TIMEOUT = 60
+
+# Each worker thread keeps its own HTTP session, so connections to a host are kept alive and reused (see get_session)
+threadSessions = threading.local()
+
+# Semaphores that limit the number of simultaneous downloads from each host (see get_host_limit)
+hostLimits = {}
+hostLimitsLock = threading.Lock()
+
+# Requests to each host are spaced out by a token bucket (see wait_for_host)
+# A host gets HOST_BURST requests right away and then one request every requestInterval seconds, or every Crawl-delay
+# seconds (one at a time) if its robots.txt asks for a longer delay
+HOST_BURST = 2
+requestInterval = 0.5
+hostSchedules = {}
+hostSchedulesLock = threading.Lock()
+
+# Statuses with which a host asks for fewer requests, and how the host is then backed off (see record_response)
+# The wait given by a Retry-After header is used if there is one (up to BACKOFF_MAX seconds), and otherwise the wait
+# starts at BACKOFF_BASE seconds and doubles with each such response in a row
+SLOW_DOWN_STATUSES = (429, 503)
+BACKOFF_BASE = 2
+BACKOFF_MAX = 300
+MAX_RETRIES = 5
+
+# Journal of downloads shared by the worker threads (see open_journal)
+journal = None
+journalLock = threading.Lock()
+
+# Lock that keeps the statuses of finished downloads from being printed at the same time (see finish_download)
+printLock = threading.Lock()
+
+# Pattern used by is_pdf, along with PDF_URL (see s1_status.py)
+PDF_METADATA = "Content-Type:application/pdf"
+
+# Parts of URLs that are normalized by canonicalize_url
+# Query parameters added for tracking (such as Google Analytics "utm_" parameters) do not change the document
+PERCENT_ESCAPE = re.compile(r"%([0-9a-fA-F]{2})")
+UNRESERVED_CHARS = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+TRACKING_PARAMS = re.compile(r"^(utm_[a-z_]+|gclid|fbclid|msclkid|mc_cid|mc_eid|_ga|_gl)$", re.I)
+
+# PDFs found by HEAD requests, keyed by Content-Length and ETag, and the bytes saved by them (see probe_pdf)
+probedPdfs = {}
+probeSavings = {"bytes": 0}
+probeLock = threading.Lock()
+
+# Columns of the journal table
+JOURNAL_COLUMNS = ("url", "file", "size", "status", "etag", "last_modified", "sha256", "complete")
+
+# Certificates are not checked (as with wget --no-check-certificate), so the warning for each request is turned off
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Name:        valid_arguments
 # Purpose:     Check whether the command-line arguments are valid
@@ -14,54 +83,695 @@ import sys
 # Returns:     True (all arguments are valid) or False (at least one argument is invalid)
 
 def valid_arguments():
-    if len(sys.argv) == 2 and re.search(r"^[a-zA-Z][a-zA-Z_-]*$", sys.argv[1]):
+    if len(sys.argv) >= 2 and re.search(r"^[a-zA-Z][a-zA-Z_-]*$", sys.argv[1]) and get_options(sys.argv[2:]) is not None:
         return True
     return False
 
+# Name:        get_options
+# Purpose:     Parse the optional command-line arguments that follow <projName>
+# Parameters:  args (list of optional command-line arguments)
+# Returns:     Dictionary of option values or None (at least one option is invalid)
+
+def get_options(args):
+    options = {"workers": 8, "perHost": 2, "rate": 2.0, "probe": False, "refresh": False}
+    i = 0
+    while i < len(args):
+        if args[i] == "--workers" and i + 1 < len(args) and re.search(r"^[1-9][0-9]*$", args[i + 1]):
+            options["workers"] = int(args[i + 1])
+            i += 2
+        elif args[i] == "--per-host" and i + 1 < len(args) and re.search(r"^[1-9][0-9]*$", args[i + 1]):
+            options["perHost"] = int(args[i + 1])
+            i += 2
+        elif args[i] == "--rate" and i + 1 < len(args) and re.search(r"^([0-9]*\.)?[0-9]+$", args[i + 1]) and float(args[i + 1]) > 0:
+            options["rate"] = float(args[i + 1])
+            i += 2
+        elif args[i] == "--probe":
+            options["probe"] = True
+            i += 1
+        elif args[i] == "--refresh":
+            options["refresh"] = True
+            i += 1
+        else:
+            return None
+    return options
+
 # Name:        is_pdf
 # Purpose:     Determine whether the URL points to a PDF
 # Parameters:  url
 #              metadata
-# Returns:     Regular expression match object
+# Returns:     True (URL points to a PDF) or False
 
 def is_pdf(url, metadata):
-    urlMatch = re.search(r"^(\S+)\.([pP][dD][fF])$", url)
-    metadataMatch = re.search(r"Content-Type:application/pdf", metadata)
-    return urlMatch or metadataMatch
+    # Most crawled URLs are HTML pages, so the regular expression is only applied to URLs that end in ".pdf"
+    # (or ".pdf" followed by a newline, which "$" also accepts)
+    if ".pdf" in url[-5:].lower() and PDF_URL.search(url):
+        return True
+    return PDF_METADATA in metadata
+
+# Name:        normalize_percent
+# Purpose:     Write the percent-encoding of part of a URL in a standard form
+#              Escaped unreserved characters are decoded, other escapes are written in upper case, and characters that
+#              should have been escaped (such as spaces) are escaped
+# Parameters:  text (path or query parameter of URL)
+# Returns:     Normalized text
+
+def normalize_percent(text):
+    text = quote(text, safe="!#$%&'()*+,/:;=?@[]~")
+    return PERCENT_ESCAPE.sub(normalize_escape, text)
+
+# Name:        normalize_escape
+# Purpose:     Normalize one percent-encoded character (called by normalize_percent for each escape)
+# Parameters:  escapeMatch (regular expression match object of PERCENT_ESCAPE)
+# Returns:     Unreserved character or escape in upper case
+
+def normalize_escape(escapeMatch):
+    char = chr(int(escapeMatch.group(1), 16))
+    if char in UNRESERVED_CHARS:
+        return char
+    return "%" + escapeMatch.group(1).upper()
+
+# Name:        canonicalize_url
+# Purpose:     Get the canonical form of a URL, which is the same for URLs that point to the same document
+#              The scheme (http or https), a leading "www.", default ports, the fragment, tracking parameters,
+#              and differences in percent-encoding are ignored
+# Parameters:  url
+# Returns:     Canonical form of URL (only used to compare URLs, not to download them)
+
+def canonicalize_url(url):
+    urlParts = urlsplit(url.strip())
+    try:
+        port = urlParts.port
+    except ValueError:
+        return url
+    host = (urlParts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if port is not None and port != 80 and port != 443:
+        host = "{}:{}".format(host, port)
+    if urlParts.scheme.lower() not in ("http", "https"):
+        host = "{}://{}".format(urlParts.scheme.lower(), host)
+    path = normalize_percent(urlParts.path)
+    if path == "":
+        path = "/"
+    params = []
+    for param in urlParts.query.split("&"):
+        if param != "" and not TRACKING_PARAMS.search(param.split("=")[0]):
+            params.append(normalize_percent(param))
+    if len(params) == 0:
+        return host + path
+    return "{}{}?{}".format(host, path, "&".join(params))
+
+# Name:        get_dump_files
+# Purpose:     Get the locations of the CSV files output by Apache Nutch
+#              The command readdb writes one or more part files (part-r-00000, part-r-00001, ...), which are read in
+#              order if present, and otherwise the combined file dump.csv is read
+# Parameters:  projName (project name)
+# Returns:     List of file locations
+
+def get_dump_files(projName):
+    dumpDir = "./{}/dump".format(projName)
+    dumpFiles = []
+    for dumpName in sorted(os.listdir(dumpDir)):
+        if re.search(r"^part-r-[0-9]+$", dumpName):
+            dumpFiles.append("{}/{}".format(dumpDir, dumpName))
+    if len(dumpFiles) == 0:
+        dumpFiles.append("{}/dump.csv".format(dumpDir))
+    return dumpFiles
+
+# Name:        get_pdf_urls
+# Purpose:     Read the CSV files output by Apache Nutch row by row and pick out the URLs that point to PDFs
+#              Only the Url and Metadata columns are looked at, and each file has its own header row
+# Parameters:  projName (project name)
+#              counts (dictionary whose "duplicates" entry counts the URLs skipped as duplicates)
+# Returns:     Generator of URLs (only the first of the URLs with the same canonical form)
+
+def get_pdf_urls(projName, counts):
+    urlsSeen = set()
+    for dumpFile in get_dump_files(projName):
+        f = codecs.open(dumpFile, "r")
+        rdr = csv.reader(f)
+        header = next(rdr, None)
+        if header is not None and "Url" in header and "Metadata" in header:
+            urlIndex = header.index("Url")
+            metadataIndex = header.index("Metadata")
+            minLength = max(urlIndex, metadataIndex) + 1
+            for row in rdr:
+                if len(row) >= minLength and is_pdf(row[urlIndex], row[metadataIndex]):
+                    canonicalUrl = canonicalize_url(row[urlIndex])
+                    if canonicalUrl in urlsSeen:
+                        counts["duplicates"] += 1
+                    else:
+                        urlsSeen.add(canonicalUrl)
+                        yield row[urlIndex]
+        f.close()
+    return
+
+# Name:        open_journal
+# Purpose:     Open the download journal of a project, creating it if necessary
+#              The journal records each URL, the file it is saved to, and how far the download got, so that a rerun
+#              skips completed downloads and resumes partial ones
+# Parameters:  projName (project name)
+# Returns:     
+
+def open_journal(projName):
+    global journal
+    journal = sqlite3.connect("./{}/download.db".format(projName), check_same_thread=False)
+    journal.execute("CREATE TABLE IF NOT EXISTS downloads (url TEXT PRIMARY KEY, file TEXT, size INTEGER, status INTEGER, etag TEXT, last_modified TEXT, sha256 TEXT, complete INTEGER)")
+    journal.commit()
+    return
+
+# Name:        close_journal
+# Purpose:     Close the download journal
+# Parameters:  
+# Returns:     
+
+def close_journal():
+    global journal
+    journal.close()
+    journal = None
+    return
+
+# Name:        get_journal_entry
+# Purpose:     Look up a URL in the download journal
+# Parameters:  url
+# Returns:     Dictionary of journal columns or None (URL not in journal)
+
+def get_journal_entry(url):
+    with journalLock:
+        row = journal.execute("SELECT {} FROM downloads WHERE url = ?".format(", ".join(JOURNAL_COLUMNS)), (url,)).fetchone()
+    if row is None:
+        return None
+    return dict(zip(JOURNAL_COLUMNS, row))
+
+# Name:        set_journal_entry
+# Purpose:     Record the current state of a download in the journal
+#              Each change is committed right away, so the journal is up to date if the program is interrupted
+# Parameters:  entry (dictionary of journal columns)
+# Returns:     
+
+def set_journal_entry(entry):
+    with journalLock:
+        journal.execute("INSERT OR REPLACE INTO downloads ({}) VALUES ({})".format(", ".join(JOURNAL_COLUMNS), ", ".join(["?"] * len(JOURNAL_COLUMNS))), [entry[column] for column in JOURNAL_COLUMNS])
+        journal.commit()
+    return
+
+# Name:        get_file_digest
+# Purpose:     Compute the SHA-256 digest of the contents of a file
+# Parameters:  fileName (location of file)
+# Returns:     Hexadecimal digest
+
+def get_file_digest(fileName):
+    digest = hashlib.sha256()
+    f = open(fileName, "rb")
+    for block in iter(lambda: f.read(1048576), b""):
+        digest.update(block)
+    f.close()
+    return digest.hexdigest()
+
+# Name:        get_session
+# Purpose:     Get the HTTP session of the current worker thread
+# Parameters:  
+# Returns:     requests.Session object
+
+def get_session():
+    if not hasattr(threadSessions, "session"):
+        session = requests.Session()
+        session.headers["User-Agent"] = SABLE_USER_AGENT
+        session.verify = False
+        # Failed connections are retried a few times before the URL is reported as a problem
+        # Responses with a Retry-After header are left to request_url, so that all threads wait for the host
+        adapter = HTTPAdapter(max_retries=Retry(total=3, read=False, respect_retry_after_header=False))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        threadSessions.session = session
+    return threadSessions.session
+
+# Name:        get_host_limit
+# Purpose:     Get the semaphore that limits the number of simultaneous downloads from a host
+# Parameters:  host (host name and port of URL)
+#              perHost (maximum number of simultaneous downloads from one host)
+# Returns:     threading.Semaphore object
+
+def get_host_limit(host, perHost):
+    with hostLimitsLock:
+        if host not in hostLimits:
+            hostLimits[host] = threading.Semaphore(perHost)
+        return hostLimits[host]
+
+# Name:        set_request_rate
+# Purpose:     Set the number of requests per second sent to each host (before robots.txt is taken into account)
+# Parameters:  rate (requests per second)
+# Returns:     
+
+def set_request_rate(rate):
+    global requestInterval
+    requestInterval = 1 / rate
+    return
+
+# Name:        get_crawl_delay
+# Purpose:     Get the Crawl-delay that the robots.txt file of a host asks SABLE to wait between requests
+# Parameters:  scheme (scheme of URL, "http" or "https")
+#              host (host name and port of URL)
+# Returns:     Number of seconds or None (no robots.txt or no Crawl-delay)
+
+def get_crawl_delay(scheme, host):
+    try:
+        response = get_session().get("{}://{}/robots.txt".format(scheme, host), timeout=TIMEOUT)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    robots = RobotFileParser()
+    robots.parse(response.text.splitlines())
+    return robots.crawl_delay(SABLE_USER_AGENT)
+
+# Name:        get_host_schedule
+# Purpose:     Get the token bucket and backoff state of the host of a URL
+#              The robots.txt file of the host is read the first time the host is seen
+# Parameters:  url
+# Returns:     Dictionary of schedule values
+
+def get_host_schedule(url):
+    urlParts = urlsplit(url)
+    host = urlParts.netloc.lower()
+    with hostSchedulesLock:
+        if host not in hostSchedules:
+            hostSchedules[host] = {"lock": threading.Lock(), "interval": None, "burst": 1, "tokens": 0, "updated": 0.0, "blockedUntil": 0.0, "failures": 0}
+        schedule = hostSchedules[host]
+    with schedule["lock"]:
+        if schedule["interval"] is None:
+            # Other threads that send requests to the host wait here until robots.txt has been read
+            crawlDelay = get_crawl_delay(urlParts.scheme, host)
+            if crawlDelay is not None and crawlDelay >= requestInterval:
+                schedule["interval"] = crawlDelay
+            else:
+                schedule["interval"] = requestInterval
+                schedule["burst"] = HOST_BURST
+            schedule["tokens"] = schedule["burst"]
+            schedule["updated"] = time.monotonic()
+    return schedule
+
+# Name:        wait_for_host
+# Purpose:     Wait until a request can be sent to the host of a URL without going over its rate or its backoff
+# Parameters:  url
+# Returns:     
+
+def wait_for_host(url):
+    schedule = get_host_schedule(url)
+    while True:
+        with schedule["lock"]:
+            now = time.monotonic()
+            if now < schedule["blockedUntil"]:
+                delay = schedule["blockedUntil"] - now
+            else:
+                schedule["tokens"] = min(schedule["burst"], schedule["tokens"] + (now - schedule["updated"]) / schedule["interval"])
+                schedule["updated"] = now
+                if schedule["tokens"] >= 1:
+                    schedule["tokens"] -= 1
+                    return
+                delay = (1 - schedule["tokens"]) * schedule["interval"]
+        time.sleep(delay)
+
+# Name:        get_retry_delay
+# Purpose:     Get the number of seconds given by a Retry-After header, which is either a number of seconds or a date
+# Parameters:  retryAfter (value of Retry-After header or None)
+# Returns:     Number of seconds or None (no header or header not understood)
+
+def get_retry_delay(retryAfter):
+    if retryAfter is None:
+        return None
+    retryAfter = retryAfter.strip()
+    if re.search(r"^[0-9]+$", retryAfter):
+        return int(retryAfter)
+    try:
+        retryTime = parsedate_to_datetime(retryAfter)
+    except (TypeError, ValueError):
+        return None
+    return max(0, retryTime.timestamp() - time.time())
+
+# Name:        record_response
+# Purpose:     Update the backoff state of the host of a URL after a response
+#              If the host asks for fewer requests (status 429 or 503), no request is sent to it until the wait given by
+#              Retry-After (or the exponential backoff) has passed
+# Parameters:  url
+#              status (HTTP status of response)
+#              retryAfter (value of Retry-After header or None)
+# Returns:     True (host asked for fewer requests) or False
+
+def record_response(url, status, retryAfter):
+    schedule = get_host_schedule(url)
+    with schedule["lock"]:
+        if status not in SLOW_DOWN_STATUSES:
+            schedule["failures"] = 0
+            return False
+        schedule["failures"] += 1
+        delay = get_retry_delay(retryAfter)
+        if delay is None:
+            delay = BACKOFF_BASE * 2 ** (schedule["failures"] - 1)
+        schedule["blockedUntil"] = max(schedule["blockedUntil"], time.monotonic() + min(delay, BACKOFF_MAX))
+        # The bucket starts empty when the wait is over, so the host does not get a burst of requests right away
+        schedule["tokens"] = 0
+        schedule["updated"] = schedule["blockedUntil"]
+    return True
+
+# Name:        request_url
+# Purpose:     Send an HTTP request at the rate allowed for the host of the URL, retrying it (up to MAX_RETRIES times)
+#              while the host asks for fewer requests
+# Parameters:  method ("GET" or "HEAD")
+#              url
+#              kwargs (other arguments of requests.Session.request)
+# Returns:     requests.Response object
+
+def request_url(method, url, **kwargs):
+    retries = 0
+    while True:
+        wait_for_host(url)
+        response = get_session().request(method, url, timeout=TIMEOUT, **kwargs)
+        if not record_response(url, response.status_code, response.headers.get("Retry-After")) or retries == MAX_RETRIES:
+            return response
+        response.close()
+        retries += 1
+
+# Name:        interleave_hosts
+# Purpose:     Reorder URLs so that URLs from different hosts take turns, which keeps the worker threads busy with other
+#              hosts while one host is waiting for its rate limit
+#              Up to window URLs are read ahead, and then one URL from each host is passed on at a time
+# Parameters:  urls (iterable of URLs)
+#              window (number of URLs read ahead)
+# Returns:     Generator of URLs
+
+def interleave_hosts(urls, window):
+    hostUrls = {}
+    count = 0
+    for url in urls:
+        host = urlsplit(url).netloc.lower()
+        if host not in hostUrls:
+            hostUrls[host] = deque()
+        hostUrls[host].append(url)
+        count += 1
+        if count >= window:
+            for host in list(hostUrls):
+                yield hostUrls[host].popleft()
+                count -= 1
+                if len(hostUrls[host]) == 0:
+                    del hostUrls[host]
+    while len(hostUrls) > 0:
+        for host in list(hostUrls):
+            yield hostUrls[host].popleft()
+            if len(hostUrls[host]) == 0:
+                del hostUrls[host]
+    return
+
+# Name:        get_file_name
+# Purpose:     Get the name under which a downloaded file is saved (same as wget)
+# Parameters:  url
+# Returns:     File name (last part of the URL path, decoded, followed by the query string if any)
+
+def get_file_name(url):
+    urlParts = urlsplit(url)
+    fileName = unquote(urlParts.path.split("/")[-1]).replace("/", "%2F")
+    if urlParts.query != "":
+        fileName = "{}?{}".format(fileName, urlParts.query)
+    if fileName == "":
+        fileName = "index.html"
+    return fileName
+
+# Name:        load_probed_pdfs
+# Purpose:     Add the PDFs completed in earlier runs to the PDFs found by HEAD requests
+# Parameters:  
+# Returns:     
+
+def load_probed_pdfs():
+    with journalLock:
+        rows = journal.execute("SELECT url, size, etag FROM downloads WHERE complete = 1 AND etag IS NOT NULL").fetchall()
+    for (url, size, etag) in rows:
+        probedPdfs[(str(size), etag)] = url
+    return
+
+# Name:        probe_pdf
+# Purpose:     Send a HEAD request and check whether a PDF with the same Content-Length and ETag has already been
+#              downloaded under another URL, in which case it is not downloaded again
+# Parameters:  url
+# Returns:     URL under which the same PDF was downloaded, or None (new PDF, or no Content-Length and ETag in the
+#              response) and key of the PDF (Content-Length and ETag, or None), to pass to add_probed_pdf once the PDF
+#              has been downloaded
+
+def probe_pdf(url):
+    try:
+        response = request_url("HEAD", url, allow_redirects=True)
+    except requests.RequestException:
+        return (None, None)
+    size = response.headers.get("Content-Length")
+    etag = response.headers.get("ETag")
+    if response.status_code >= 400 or size is None or etag is None:
+        return (None, None)
+    with probeLock:
+        if (size, etag) in probedPdfs:
+            probeSavings["bytes"] += int(size)
+            return (probedPdfs[(size, etag)], (size, etag))
+    return (None, (size, etag))
+
+# Name:        add_probed_pdf
+# Purpose:     Add a downloaded PDF to the PDFs found by HEAD requests
+#              This is only done once the download has succeeded, so that a URL that could not be downloaded is never
+#              given as the source of another URL
+# Parameters:  key (Content-Length and ETag returned by probe_pdf)
+#              url
+# Returns:     
+
+def add_probed_pdf(key, url):
+    with probeLock:
+        probedPdfs.setdefault(key, url)
+    return
+
+# Name:        reserve_download_file
+# Purpose:     Choose the name of a new file in the download folder without overwriting an existing file
+#              As with wget, a number is appended to the name of a file that already exists (file.pdf.1, file.pdf.2, ...)
+#              The PDF is downloaded to the same name followed by ".part", which is created here to reserve the name
+# Parameters:  projName (project name)
+#              fileName (file name returned by get_file_name)
+# Returns:     Location of the file
+
+def reserve_download_file(projName, fileName):
+    downloadFile = "./{}/download/{}".format(projName, fileName)
+    i = 0
+    while True:
+        if not os.path.exists(downloadFile):
+            try:
+                # Mode "x" fails if the file exists, so two threads never reserve the same name
+                open(downloadFile + ".part", "xb").close()
+                return downloadFile
+            except FileExistsError:
+                pass
+        i += 1
+        downloadFile = "./{}/download/{}.{}".format(projName, fileName, i)
 
 # Name:        download_pdf
-# Purpose:     Download the PDF
+# Purpose:     Download the PDF, or resume its download if an earlier run was interrupted
 # Parameters:  url
 #              projName (project name)
+#              perHost (maximum number of simultaneous downloads from one host)
+#              probe (True (send a HEAD request first to find duplicate PDFs) or False)
+#              refresh (True (check whether PDFs downloaded in earlier runs have changed) or False)
+# Returns:     status ("ok" (PDF downloaded), "skip" (PDF already downloaded), "unchanged" (PDF already downloaded and
+#              not changed), "updated" (changed PDF downloaded again), "dup" (same PDF as another URL), or "prob"
+#              (problem URL)) and detail (location of file, other URL, or problem description)
+
+def download_pdf(url, projName, perHost, probe=False, refresh=False):
+    entry = get_journal_entry(url)
+    refreshing = False
+    probeKey = None
+    if entry is None:
+        entry = {"url": url, "file": None, "size": None, "status": None, "etag": None, "last_modified": None, "sha256": None, "complete": 0}
+    elif entry["complete"] == 1 and os.path.isfile(entry["file"]):
+        if not refresh:
+            return ("skip", entry["file"])
+        refreshing = True
+
+    host = urlsplit(url).netloc.lower()
+    with get_host_limit(host, perHost):
+        headers = {}
+        if refreshing:
+            # Conditional request, to which the server responds with status 304 (not modified) and no PDF
+            # if the PDF has not changed since it was downloaded
+            if entry["etag"] is not None:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"] is not None:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        elif entry["complete"] == 0 and entry["file"] is not None and os.path.isfile(entry["file"] + ".part"):
+            # Ask for the rest of the partial file, but only if the PDF has not changed since the first request
+            # Otherwise, the server sends the whole PDF
+            partSize = os.path.getsize(entry["file"] + ".part")
+            if partSize > 0:
+                headers["Range"] = "bytes={}-".format(partSize)
+                if entry["etag"] is not None:
+                    headers["If-Range"] = entry["etag"]
+                elif entry["last_modified"] is not None:
+                    headers["If-Range"] = entry["last_modified"]
+        else:
+            if probe:
+                (duplicateUrl, probeKey) = probe_pdf(url)
+                if duplicateUrl is not None:
+                    return ("dup", duplicateUrl)
+            entry["file"] = reserve_download_file(projName, get_file_name(url))
+            entry["complete"] = 0
+        downloadFile = entry["file"]
+        partFile = downloadFile + ".part"
+
+        try:
+            response = request_url("GET", url, headers=headers, stream=True)
+        except requests.RequestException as e:
+            if not refreshing:
+                set_journal_entry(entry)
+            return ("prob", type(e).__name__)
+        with response:
+            if response.status_code == 304:
+                return ("unchanged", downloadFile)
+            if refreshing and response.status_code >= 400:
+                # The PDF downloaded in an earlier run is kept
+                return ("prob", "HTTP {}".format(response.status_code))
+            entry["status"] = response.status_code
+            if response.status_code >= 400:
+                # Nothing is kept for a URL that cannot be downloaded
+                if os.path.isfile(partFile):
+                    os.remove(partFile)
+                entry["file"] = None
+                set_journal_entry(entry)
+                return ("prob", "HTTP {}".format(response.status_code))
+            if refreshing:
+                # The journal keeps the ETag and Last-Modified of the PDF downloaded in an earlier run until the new
+                # PDF has been received in full, so that an interrupted download is not taken for an unchanged PDF
+                validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            else:
+                entry["etag"] = response.headers.get("ETag")
+                entry["last_modified"] = response.headers.get("Last-Modified")
+                set_journal_entry(entry)
+            # Status 206 (partial content) means the Range request was accepted
+            if response.status_code == 206:
+                f = open(partFile, "ab")
+            else:
+                f = open(partFile, "wb")
+            try:
+                for block in response.iter_content(65536):
+                    f.write(block)
+            except requests.RequestException as e:
+                f.close()
+                if refreshing:
+                    # The PDF downloaded in an earlier run is kept, and the next run asks for the new PDF again
+                    os.remove(partFile)
+                # Otherwise, the partial file is kept so that the next run can resume the download
+                return ("prob", type(e).__name__)
+            f.close()
+
+    os.replace(partFile, downloadFile)
+    oldDigest = entry["sha256"]
+    if refreshing:
+        (entry["etag"], entry["last_modified"]) = validators
+    entry["size"] = os.path.getsize(downloadFile)
+    entry["sha256"] = get_file_digest(downloadFile)
+    entry["complete"] = 1
+    set_journal_entry(entry)
+    if probeKey is not None:
+        add_probed_pdf(probeKey, url)
+    if refreshing:
+        # A server that does not support conditional requests sends the PDF even if it has not changed
+        if entry["sha256"] == oldDigest:
+            return ("unchanged", downloadFile)
+        return ("updated", downloadFile)
+    return ("ok", downloadFile)
+
+# Name:        finish_download
+# Purpose:     Print and record the status of a finished download (called by the worker thread that ran it)
+# Parameters:  url
+#              future (Future object of the download)
+#              statuses (list of URLs, statuses, and details to append to)
+#              pending (semaphore that limits the number of URLs waiting to be downloaded)
 # Returns:     
 
-def download_pdf(url, projName):
-    # Use the Linux/Unix utility wget to download the PDF
-    os.system("wget --no-check-certificate -nv --user-agent=\"SABLE (U.S. Census Bureau research to find alternative data sources and reduce respondent burden) https://github.com/uscensusbureau/sable/; census-aidcrb-support-team@census.gov; For more information, go to www.census.gov/scraping/\" -P ./{}/download \"{}\"".format(projName, url))
+def finish_download(url, future, statuses, pending):
+    try:
+        (status, detail) = future.result()
+    except Exception as e:
+        (status, detail) = ("prob", type(e).__name__)
+    with printLock:
+        print_status(url, status, detail)
+        statuses.append((url, status, detail))
+    pending.release()
+    return
+
+# Name:        print_status
+# Purpose:     Print the status of a URL
+# Parameters:  url
+#              status ("ok", "skip", "unchanged", "updated", "dup", or "prob")
+#              detail (location of file, other URL, or problem description)
+# Returns:     
+
+def print_status(url, status, detail):
+    if status == "ok":
+        print("{} -> {}".format(url, detail))
+    elif status == "updated":
+        print("{} -> {} (updated)".format(url, detail))
+    elif status == "dup":
+        print("{} (same as {})".format(url, detail))
+    elif status == "prob":
+        print("!!! PROBLEM: {} ({})".format(url, detail))
     return
 
 # Name:        download_pdfs
 # Purpose:     Download PDFs
 # Parameters:  projName (project name)
+#              workers (maximum number of simultaneous downloads)
+#              perHost (maximum number of simultaneous downloads from one host)
+#              rate (maximum number of requests per second to one host)
+#              probe (True (send a HEAD request first to find duplicate PDFs) or False)
+#              refresh (True (check whether PDFs downloaded in earlier runs have changed) or False)
 # Returns:     
 
-def download_pdfs(projName):
-    # Read in the list of URLs crawled by Apache Nutch and download the PDFs
-    f = codecs.open("./{}/dump/dump.csv".format(projName), "r")
-    rdr = csv.DictReader(f)
-    for row in rdr:
-        if is_pdf(row["Url"], row["Metadata"]):
-            download_pdf(row["Url"], projName)
-    f.close()
+def download_pdfs(projName, workers=8, perHost=2, rate=2.0, probe=False, refresh=False):
+    # Download the PDFs in a pool of worker threads while the URLs crawled by Apache Nutch are being read
+    # URLs that only differ in ways that do not change the document (see canonicalize_url) are downloaded only once
+    # The status of each URL is printed as soon as its download is finished
+    # URLs from different hosts take turns, and each host gets a limited number of requests per second
+    statuses = []
+    counts = {"duplicates": 0}
+    # Reading stops for a while when many URLs are waiting, so memory use does not grow with the size of the crawl
+    pending = threading.Semaphore(workers * 16)
+    runTime = time.time()
+    set_request_rate(rate)
+    open_journal(projName)
+    if probe:
+        load_probed_pdfs()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for url in interleave_hosts(get_pdf_urls(projName, counts), workers * 16):
+            pending.acquire()
+            future = executor.submit(download_pdf, url, projName, perHost, probe, refresh)
+            future.add_done_callback(lambda future, url=url: finish_download(url, future, statuses, pending))
+    close_journal()
+    write_download_statuses(projName, statuses, runTime)
+
+    statuses = [status for (url, status, detail) in statuses]
+    print("")
+    print("Number of PDFs downloaded:             {}".format(len([status for status in statuses if status == "ok"])))
+    print("Number of problem URLs:                {}".format(len([status for status in statuses if status == "prob"])))
+    print("Number of PDFs skipped (in journal):   {}".format(len([status for status in statuses if status == "skip"])))
+    if refresh:
+        print("Number of PDFs unchanged:              {}".format(len([status for status in statuses if status == "unchanged"])))
+        print("Number of PDFs updated:                {}".format(len([status for status in statuses if status == "updated"])))
+    print("Number of duplicate URLs skipped:      {}".format(counts["duplicates"]))
+    if probe:
+        print("Number of duplicate PDFs skipped:      {}".format(len([status for status in statuses if status == "dup"])))
+        print("Bytes saved by HEAD requests:          {}".format(probeSavings["bytes"]))
+    print("")
     return
 
 def main():
     # Check valid arguments
     if valid_arguments():
-        download_pdfs(sys.argv[1])
+        options = get_options(sys.argv[2:])
+        download_pdfs(sys.argv[1], options["workers"], options["perHost"], options["rate"], options["probe"], options["refresh"])
     else:
         print("\nInvalid arguments")
-        print("Invocation:  python3 s1_download.py <projName>\n")
+        print("Invocation:  python3 s1_download.py <projName> [--workers <n>] [--per-host <n>] [--rate <r>] [--probe] [--refresh]\n")
     return
 
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+# Name:        s1_status.py
+# Purpose:     Read and write the file download_status.txt and read the download journal of s1_download.py
+#              These functions are shared with s2_convert.py and s4_logistic.py, so they only use the standard library
+# Invocation:  Imported by s1_download.py, s2_convert.py, and s4_logistic.py
+
+import os
+import re
+import sqlite3
+
+# Pattern of the names of PDFs (also used by is_pdf in s1_download.py)
+PDF_URL = re.compile(r"^(\S+)\.([pP][dD][fF])$")
+
+# Statuses of s1_download.py written to download_status.txt
+DOWNLOAD_CHANGES = {"ok": "new", "updated": "updated", "unchanged": "unchanged"}
+
+# Name:        read_download_statuses
+# Purpose:     Read the file download_status.txt
+# Parameters:  statusFile (location of download_status.txt)
+# Returns:     List of file names, URLs, statuses, and times of change (empty if the file does not exist)
+
+def read_download_statuses(statusFile):
+    statuses = []
+    if os.path.isfile(statusFile):
+        f = open(statusFile, "r")
+        # The first line is the header, and the URL in the middle may itself contain "|"
+        for line in f.readlines()[1:]:
+            (fileName, rest) = line.strip().split("|", 1)
+            (url, status, changed) = rest.rsplit("|", 2)
+            statuses.append((fileName, url, status, float(changed)))
+        f.close()
+    return statuses
+
+# Name:        get_download_changes
+# Purpose:     Read the times at which PDFs were last downloaded new or updated (used by s2_convert.py and
+#              s4_logistic.py, which compare them with the times of their own output files)
+# Parameters:  statusFile (location of download_status.txt)
+# Returns:     Dictionary of times (seconds since the epoch, or 0 (not changed since download_status.txt was started))
+#              keyed by document name (empty if the file does not exist)
+
+def get_download_changes(statusFile):
+    changes = {}
+    for (fileName, url, status, changed) in read_download_statuses(statusFile):
+        nameMatch = PDF_URL.search(fileName)
+        if nameMatch:
+            changes[nameMatch.group(1)] = changed
+    return changes
+
+# Name:        get_download_digests
+# Purpose:     Read the SHA-256 digests of the PDFs completed in the download journal (used by s2_convert.py)
+# Parameters:  projName (project name)
+# Returns:     Dictionary of digests keyed by document name (empty if the journal does not exist)
+
+def get_download_digests(projName):
+    digests = {}
+    journalFile = "./{}/download.db".format(projName)
+    if os.path.isfile(journalFile):
+        db = sqlite3.connect(journalFile)
+        rows = db.execute("SELECT file, sha256 FROM downloads WHERE complete = 1").fetchall()
+        db.close()
+        for (fileName, sha256) in rows:
+            nameMatch = PDF_URL.search(os.path.basename(fileName))
+            if nameMatch:
+                digests[nameMatch.group(1)] = sha256
+    return digests
+
+# Name:        write_download_statuses
+# Purpose:     Write the file download_status.txt, which lists each PDF as new, updated, or unchanged in the latest run
+#              of s1_download.py, with the time at which it was last downloaded new or updated
+#              The lines of earlier runs are merged in, and a PDF found unchanged keeps its time of change, so
+#              s2_convert.py and s4_logistic.py still see a change made before their last run, however many runs of
+#              s1_download.py there have been in between
+# Parameters:  projName (project name)
+#              statuses (list of URLs, statuses of download_pdf, and details)
+#              runTime (time at which the run started, in seconds since the epoch)
+# Returns:     
+
+def write_download_statuses(projName, statuses, runTime):
+    statusFile = "./{}/download_status.txt".format(projName)
+    lines = {}
+    for (fileName, url, status, changed) in read_download_statuses(statusFile):
+        lines[url] = (fileName, status, changed)
+    for (url, status, detail) in statuses:
+        if status == "unchanged":
+            lines[url] = (os.path.basename(detail), DOWNLOAD_CHANGES[status], lines[url][2] if url in lines else 0.0)
+        elif status in DOWNLOAD_CHANGES:
+            lines[url] = (os.path.basename(detail), DOWNLOAD_CHANGES[status], runTime)
+    f = open(statusFile, "w")
+    f.write("fileName|url|status|changed\n")
+    for url in sorted(lines):
+        f.write("|".join([lines[url][0], url, lines[url][1], "{:.6f}".format(lines[url][2])]) + "\n")
+    f.close()
+    return
@@ -0,0 +1,134 @@
+# Name:        s2_check_clean.py
+# Purpose:     Check that the translation table used by s2_convert.py to clean extracted text gives the same output as
+#              the original character-by-character rules (clean_char), over every Unicode code point and over the
+#              TXT files of the example corpora
+# Invocation:  python3 s2_check_clean.py [<folder> ...]
+#              The folders pos_txt, neg_txt, and pred_txt are checked if no folder is given
+
+import codecs
+import os
+import sys
+from s2_convert import clean_chars, get_char_code
+
+# Name:        clean_char
+# Purpose:     Clean character to deal with punctuation, numbers, and foreign accent marks
+#              These are the original rules of s2_convert.py, kept here as the reference for clean_chars
+# Parameters:  old (character)
+# Returns:     Cleaned character
+
+def clean_char(old):
+    # Check the length of the argument
+    if len(old) == 0:
+        new = ""
+    elif len(old) >= 2:
+        new = " "
+    else:
+        # The function "ord" returns the integer representing the Unicode code point of a character
+        ucp = ord(old)
+        # Control codes
+        if (0 <= ucp <= 31):
+            new = " "
+        # Punctuation
+        elif (32 <= ucp <= 38) or (40 <= ucp <= 47) or (58 <= ucp <= 64) or (91 <= ucp <= 96) or (123 <= ucp <= 126) or ucp == 8221:
+            new = " "
+        # Apostrophe
+        elif ucp == 39 or ucp == 8217:
+            new = ""
+        # Numbers
+        elif (48 <= ucp <= 57):
+            new = " "
+        # Letters
+        elif (192 <= ucp <= 198) or (224 <= ucp <= 230):
+            new = "a"
+        elif ucp == 199 or ucp == 231:
+            new = "c"
+        elif (200 <= ucp <= 203) or (232 <= ucp <= 235):
+            new = "e"
+        elif (204 <= ucp <= 207) or (236 <= ucp <= 239):
+            new = "i"
+        elif ucp == 209 or ucp == 241:
+            new = "n"
+        elif (210 <= ucp <= 214) or ucp == 216 or (242 <= ucp <= 246) or ucp == 248:
+            new = "o"
+        elif ucp == 223:
+            new = "ss"
+        elif (217 <= ucp <= 220) or (249 <= ucp <= 252):
+            new = "u"
+        elif ucp == 221 or ucp == 253 or ucp == 255:
+            new = "y"
+        elif ucp >= 128:
+            new = " "
+        else:
+            new = old
+    return new
+
+# Name:        clean_char_new
+# Purpose:     Clean the text of one PDF character the way s2_convert.py does now (get_char_code, then clean_chars)
+# Parameters:  old (text of the character)
+# Returns:     Cleaned character
+
+def clean_char_new(old):
+    ucp = get_char_code(old)
+    if ucp < 0:
+        return ""
+    return clean_chars(chr(ucp))
+
+# Name:        check_code_points
+# Purpose:     Compare the original and new cleaning of every Unicode code point, one character and one string at a time
+# Parameters:  
+# Returns:     Number of differences
+
+def check_code_points():
+    nDiffs = 0
+    chars = [chr(ucp) for ucp in range(sys.maxunicode + 1)]
+    for char in chars:
+        if clean_char(char) != clean_char_new(char):
+            print("!!! DIFFERENT: U+{:04X}".format(ord(char)))
+            nDiffs += 1
+    # Empty text and text of two or more characters (ligatures, for example)
+    for old in ["", "fi", "ßß", "'’"]:
+        if clean_char(old) != clean_char_new(old):
+            print("!!! DIFFERENT: {!r}".format(old))
+            nDiffs += 1
+    if "".join(clean_char(char) for char in chars) != clean_chars("".join(chars)):
+        print("!!! DIFFERENT: string of all code points")
+        nDiffs += 1
+    return nDiffs
+
+# Name:        check_folder
+# Purpose:     Compare the original and new cleaning of each TXT file in a folder
+# Parameters:  folder (path of folder)
+# Returns:     Number of files checked and number of differences
+
+def check_folder(folder):
+    nFiles = 0
+    nDiffs = 0
+    for txt in sorted(os.listdir(folder)):
+        if txt.endswith(".txt"):
+            f = codecs.open(os.path.join(folder, txt), "r", encoding="utf8", errors="replace")
+            text = f.read()
+            f.close()
+            nFiles += 1
+            if "".join(clean_char(char) for char in text) != clean_chars(text):
+                print("!!! DIFFERENT: {}".format(os.path.join(folder, txt)))
+                nDiffs += 1
+    return nFiles, nDiffs
+
+def main():
+    folders = sys.argv[1:]
+    if len(folders) == 0:
+        folders = ["./pos_txt", "./neg_txt", "./pred_txt"]
+
+    nDiffs = check_code_points()
+    print("{:<38}{}".format("Number of code points checked:", sys.maxunicode + 1))
+    for folder in folders:
+        (nFilesFolder, nDiffsFolder) = check_folder(folder)
+        print("{:<38}{}".format("Number of TXT files in {}:".format(folder), nFilesFolder))
+        nDiffs += nDiffsFolder
+    print("{:<38}{}".format("Number of differences:", nDiffs))
+    if nDiffs > 0:
+        sys.exit(1)
+    return
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,51 @@
 # Name:        s2_convert.py
 # Purpose:     Convert PDFs to TXT format
-# Invocation:  python3 s2_convert.py <projName> <lng> <clss>
+# Invocation:  python3 s2_convert.py <projName> <lng> <clss> [--workers <n>] [--xml] [--cache <MB>]
+#              python3 s2_convert.py <projName> <lng> <clss> --benchmark
 
+from array import array
 import codecs
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import inspect
+from math import copysign
+import numpy as np
 import os
+from pdf2txt import process_pages, process_pdf
+from pdfminer.cmapdb import CMapError
+from pdfminer.converter import PDFPageAggregator, XMLConverter
+from pdfminer.layout import LAParams, LTChar, LTFigure, LTPage, LTTextBox, LTTextGroup, LTTextLine
+from pdfminer.pdfdocument import PDFTextExtractionNotAllowed
+from pdfminer.pdfinterp import PDFResourceManager
+from pdfminer.psparser import PSException
 import re
+from s1_status import get_download_changes, get_download_digests
+import shutil
 import sys
+from time import perf_counter
+
+# PDFMiner resource manager shared by every document converted in this process (see get_resource_manager)
+sharedRsrcmgr = None
+
+# Folder of the conversion cache, which is shared by all projects (see get_cache_file)
+CACHE_DIR = "./s_cache"
+
+# Minimum number of seconds for which the XML files are parsed by benchmark_get_chars
+BENCHMARK_SECONDS = 2
+
+# Line boundaries recognized when the intermediate XML file is read line by line (same as str.splitlines)
+LINE_BREAKS = re.compile(r"[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+# Compiled patterns for the XML tags read by get_chars
+# Each pattern is anchored to the start of a stripped line, and get_chars only tries the one that fits the tag name
+# Tag attributes are quoted by PDFMiner, so attribute values never contain a double quote or a closing angle bracket
+PAGE_TAG    = re.compile(r"<page id=\"(\d+)\"")
+TEXTBOX_TAG = re.compile(r"<textbox id=\"(\d+)\"")
+TEXT_TAG    = re.compile(r"<text font=\"([^\"]*)\" bbox=\"([0-9]+\.[0-9]+),([0-9]+\.[0-9]+),([0-9]+\.[0-9]+),([0-9]+\.[0-9]+)\"[^>]*size=\"([0-9]+\.[0-9]+)\">(.*)</text>")
+
+# Columns of a character buffer (see new_char_buffer) and the array type code of each column
+# Hierarchy values and code points are 64-bit integers and coordinates are 64-bit floats, so NumPy can use the arrays directly
+CHAR_COLUMNS = (("page", "q"), ("textbox", "q"), ("textline", "q"), ("x1", "d"), ("y1", "d"), ("x2", "d"), ("y2", "d"), ("size", "d"), ("font", None), ("value", "q"))
 
 # Name:        valid_arguments
 # Purpose:     Check whether the command-line arguments are valid
@@ -15,64 +55,60 @@ import sys
 def valid_arguments():
     lngsValid = set(["danish", "dutch", "english", "finnish", "french", "german", "hungarian", "italian", "norwegian", "portuguese", "spanish", "swedish", "turkish"])
     clssesValid = set(["neg", "pos", "pred"])
-    if len(sys.argv) == 4 and re.search(r"^[a-zA-Z][a-zA-Z_-]*$", sys.argv[1]) and sys.argv[2] in lngsValid and sys.argv[3] in clssesValid:
+    if len(sys.argv) >= 4 and re.search(r"^[a-zA-Z][a-zA-Z_-]*$", sys.argv[1]) and sys.argv[2] in lngsValid and sys.argv[3] in clssesValid and get_options(sys.argv[4:]) is not None:
         return True
     return False
 
-# Name:        match_page
-# Purpose:     Match line to an XML page tag
-# Parameters:  line (line of text from XML file)
-# Returns:     Regular expression match object
-
-def match_page(line):
-    return re.search(r"<page id=\"(\d+)\"", line)
-
-# Name:        match_textbox
-# Purpose:     Match line to an XML textbox tag
-# Parameters:  line (line of text from XML file)
-# Returns:     Regular expression match object
+# Name:        get_options
+# Purpose:     Parse the optional command-line arguments that follow <projName> <lng> <clss>
+# Parameters:  args (list of optional command-line arguments)
+# Returns:     Dictionary of option values or None (at least one option is invalid)
 
-def match_textbox(line):
-    return re.search(r"<textbox id=\"(\d+)\"", line)
-
-# Name:        match_textline
-# Purpose:     Match line to an XML textline tag
-# Parameters:  line (line of text from XML file)
-# Returns:     Regular expression match object
-
-def match_textline(line):
-    return re.search(r"<textline", line)
+def get_options(args):
+    options = {"workers": 1, "xml": False, "cache": 0, "benchmark": False}
+    i = 0
+    while i < len(args):
+        if args[i] == "--workers" and i + 1 < len(args) and re.search(r"^[1-9][0-9]*$", args[i + 1]):
+            options["workers"] = int(args[i + 1])
+            i += 2
+        elif args[i] == "--xml":
+            options["xml"] = True
+            i += 1
+        elif args[i] == "--cache" and i + 1 < len(args) and re.search(r"^[1-9][0-9]*$", args[i + 1]):
+            options["cache"] = int(args[i + 1])
+            i += 2
+        elif args[i] == "--benchmark":
+            options["benchmark"] = True
+            i += 1
+        else:
+            return None
+    if options["benchmark"] and len(args) > 1:
+        return None
+    return options
 
-# Name:        match_text
-# Purpose:     Match line to an XML text tag
-# Parameters:  line (line of text from XML file)
-# Returns:     Regular expression match object
+# Name:        CleanTable
+# Purpose:     Translation table whose missing code points (all above 255) are replaced by a space
 
-def match_text(line):
-    return re.search(r"<text.*font=\"(.*)\".*bbox=\"([0-9]+\.[0-9]+),([0-9]+\.[0-9]+),([0-9]+\.[0-9]+),([0-9]+\.[0-9]+)\".*size=\"([0-9]+\.[0-9]+)\">(.*)</text>", line)
+class CleanTable(dict):
+    def __missing__(self, ucp):
+        return " "
 
-# Name:        clean_char
-# Purpose:     Clean character to deal with punctuation, numbers, and foreign accent marks
-# Parameters:  old (character)
-# Returns:     Cleaned character
+# Name:        create_clean_table
+# Purpose:     Create the translation table that deals with punctuation, numbers, and foreign accent marks
+# Parameters:  
+# Returns:     Translation table for str.translate (CleanTable of Unicode code points to replacement strings)
 
-def clean_char(old):
-    # Check the length of the argument
-    if len(old) == 0:
-        new = ""
-    elif len(old) >= 2:
-        new = " "
-    else:
-        # The function "ord" returns the integer representing the Unicode code point of a character
-        ucp = ord(old)
+def create_clean_table():
+    table = CleanTable()
+    for ucp in range(256):
         # Control codes
         if (0 <= ucp <= 31):
             new = " "
         # Punctuation
-        elif (32 <= ucp <= 38) or (40 <= ucp <= 47) or (58 <= ucp <= 64) or (91 <= ucp <= 96) or (123 <= ucp <= 126) or ucp == 8221:
+        elif (32 <= ucp <= 38) or (40 <= ucp <= 47) or (58 <= ucp <= 64) or (91 <= ucp <= 96) or (123 <= ucp <= 126):
             new = " "
         # Apostrophe
-        elif ucp == 39 or ucp == 8217:
+        elif ucp == 39:
             new = ""
         # Numbers
         elif (48 <= ucp <= 57):
@@ -99,104 +135,420 @@ def clean_char(old):
         elif ucp >= 128:
             new = " "
         else:
-            new = old
-    return new
+            new = chr(ucp)
+        table[ucp] = new
+    # Right double quotation mark (punctuation) and right single quotation mark (apostrophe)
+    table[8221] = " "
+    table[8217] = ""
+    return table
+
+# Translation table used by clean_chars, built once when the module is loaded
+CLEAN_TABLE = create_clean_table()
+
+# Name:        get_char_code
+# Purpose:     Reduce the text of one PDF character to a single Unicode code point (text of two or more characters
+#              becomes a space, and empty text becomes -1 so that it can be dropped after the characters are sorted)
+# Parameters:  old (text of the character)
+# Returns:     Code point of the character to be cleaned later by clean_chars
+
+def get_char_code(old):
+    if len(old) == 0:
+        return -1
+    elif len(old) >= 2:
+        return 32
+    return ord(old)
+
+# Name:        clean_chars
+# Purpose:     Clean a whole string of characters in one call to deal with punctuation, numbers, and foreign accent marks
+# Parameters:  text (string of characters built from the codes returned by get_char_code)
+# Returns:     Cleaned string
+
+def clean_chars(text):
+    return text.translate(CLEAN_TABLE)
+
+# Name:        new_char_buffer
+# Purpose:     Create a columnar buffer for the character data of one page
+#              Each column is a compact array (or a list for font names) with one entry per character, which uses far
+#              less memory than one tuple per character and can be sorted without a Python-level key function
+# Parameters:  rows (list of tuples in the order of CHAR_COLUMNS)
+# Returns:     Dictionary of columns (see CHAR_COLUMNS)
+
+def new_char_buffer(rows):
+    chars = {}
+    for (name, typecode) in CHAR_COLUMNS:
+        if typecode is None:
+            chars[name] = []
+        else:
+            chars[name] = array(typecode)
+    # The tuples are transposed into columns in bulk
+    if len(rows) > 0:
+        for ((name, typecode), column) in zip(CHAR_COLUMNS, zip(*rows)):
+            chars[name].extend(column)
+    return chars
 
 # Name:        get_chars
 # Purpose:     Extract the character values, coordinates, hierarchy, and font information from XML file
 # Parameters:  xmlFile (location of XML file)
-# Returns:     List of tuples (one for each character) containing character data
+# Returns:     Generator of character buffers (see new_char_buffer), one for each page
 
 def get_chars(xmlFile):
-    chars = []
+    rows = []
     page = 0
     textbox = 0
     textline = 0
     
     # Open XML file and use regular expressions to parse contents
-    f = codecs.open(xmlFile, "r", encoding="utf8")
+    # Lines are split at the same boundaries as str.splitlines, which is how the file was originally read
+    f = open(xmlFile, "r", encoding="utf8")
     for l in f:
-        line = l.strip()
-        pageMatch = match_page(line)
-        textboxMatch = match_textbox(line)
-        textlineMatch = match_textline(line)
-        textMatch = match_text(line)
-        if pageMatch:
-            page = int(pageMatch.group(1))
-        elif textboxMatch:
-            textline = 0
-            textbox = int(textboxMatch.group(1))
-        elif textlineMatch:
-            textline += 1
-        elif textMatch:
-            font = textMatch.group(1)
-            x1 = float(textMatch.group(2))
-            y1 = float(textMatch.group(3))
-            x2 = float(textMatch.group(4))
-            y2 = float(textMatch.group(5))
-            size = float(textMatch.group(6))
-            value = clean_char(textMatch.group(7))
-            chars.append((page, textbox, textline, x1, y1, x2, y2, size, font, value))
+        for part in l.splitlines():
+            line = part.strip()
+            # Dispatch on the tag name so that at most one regular expression is applied to each line
+            if line.startswith("<text"):
+                if line.startswith("<textline"):
+                    textline += 1
+                elif line.startswith("<textbox"):
+                    textboxMatch = TEXTBOX_TAG.match(line)
+                    if textboxMatch:
+                        textline = 0
+                        textbox = int(textboxMatch.group(1))
+                else:
+                    textMatch = TEXT_TAG.match(line)
+                    if textMatch:
+                        # Font names repeat for almost every character, so one copy of each name is kept
+                        font = sys.intern(textMatch.group(1))
+                        x1 = float(textMatch.group(2))
+                        y1 = float(textMatch.group(3))
+                        x2 = float(textMatch.group(4))
+                        y2 = float(textMatch.group(5))
+                        size = float(textMatch.group(6))
+                        value = get_char_code(textMatch.group(7))
+                        rows.append((page, textbox, textline, x1, y1, x2, y2, size, font, value))
+            elif line.startswith("<page"):
+                pageMatch = PAGE_TAG.match(line)
+                if pageMatch:
+                    page = int(pageMatch.group(1))
+                    # The characters of the previous page are complete
+                    yield new_char_buffer(rows)
+                    rows = []
     f.close()
-    return chars
+    yield new_char_buffer(rows)
+    return
+
+# Name:        get_layout_chars
+# Purpose:     Extract the character data from one page of PDFMiner layout objects
+#              The objects are visited in the same order as the tags of the XML file, so the page, textbox, and textline
+#              values are identical to those found by get_chars
+# Parameters:  item (PDFMiner layout object)
+#              state (dictionary of current page, textbox, and textline values)
+#              chars (list of tuples to append to)
+# Returns:     
+
+def get_layout_chars(item, state, chars):
+    if isinstance(item, LTPage):
+        state["page"] = item.pageid
+        for child in item:
+            get_layout_chars(child, state, chars)
+        # The layout section at the end of each page lists the textboxes again
+        if item.groups is not None:
+            for group in item.groups:
+                get_layout_chars(group, state, chars)
+    elif isinstance(item, LTTextGroup):
+        for child in item:
+            if isinstance(child, LTTextBox):
+                state["textline"] = 0
+                state["textbox"] = child.index
+            else:
+                get_layout_chars(child, state, chars)
+    elif isinstance(item, LTFigure):
+        for child in item:
+            get_layout_chars(child, state, chars)
+    elif isinstance(item, LTTextLine):
+        state["textline"] += 1
+        for child in item:
+            get_layout_chars(child, state, chars)
+    elif isinstance(item, LTTextBox):
+        state["textline"] = 0
+        state["textbox"] = item.index
+        for child in item:
+            get_layout_chars(child, state, chars)
+    elif isinstance(item, LTChar):
+        (x1, y1, x2, y2) = item.bbox
+        value = item.get_text()
+        # Skip the characters that the regular expressions in get_chars cannot match:
+        # negative numbers and text that is split across lines of the XML file
+        if copysign(1.0, x1) > 0 and copysign(1.0, y1) > 0 and copysign(1.0, x2) > 0 and copysign(1.0, y2) > 0 and copysign(1.0, item.size) > 0 and not LINE_BREAKS.search(value):
+            # Coordinates and size are rounded to three decimal places, as they are in the XML file
+            chars.append((state["page"], state["textbox"], state["textline"], round(x1, 3), round(y1, 3), round(x2, 3), round(y2, 3), round(item.size, 3), item.fontname, get_char_code(value)))
+    return
+
+# Name:        get_chars_stream
+# Purpose:     Extract the character values, coordinates, hierarchy, and font information directly from the PDF
+#              without writing an intermediate XML file
+# Parameters:  pdfFile (location of PDF)
+# Returns:     Generator of character buffers (see new_char_buffer), one for each page
+
+def get_chars_stream(pdfFile):
+    rsrcmgr = get_resource_manager()
+    device = PDFPageAggregator(rsrcmgr, laparams=LAParams())
+    state = {"page": 0, "textbox": 0, "textline": 0}
+    try:
+        for pdfPage in process_pages(rsrcmgr, device, pdfFile):
+            rows = []
+            get_layout_chars(device.get_result(), state, rows)
+            yield new_char_buffer(rows)
+    finally:
+        device.close()
+    return
 
 # Name:        clean_text
-# Purpose:     Clean string of text and check each word against a list of stop words
+# Purpose:     Clean string of text before it is split into words
 # Parameters:  text (string of text)
 # Returns:     Cleaned text
 
 def clean_text(text):
     text = text.lower()
     text = re.sub("\s+", " ", text)
-    
-    # Remove stop words
-    textClean = []
-    text = text.split(" ")
+    return text
+
+# Name:        open_text
+# Purpose:     Open a TXT file that receives the text of a document one page at a time
+# Parameters:  txtFile (location of TXT file)
+# Returns:     Dictionary of the open file and the state needed to split words across calls to append_text
+
+def open_text(txtFile):
+    txtOut = {"file": codecs.open(txtFile, "w"), "started": False, "endSpace": False, "wordCount": 0}
+    return txtOut
+
+# Name:        write_words
+# Purpose:     Check each word against a list of stop words and write the remaining words to a TXT file
+# Parameters:  txtOut (dictionary returned by open_text)
+#              words (list of words)
+# Returns:     
+
+def write_words(txtOut, words):
     global stopWords
-    for word in text:
-        word = word.strip()
+    textClean = []
+    for word in words:
         if word not in stopWords:
             textClean.append(word)
-    textClean = " ".join(textClean)
-    return textClean
+    if len(textClean) > 0:
+        # Words are separated by single spaces across calls, as if all words were joined at once
+        if txtOut["wordCount"] > 0:
+            txtOut["file"].write(" ")
+        txtOut["file"].write(" ".join(textClean))
+        txtOut["wordCount"] += len(textClean)
+    return
+
+# Name:        append_text
+# Purpose:     Clean the next part of the text of a document and write its words to a TXT file
+#              Splitting the whole text at single spaces produces an empty first word when the text starts with
+#              whitespace and an empty last word when it ends with whitespace, and these are kept as well
+# Parameters:  txtOut (dictionary returned by open_text)
+#              text (string of text)
+# Returns:     
+
+def append_text(txtOut, text):
+    text = clean_text(text)
+    if len(text) > 0:
+        words = []
+        if not txtOut["started"] and text.startswith(" "):
+            words.append("")
+        txtOut["started"] = True
+        txtOut["endSpace"] = text.endswith(" ")
+        for word in text.split(" "):
+            if word != "":
+                words.append(word)
+        write_words(txtOut, words)
+    return
+
+# Name:        close_text
+# Purpose:     Write the empty last word (if any) and close a TXT file opened by open_text
+# Parameters:  txtOut (dictionary returned by open_text)
+# Returns:     
+
+def close_text(txtOut):
+    if not txtOut["started"] or txtOut["endSpace"]:
+        write_words(txtOut, [""])
+    txtOut["file"].close()
+    return
+
+# Name:        get_page_text
+# Purpose:     Construct the text of a page from the characters in a character buffer
+# Parameters:  chars (character buffer)
+# Returns:     Text of the page (characters cleaned, but not yet split into words)
+
+def get_page_text(chars):
+    # The columns share memory with the arrays in the buffer
+    page = np.frombuffer(chars["page"], dtype=np.int64)
+    textbox = np.frombuffer(chars["textbox"], dtype=np.int64)
+    textline = np.frombuffer(chars["textline"], dtype=np.int64)
+    x1 = np.frombuffer(chars["x1"], dtype=np.float64)
+    y1 = np.frombuffer(chars["y1"], dtype=np.float64)
+    value = np.frombuffer(chars["value"], dtype=np.int64)
+
+    # Sort characters according to page, textbox, textline, y1 (descending), and x1
+    # The last key passed to lexsort is the primary key, and lexsort is stable like the built-in sort
+    order = np.lexsort((x1, -y1, textline, textbox, page))
+    page = page[order]
+    textbox = textbox[order]
+    textline = textline[order]
+    value = value[order]
+
+    # Insert a space before each character whose page, textbox, or textline differs from the previous character
+    spaces = np.flatnonzero((page[1:] != page[:-1]) | (textbox[1:] != textbox[:-1]) | (textline[1:] != textline[:-1])) + 1
+    value = np.insert(value, spaces, 32)
+
+    # Characters with empty text are dropped, and the code points are decoded into a single string
+    value = value[value >= 0].astype("<u4")
+    text = clean_chars(value.tobytes().decode("utf-32-le", "surrogatepass"))
+    return text
 
 # Name:        write_text
-# Purpose:     Construct words character by character
-# Parameters:  chars (list of tuples)
+# Purpose:     Construct words page by page and write them to a TXT file
+#              Sorting characters by page first keeps the pages in order, so only one page is held in memory at a time
+# Parameters:  pages (iterable of character buffers, one for each page in page order)
 #              txtFile (location of TXT file)
+# Returns:     Number of characters written
+
+def write_text(pages, txtFile):
+    charCount = 0
+    txtOut = open_text(txtFile)
+    try:
+        for chars in pages:
+            if len(chars["value"]) > 0:
+                text = get_page_text(chars)
+                # The first character of each page after the first is preceded by a space
+                if charCount > 0:
+                    text = " " + text
+                append_text(txtOut, text)
+                charCount += len(chars["value"])
+    finally:
+        close_text(txtOut)
+    return charCount
+
+# Name:        get_resource_manager
+# Purpose:     Get the PDFMiner resource manager shared by the documents converted in this process
+# Parameters:  
+# Returns:     PDFResourceManager object
+
+def get_resource_manager():
+    global sharedRsrcmgr
+    if sharedRsrcmgr is None:
+        # PDFMiner caches parsed CMaps at the class level, so they are also reused across documents
+        sharedRsrcmgr = PDFResourceManager(caching=True)
+    else:
+        # Cached fonts are keyed by PDF object ID, which is only unique within a single document
+        sharedRsrcmgr._cached_fonts.clear()
+    return sharedRsrcmgr
+
+# Name:        extract_xml
+# Purpose:     Extract text from a PDF in-process and write it to an XML file (same output as pdf2txt.py -t xml)
+#              PDFMiner exceptions such as PDFTextExtractionNotAllowed are passed on to the caller
+# Parameters:  pdfFile (location of PDF)
+#              xmlFile (location of XML file)
 # Returns:     
 
-def write_text(chars, txtFile):
-    text = []
-    
-    # Sort characters according to page, textbox, textline, y1, and x1
-    chars = sorted(chars, key = lambda z: (z[0], z[1], z[2], -z[4], z[3]))
-    pageCur = chars[0][0]
-    textboxCur = chars[0][1]
-    textlineCur = chars[0][2]
-
-    for char in chars:
-        spaceFlag = 0
-        pageNew = char[0]
-        textboxNew = char[1]
-        textlineNew = char[2]
-        if pageNew != pageCur:
-            pageCur = pageNew
-            spaceFlag = 1
-        if textboxNew != textboxCur:
-            textboxCur = textboxNew
-            spaceFlag = 1
-        if textlineNew != textlineCur:
-            textlineCur = textlineNew
-            spaceFlag = 1
-        if spaceFlag == 1:
-            text.append(" ")
-        text.append(char[9])
-    text = "".join(text)
-    
-    f = codecs.open(txtFile, "w")
-    f.write(clean_text(text))
+def extract_xml(pdfFile, xmlFile):
+    rsrcmgr = get_resource_manager()
+    # Newer releases of pdfminer.six encode the XML with a codec and write it to a binary file
+    # Older releases have no codec argument and write text
+    if "codec" in inspect.signature(XMLConverter.__init__).parameters:
+        outfp = open(xmlFile, "wb")
+        device = XMLConverter(rsrcmgr, outfp, codec="utf-8", laparams=LAParams())
+    else:
+        outfp = open(xmlFile, "w", encoding="utf-8")
+        device = XMLConverter(rsrcmgr, outfp, laparams=LAParams())
+    try:
+        process_pdf(rsrcmgr, device, pdfFile)
+    finally:
+        device.close()
+        outfp.close()
+    return
+
+# Name:        get_file_digest
+# Purpose:     Compute the SHA-256 digest of the contents of a file
+# Parameters:  fileName (location of file)
+# Returns:     Hexadecimal digest
+
+def get_file_digest(fileName):
+    digest = hashlib.sha256()
+    f = open(fileName, "rb")
+    for block in iter(lambda: f.read(1048576), b""):
+        digest.update(block)
     f.close()
+    return digest.hexdigest()
+
+# Name:        get_cache_file
+# Purpose:     Get the location of the cached TXT file for a PDF
+#              The cache is keyed on the contents of the PDF and the set of stop words, so the same PDF saved under
+#              a different name (or in a different project) is only converted once for each language
+# Parameters:  pdfFile (location of PDF)
+# Returns:     Location of cached TXT file
+
+def get_cache_file(pdfFile):
+    global stopWordsDigest
+    return "{}/{}_{}.txt".format(CACHE_DIR, get_file_digest(pdfFile), stopWordsDigest)
+
+# Name:        read_cache
+# Purpose:     Copy a cached TXT file to its destination and mark it as recently used
+# Parameters:  cacheFile (location of cached TXT file)
+#              txtFile (location of TXT file)
+# Returns:     True (TXT file copied from cache) or False (no cached TXT file)
+
+def read_cache(cacheFile, txtFile):
+    try:
+        shutil.copyfile(cacheFile, txtFile)
+        # The modification time of a cached TXT file is the time it was last used
+        os.utime(cacheFile)
+    except OSError:
+        # The cached TXT file does not exist or was evicted by another process in the meantime
+        if os.path.isfile(txtFile):
+            os.remove(txtFile)
+        return False
+    return True
+
+# Name:        write_cache
+# Purpose:     Add a TXT file to the cache and evict the least recently used TXT files above the size limit
+# Parameters:  txtFile (location of TXT file)
+#              cacheFile (location of cached TXT file)
+#              cacheSize (size limit of the cache in megabytes)
+# Returns:     
+
+def write_cache(txtFile, cacheFile, cacheSize):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # The TXT file is copied under a temporary name first, so other processes never see a partial cached file
+    tmpFile = "{}.{}.tmp".format(cacheFile, os.getpid())
+    shutil.copyfile(txtFile, tmpFile)
+    os.replace(tmpFile, cacheFile)
+    evict_cache(cacheSize)
+    return
+
+# Name:        evict_cache
+# Purpose:     Delete the least recently used TXT files until the cache is within its size limit
+# Parameters:  cacheSize (size limit of the cache in megabytes)
+# Returns:     
+
+def evict_cache(cacheSize):
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith(".txt"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort()
+    totalSize = sum([entry[1] for entry in entries])
+    for (mtime, size, path) in entries:
+        if totalSize <= cacheSize * 1048576:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # Another process has already evicted the TXT file
+            pass
+        totalSize -= size
     return
 
 # Name:        create_output
@@ -204,9 +556,12 @@ def write_text(chars, txtFile):
 # Parameters:  projName (project name)
 #              clss ("pos" or "neg")
 #              docName (document name)
-# Returns:     
+#              useXML (True (extract text through an intermediate XML file) or False)
+#              cacheSize (size limit of the conversion cache in megabytes, or 0 (cache not used))
+# Returns:     status ("ok" (TXT file created), "cache" (TXT file copied from cache), "prob" (problem PDF),
+#              or "skip" (TXT file already exists))
 
-def create_output(projName, clss, docName):
+def create_output(projName, clss, docName, useXML=False, cacheSize=0):
     # Create file locations
     pdfFile  = "./{}/{}_pdf/{}.pdf".format(projName, clss, docName)
     xmlFile  = "./{}/{}_xml/{}.xml".format(projName, clss, docName)
@@ -216,31 +571,49 @@ def create_output(projName, clss, docName):
     # probFlag indicates whether there is a problem extracting text from the PDF
     # The problem PDFs are moved to separate folders where they can be inspected
     probFlag = 0
-    chars = []
+    charCount = 0
+    cacheFile = None
+    status = "skip"
 
     # If the TXT file does not already exist, then try creating it
     if not os.path.isfile(txtFile):
+        # A PDF with the same contents may already have been converted under another name
+        if cacheSize > 0:
+            cacheFile = get_cache_file(pdfFile)
+            if read_cache(cacheFile, txtFile):
+                return "cache"
         try:
-            # The pdf2txt.py program comes with the PDFMiner module
-            os.system("pdf2txt.py -o {} -t xml {}".format(xmlFile, pdfFile))
+            if useXML:
+                # The extraction logic comes from the pdf2txt.py program, which comes with the PDFMiner module
+                extract_xml(pdfFile, xmlFile)
+            else:
+                # Characters are taken directly from the PDFMiner layout objects without an intermediate XML file
+                # Each page is written to the TXT file as soon as it has been extracted
+                charCount = write_text(get_chars_stream(pdfFile), txtFile)
         except PDFTextExtractionNotAllowed:
             # Exception indicates that text cannot be extracted from the PDF
             probFlag = 1
-        if not os.path.isfile(xmlFile):
+        except (PSException, CMapError):
+            # Any other PDFMiner exception indicates that PDFMiner could not parse the PDF
+            # Other exceptions are programming or configuration errors and are passed on
             probFlag = 1
-        elif os.stat(xmlFile).st_size == 0:
-            probFlag = 1
-        if probFlag == 0:
-            chars = get_chars(xmlFile)
-            if len(chars) == 0:
+        if useXML:
+            if not os.path.isfile(xmlFile):
                 probFlag = 1
+            elif os.stat(xmlFile).st_size == 0:
+                probFlag = 1
+            if probFlag == 0:
+                charCount = write_text(get_chars(xmlFile), txtFile)
+        if charCount == 0:
+            probFlag = 1
         # Check probFlag value and act accordingly
         if probFlag == 0:
-            write_text(chars, txtFile)
             if os.path.isfile(xmlFile):
                 # The intermediate XML file is deleted because it tends to be large
                 os.remove(xmlFile)
-            print(docName)
+            if cacheFile is not None:
+                write_cache(txtFile, cacheFile, cacheSize)
+            status = "ok"
         elif probFlag == 1:
             if os.path.isfile(xmlFile):
                 # The intermediate XML file is deleted because it tends to be large
@@ -249,7 +622,34 @@ def create_output(projName, clss, docName):
                 # Any text that has been extracted from the problem PDF is deleted
                 os.remove(txtFile)
             os.system("mv {} {}".format(pdfFile, probFile))
-            print("!!! PROBLEM: {}".format(docName))
+            status = "prob"
+    return status
+
+# Name:        print_status
+# Purpose:     Print the conversion status of a document
+# Parameters:  docName (document name)
+#              status ("ok", "prob", or "skip")
+# Returns:     
+
+def print_status(docName, status):
+    if status == "ok":
+        print(docName)
+    elif status == "cache":
+        print("{} (cache)".format(docName))
+    elif status == "prob":
+        print("!!! PROBLEM: {}".format(docName))
+    return
+
+# Name:        set_stop_words
+# Purpose:     Set the global set of stop words and its digest (also used to initialize worker processes)
+# Parameters:  stopWordsList (list of stop words)
+# Returns:     
+
+def set_stop_words(stopWordsList):
+    global stopWords
+    global stopWordsDigest
+    stopWords = set(stopWordsList)
+    stopWordsDigest = hashlib.sha256("\n".join(sorted(stopWords)).encode("utf-8")).hexdigest()
     return
 
 # Name:        convert_files
@@ -257,9 +657,12 @@ def create_output(projName, clss, docName):
 # Parameters:  projName (project name)
 #              lng (language)
 #              clss ("neg", "pos", or "pred")
+#              workers (number of worker processes)
+#              useXML (True (extract text through an intermediate XML file) or False)
+#              cacheSize (size limit of the conversion cache in megabytes, or 0 (cache not used))
 # Returns:     
 
-def convert_files(projName, lng, clss):
+def convert_files(projName, lng, clss, workers=1, useXML=False, cacheSize=0):
     # Read in stop words
     stopWordsList = []
     f = codecs.open("./stop_{}.txt".format(lng), "r")
@@ -267,11 +670,11 @@ def convert_files(projName, lng, clss):
         if word.strip() != "":
             stopWordsList.append(word.strip())
     f.close()
-    global stopWords
-    stopWords = set(stopWordsList)
+    set_stop_words(stopWordsList)
 
-    # Iterate through PDFs of a given class, extract text, and create output files
+    # Iterate through PDFs of a given class and standardize the file extension
     print("\n*****  {}  *****\n".format(clss))
+    docNames = []
     pdfs = sorted(os.listdir("./{}/{}_pdf".format(projName, clss)))
     for pdf in pdfs:
         pdfMatch = re.search(r"^(\S+)\.([pP][dD][fF])$", pdf)
@@ -281,17 +684,107 @@ def convert_files(projName, lng, clss):
                 oldFile = "./{}/{}_pdf/{}.{}".format(projName, clss, docName, pdfMatch.group(2))
                 newFile = "./{}/{}_pdf/{}.pdf".format(projName, clss, docName)
                 os.system("mv {} {}".format(oldFile, newFile))
-            create_output(projName, clss, docName)
+            docNames.append(docName)
+
+    # A PDF that s1_download.py has downloaded again after its TXT file was created is converted again once the new
+    # PDF has been copied from the download folder (its digest is the one in the download journal)
+    downloadChanges = get_download_changes("./{}/download_status.txt".format(projName))
+    downloadDigests = get_download_digests(projName)
+    for docName in docNames:
+        txtFile = "./{}/{}_txt/{}.txt".format(projName, clss, docName)
+        if os.path.isfile(txtFile) and downloadChanges.get(docName, 0.0) > os.path.getmtime(txtFile):
+            pdfFile = "./{}/{}_pdf/{}.pdf".format(projName, clss, docName)
+            if get_file_digest(pdfFile) != downloadDigests.get(docName):
+                print("!!! NOT COPIED: {} (updated PDF still in download folder)".format(docName))
+            else:
+                os.remove(txtFile)
+
+    # Extract text and create output files
+    statuses = []
+    if workers == 1:
+        for docName in docNames:
+            status = create_output(projName, clss, docName, useXML, cacheSize)
+            print_status(docName, status)
+            statuses.append(status)
+    else:
+        # Documents are converted in a pool of worker processes
+        # Statuses are printed after all documents are finished so the output order does not depend on scheduling
+        with ProcessPoolExecutor(max_workers=workers, initializer=set_stop_words, initargs=(stopWordsList,)) as executor:
+            statuses = list(executor.map(create_output, [projName]*len(docNames), [clss]*len(docNames), docNames, [useXML]*len(docNames), [cacheSize]*len(docNames)))
+        for i in range(len(docNames)):
+            print_status(docNames[i], statuses[i])
+
+    print("")
+    print("Number of PDFs converted:             {}".format(len([status for status in statuses if status == "ok"])))
+    if cacheSize > 0:
+        print("Number of PDFs copied from cache:     {}".format(len([status for status in statuses if status == "cache"])))
+    print("Number of problem PDFs:               {}".format(len([status for status in statuses if status == "prob"])))
+    print("Number of PDFs skipped (TXT exists):  {}".format(len([status for status in statuses if status == "skip"])))
+    print("")
+    return
+
+# Name:        benchmark_get_chars
+# Purpose:     Measure how many lines per second of the intermediate XML files get_chars parses
+#              The XML files of the PDFs of a class are written to the <clss>_xml folder, parsed repeatedly for at least
+#              BENCHMARK_SECONDS seconds, and deleted; no TXT files are created
+# Parameters:  projName (project name)
+#              clss (class of PDFs)
+# Returns:     
+
+def benchmark_get_chars(projName, clss):
+    print("\n*****  {}  *****\n".format(clss))
+    xmlFiles = []
+    nLinesFiles = 0
+    for pdf in sorted(os.listdir("./{}/{}_pdf".format(projName, clss))):
+        pdfMatch = re.search(r"^(\S+)\.[pP][dD][fF]$", pdf)
+        if pdfMatch:
+            xmlFile = "./{}/{}_xml/{}.xml".format(projName, clss, pdfMatch.group(1))
+            try:
+                extract_xml("./{}/{}_pdf/{}".format(projName, clss, pdf), xmlFile)
+            except (PSException, CMapError):
+                print("!!! PROBLEM: {}".format(pdfMatch.group(1)))
+                if os.path.isfile(xmlFile):
+                    os.remove(xmlFile)
+                continue
+            xmlFiles.append(xmlFile)
+            f = open(xmlFile, "r", encoding="utf8")
+            nLinesFiles += len(f.read().splitlines())
+            f.close()
+
+    nLines = 0
+    nChars = 0
+    start = perf_counter()
+    while len(xmlFiles) > 0 and perf_counter() - start < BENCHMARK_SECONDS:
+        for xmlFile in xmlFiles:
+            for chars in get_chars(xmlFile):
+                nChars += len(chars["value"])
+        nLines += nLinesFiles
+    seconds = perf_counter() - start
+
+    for xmlFile in xmlFiles:
+        os.remove(xmlFile)
+
+    print("Number of XML files:                  {}".format(len(xmlFiles)))
+    print("Number of XML lines parsed:           {}".format(nLines))
+    print("Number of characters parsed:          {}".format(nChars))
+    print("Seconds:                              {:.2f}".format(seconds))
+    if nLines > 0:
+        print("Lines per second:                     {:,.0f}".format(nLines / seconds))
     print("")
     return
 
 def main():
     # Check valid arguments
     if valid_arguments():
-        convert_files(sys.argv[1], sys.argv[2], sys.argv[3])
+        options = get_options(sys.argv[4:])
+        if options["benchmark"]:
+            benchmark_get_chars(sys.argv[1], sys.argv[3])
+        else:
+            convert_files(sys.argv[1], sys.argv[2], sys.argv[3], options["workers"], options["xml"], options["cache"])
     else:
         print("\nInvalid arguments")
-        print("Invocation:  python3 s2_convert.py <projName> <lng> <clss>\n")
+        print("Invocation:  python3 s2_convert.py <projName> <lng> <clss> [--workers <n>] [--xml] [--cache <MB>]")
+        print("             python3 s2_convert.py <projName> <lng> <clss> --benchmark\n")
     return
 
 if __name__ == "__main__":
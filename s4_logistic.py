@@ -1,6 +1,6 @@
 # Name:        s4_logistic.py
 # Purpose:     Classify new PDFs as positive or negative using a logistic regression model and output predicted classes and probabilities
-# Invocation:  python3 s4_logistic.py <projName>
+# Invocation:  python3 s4_logistic.py <projName> [--skip-unchanged]
 
 import codecs
 from nltk.classify import *
@@ -13,6 +13,7 @@ from nltk import word_tokenize
 import os
 import random
 import re
+from s1_status import get_download_changes
 from sklearn.linear_model import *
 from sklearn.metrics import *
 from sklearn.model_selection import *
@@ -24,7 +25,7 @@ import sys
 # Returns:     True (all arguments are valid) or False (at least one argument is invalid)
 
 def valid_arguments():
-    if len(sys.argv) == 2 and re.search(r"^[a-zA-Z][a-zA-Z_-]*$", sys.argv[1]):
+    if (len(sys.argv) == 2 or (len(sys.argv) == 3 and sys.argv[2] == "--skip-unchanged")) and re.search(r"^[a-zA-Z][a-zA-Z_-]*$", sys.argv[1]):
         return True
     return False
 
@@ -65,9 +66,10 @@ def format_prob(prob):
 # Name:        fit_and_predict
 # Purpose:     Fit a logistic regression model and output predicted classes and probabilities
 # Parameters:  projName (project name)
+#              skipUnchanged (True (leave out documents whose PDFs have not changed since the last download) or False)
 # Returns:     
 
-def fit_and_predict(projName):
+def fit_and_predict(projName, skipUnchanged=False):
     posTexts  = []
     posDocs   = []
     negTexts  = []
@@ -103,10 +105,28 @@ def fit_and_predict(projName):
     featsTrain = posFeatsTrain + negFeatsTrain
     
     # Read in text from documents for prediction
+    # Documents whose PDFs s1_download.py has not downloaded new or updated since the output of the earlier run was
+    # written have already been classified and can be left out
+    # Their lines in that output are kept, and a document without such a line is classified again
+    outputFile = "./{}/pred_output.txt".format(projName)
+    downloadChanges = {}
+    oldLines = {}
+    outputTime = 0.0
+    if skipUnchanged:
+        downloadChanges = get_download_changes("./{}/download_status.txt".format(projName))
+        if os.path.isfile(outputFile):
+            outputTime = os.path.getmtime(outputFile)
+            tmpFile = codecs.open(outputFile, "r")
+            for line in tmpFile.readlines()[1:]:
+                oldLines[line.split("|")[0]] = line.strip().split("|")
+            tmpFile.close()
+    lines = {}
     predDir = sorted(os.listdir("./{}/pred_txt".format(projName)))
     for f in predDir:
         nameMatch = re.search(r"^(\S+)\.txt$", f)
-        if nameMatch:
+        if nameMatch and nameMatch.group(1) in oldLines and downloadChanges.get(nameMatch.group(1), outputTime) < outputTime:
+            lines[nameMatch.group(1)] = oldLines[nameMatch.group(1)]
+        elif nameMatch:
             predDocs.append(nameMatch.group(1))
             txtFile = "./{}/pred_txt/{}.txt".format(projName, nameMatch.group(1))
             tmpFile = codecs.open(txtFile, "r")
@@ -139,13 +159,13 @@ def fit_and_predict(projName):
         print("")
         
         # Create output
-        outputFile = {}/pred_output.txt".format(projName)
         varNames = ["docName", "predClass", "probPos", "probNeg"]
+        for i in range(len(predTexts)):
+            lines[predDocs[i]] = [predDocs[i], predClasses[i], format_prob(predProbs[i].prob("pos")), format_prob(predProbs[i].prob("neg"))]
         f = open(outputFile, "w")
         f.write("|".join(varNames) + "\n")
-        for i in range(len(predTexts)):
-            line = [predDocs[i], predClasses[i], format_prob(predProbs[i].prob("pos")), format_prob(predProbs[i].prob("neg"))]
-            f.write("|".join(line) + "\n")
+        for docName in sorted(lines):
+            f.write("|".join(lines[docName]) + "\n")
         f.close()
     
     return
@@ -153,10 +173,10 @@ def fit_and_predict(projName):
 def main():
     # Check valid arguments
     if valid_arguments():
-        fit_and_predict(sys.argv[1])
+        fit_and_predict(sys.argv[1], len(sys.argv) == 3)
     else:
         print("\nInvalid arguments")
-        print("Invocation:  python3 s4_logistic.py <projName>\n")
+        print("Invocation:  python3 s4_logistic.py <projName> [--skip-unchanged]\n")
     return
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+# Name:        test_s1_status.py
+# Purpose:     Test how s1_status.py merges the statuses of runs of s1_download.py into download_status.txt
+# Invocation:  python3 -m pytest test_s1_status.py (or python3 -m unittest test_s1_status)
+
+import os
+import shutil
+import tempfile
+import unittest
+from s1_status import get_download_changes, read_download_statuses, write_download_statuses
+
+URL = "http://example.com/report|2024.pdf"
+DETAIL = "./proj/download/report.pdf"
+
+class TestDownloadStatuses(unittest.TestCase):
+
+    def setUp(self):
+        self.oldDir = os.getcwd()
+        self.tmpDir = tempfile.mkdtemp()
+        os.chdir(self.tmpDir)
+        os.mkdir("proj")
+        self.statusFile = "./proj/download_status.txt"
+
+    def tearDown(self):
+        os.chdir(self.oldDir)
+        shutil.rmtree(self.tmpDir)
+
+    def test_second_run_unchanged(self):
+        write_download_statuses("proj", [(URL, "ok", DETAIL)], 1000.0)
+        self.assertEqual(read_download_statuses(self.statusFile), [("report.pdf", URL, "new", 1000.0)])
+        # Nothing has changed in the second run, so the line is set back to unchanged and keeps its time of change
+        write_download_statuses("proj", [(URL, "unchanged", DETAIL)], 2000.0)
+        self.assertEqual(read_download_statuses(self.statusFile), [("report.pdf", URL, "unchanged", 1000.0)])
+        # Output written by s2_convert.py or s4_logistic.py between the two runs is up to date
+        self.assertLess(get_download_changes(self.statusFile)["report"], 1500.0)
+
+    def test_change_kept_until_used(self):
+        write_download_statuses("proj", [(URL, "ok", DETAIL)], 1000.0)
+        write_download_statuses("proj", [(URL, "updated", DETAIL)], 2000.0)
+        write_download_statuses("proj", [(URL, "unchanged", DETAIL)], 3000.0)
+        # Output written before the second run is out of date, even after the third run finds the PDF unchanged
+        self.assertGreater(get_download_changes(self.statusFile)["report"], 1500.0)
+
+    def test_lines_of_earlier_runs_kept(self):
+        otherUrl = "http://example.com/other.pdf"
+        write_download_statuses("proj", [(URL, "ok", DETAIL), (otherUrl, "ok", "./proj/download/other.pdf")], 1000.0)
+        write_download_statuses("proj", [(URL, "unchanged", DETAIL), (otherUrl, "prob", "HTTP 500")], 2000.0)
+        self.assertEqual(get_download_changes(self.statusFile), {"other": 1000.0, "report": 1000.0})
+
+    def test_unchanged_without_earlier_line(self):
+        write_download_statuses("proj", [(URL, "unchanged", DETAIL)], 2000.0)
+        self.assertEqual(get_download_changes(self.statusFile), {"report": 0.0})
+
+if __name__ == "__main__":
+    unittest.main()